@@ -0,0 +1,58 @@
+"""
+Compares how long a persona waits for its browser when Chrome is started
+cold versus prewarmed in the background.
+
+    poetry run python benchmarks/browser_start.py --personas 5 --ublock
+
+For the warm runs, every browser is prewarmed and then we pretend to be busy
+for --busy seconds (like the other personas would be) before launching.
+Needs Chrome and chromedriver.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from persine import PersonaEngine
+
+
+def launch_times(engine, personas, warm, busy):
+    times = []
+    for persona in personas:
+        if warm:
+            engine.prewarm(persona)
+            time.sleep(busy)
+        started = time.perf_counter()
+        persona.launch()
+        times.append(time.perf_counter() - started)
+        persona.quit()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--personas", type=int, default=5)
+    parser.add_argument("--busy", type=float, default=5,
+                        help="Seconds to wait between prewarming and launching")
+    parser.add_argument("--ublock", action="store_true",
+                        help="Install uBlock Origin in every browser")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        engine = PersonaEngine(data_dir=data_dir, headless=True, ublock=args.ublock)  # noqa: E501
+        for warm in (False, True):
+            personas = [
+                engine.persona(f"{'warm' if warm else 'cold'}-{i}", overwrite=True)
+                for i in range(args.personas)
+            ]
+            times = launch_times(engine, personas, warm, args.busy)
+            print(
+                f"{'warm' if warm else 'cold'}: "
+                f"median {statistics.median(times):.2f}s, "
+                f"max {max(times):.2f}s over {len(times)} launches"
+            )
+        engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+A local stand-in for YouTube and Amazon, for benchmarking Persine without
+touching the real sites.
+
+Pages are generated to match the parts of the DOM the bridges scrape, padded
+out with styles and scripts so they're roughly as heavy as the real thing.
+YouTube is served at youtube.localhost and Amazon at amazon.localhost, which
+Chrome sends to 127.0.0.1 on its own.
+
+Run it by itself to click around in a browser:
+
+    poetry run python benchmarks/fake_site.py --port 8765
+"""
+import argparse
+import json
+import threading
+from html import escape
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+# Videos "play" this many times faster than real time
+PLAYBACK_SPEED = 10
+VIDEO_DURATION = 60
+
+FAKE_PLAYER_JS = """
+(function() {
+    let player = document.getElementById('movie_player');
+    let state = -1;
+    let position = 0;
+    let startedAt = null;
+    let endTimer = null;
+    let listeners = [];
+    let videoData = VIDEO_DATA;
+
+    function now() {
+        if(startedAt === null) { return position }
+        return Math.min(DURATION, position + (performance.now() - startedAt) / 1000 * SPEED);
+    }
+
+    function setState(newState) {
+        state = newState;
+        listeners.forEach(listener => listener(newState));
+    }
+
+    player.getPlayerState = () => state;
+    player.getDuration = () => DURATION;
+    player.getCurrentTime = now;
+    player.getVideoData = () => videoData;
+    player.addEventListener = (name, listener) => listeners.push(listener);
+    player.removeEventListener = (name, listener) => {
+        listeners = listeners.filter(d => d !== listener)
+    };
+    player.setAutonavState = () => {};
+    player.loadModule = () => {};
+    player.getOption = () => [{ languageCode: "en", displayName: "English" }];
+    player.playVideo = () => {
+        if(state == 1) { return }
+        startedAt = performance.now();
+        setState(1);
+        endTimer = setTimeout(() => {
+            position = DURATION;
+            startedAt = null;
+            setState(0);
+        }, (DURATION - position) / SPEED * 1000);
+    };
+    // YouTube swaps videos in place instead of loading a new page
+    player.loadVideo = (url, data) => {
+        clearTimeout(endTimer);
+        history.pushState({}, '', url);
+        videoData = data;
+        position = 0;
+        startedAt = null;
+        state = -1;
+    };
+    player.seekTo = (seconds) => {
+        let playing = state == 1;
+        clearTimeout(endTimer);
+        position = seconds;
+        startedAt = null;
+        if(playing) {
+            state = 2;
+            player.playVideo();
+        }
+    };
+})();
+"""
+
+CAROUSEL_JS = """
+document.querySelectorAll('.a-carousel-goto-nextpage').forEach(button => {
+    button.addEventListener('click', () => {
+        let carousel = button.closest('.a-carousel-container').querySelector('.a-carousel');
+        carousel.setAttribute('aria-busy', 'true');
+        setTimeout(() => carousel.setAttribute('aria-busy', 'false'), 100);
+    });
+});
+"""
+
+
+def padding(size):
+    """Styles and scripts the bridges don't care about, like the real sites"""
+    style = "<style>" + ".yt-x{color:red}" * (size // 16) + "</style>"
+    script = "<script>var config = " + json.dumps("x" * size) + ";</script>"
+    icon = '<svg viewBox="0 0 24 24"><path d="M0 0h24v24H0z"></path></svg>'
+    return style + script + icon * (size // 64)
+
+
+def page(title, body, head="", size=200000):
+    return (
+        f"<html><head><title>{escape(title)}</title>{head}{padding(size)}</head>"
+        f"<body>{body}</body></html>"
+    )
+
+
+def video_id(n):
+    return f"vid{n:08d}"
+
+
+def video_item(tag, n):
+    return (
+        f"<{tag}>"
+        f'<a class="yt-simple-endpoint" href="/watch?v={video_id(n)}">'
+        f'<img src="/thumb/{n}.jpg"><h3>Fake video {n}</h3></a>'
+        f'<div class="ytd-channel-name"><a href="/channel/{n % 7}">Channel {n % 7}</a></div>'  # noqa: E501
+        f'<div id="metadata-line">{n * 1000} views</div>'
+        f'<span class="ytd-thumbnail-overlay-time-status-renderer"> 4:{n % 60:02d} </span>'  # noqa: E501
+        f'<div id="description-text">About video {n}</div>'
+        f"</{tag}>"
+    )
+
+
+def initial_data(kind):
+    return f"<script>var ytInitialData = {json.dumps({'contents': {kind: {}}})};</script>"  # noqa: E501
+
+
+def youtube_homepage(items):
+    cards = "".join(video_item("ytd-rich-item-renderer", n) for n in range(items))
+    body = f'<div id="contents" class="ytd-rich-grid-renderer">{cards}</div>'
+    return page("YouTube", body, initial_data("twoColumnBrowseResultsRenderer"))
+
+
+def youtube_search(term, items):
+    results = "".join(video_item("ytd-video-renderer", n) for n in range(items))
+    body = (
+        f'<input id="search" value="{escape(term)}">'
+        f'<div id="contents" class="ytd-item-section-renderer">{results}</div>'
+    )
+    return page(f"{term} - YouTube", body, initial_data("twoColumnSearchResultsRenderer"))  # noqa: E501
+
+
+def fake_video_data(n):
+    return {
+        "title": f"Fake video {n}",
+        "video_id": video_id(n),
+        "author": f"Channel {n % 7}",
+        "isLive": False,
+        "isListed": True,
+    }
+
+
+def youtube_video(vid, items):
+    n = int(vid[3:]) if vid[3:].isdigit() else 0
+    video_data = fake_video_data(n)
+    player_js = (
+        FAKE_PLAYER_JS
+        .replace("DURATION", str(VIDEO_DURATION))
+        .replace("SPEED", str(PLAYBACK_SPEED))
+        .replace("VIDEO_DATA", json.dumps(video_data))
+    )
+    play_next = (
+        "document.getElementById(\"movie_player\").loadVideo("
+        f'"/watch?v={video_id(n + 1)}", {json.dumps(fake_video_data(n + 1))})'
+    )
+    sidebar = "".join(
+        video_item("ytd-compact-video-renderer", n + i + 1) for i in range(items)
+    )
+    body = (
+        '<div id="movie_player"></div>'
+        f"<script>{player_js}</script>"
+        f'<div class="ytd-channel-name"><a href="/channel/{n % 7}">Channel {n % 7}</a></div>'  # noqa: E501
+        '<div id="owner-sub-count">1.2M subscribers</div>'
+        '<div id="info"><div id="count"><span class="view-count">1,234 views</span></div>'  # noqa: E501
+        '<div id="date"><yt-formatted-string>Jan 1, 2021</yt-formatted-string></div></div>'  # noqa: E501
+        '<button aria-label="Like this video"><yt-formatted-string aria-label="1,000 likes">1K</yt-formatted-string></button>'  # noqa: E501
+        '<button aria-label="Dislike this video"><yt-formatted-string aria-label="10 dislikes">10</yt-formatted-string></button>'  # noqa: E501
+        f'<button aria-label="Subscribe to Channel {n % 7}.">Subscribe</button>'
+        "<ytd-compact-autoplay-renderer>"
+        f"<h3 onclick='{escape(play_next, quote=True)}'>Fake video {n + 1}</h3>"
+        "</ytd-compact-autoplay-renderer>"
+        f'<div id="items" class="ytd-watch-next-secondary-results-renderer">{sidebar}</div>'  # noqa: E501
+    )
+    return page(video_data["title"], body, initial_data("twoColumnWatchNextResults"))  # noqa: E501
+
+
+def product_card(n):
+    metadata = escape(json.dumps({"asin": f"B{n:09d}"}))
+    return (
+        '<li class="a-carousel-card">'
+        f'<div class="p13n-asin" data-p13n-asin-metadata="{metadata}">'
+        f'<a class="a-link-normal" href="/dp/B{n:09d}"><img src="/img/{n}.jpg" alt="Product {n}"></a>'  # noqa: E501
+        f'<span class="p13n-sc-price">${n % 90 + 9}.99</span>'
+        "</div></li>"
+    )
+
+
+def amazon_homepage():
+    return page("Amazon.com", "<h1>Amazon</h1>")
+
+
+def amazon_search(term, items):
+    results = "".join(
+        f'<div class="s-result-item" data-asin="B{n:09d}" data-index="{n}">'
+        f'<a href="/dp/B{n:09d}"><img src="/img/{n}.jpg"></a>'
+        f"<h2> Product {n} </h2>"
+        f'<span class="a-price"><span class="a-offscreen">${n % 90 + 9}.99</span></span>'  # noqa: E501
+        + ('<i class="a-icon-prime"></i>' if n % 2 else "")
+        + "</div>"
+        for n in range(items)
+    )
+    body = f'<input class="nav-input" value="{escape(term)}">{results}'
+    return page(f"Amazon.com : {term}", body)
+
+
+def amazon_product(asin, carousels=3, cards=8):
+    sections = ""
+    for c in range(carousels):
+        items = "".join(product_card(c * cards + n) for n in range(cards))
+        sections += (
+            '<div class="a-carousel-container">'
+            f"<h2>Customers also viewed {c}</h2>"
+            '<input class="a-carousel-firstvisibleitem" value="1">'
+            '<div class="a-carousel" aria-busy="false" data-a-carousel-options="{}">'  # noqa: E501
+            f"<ol>{items}</ol></div>"
+            '<a class="a-carousel-goto-nextpage" href="javascript:void(0)">Next</a>'  # noqa: E501
+            "</div>"
+        )
+    body = f"<h1>Product {asin}</h1>{sections}<script>{CAROUSEL_JS}</script>"
+    return page(f"Amazon.com: {asin}", body)
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    items = 20
+
+    def do_GET(self):
+        host = (self.headers.get("Host") or "").split(":")[0]
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if host.startswith("youtube."):
+            if parsed.path == "/watch":
+                html = youtube_video(query.get("v", [video_id(0)])[0], self.items)
+            elif parsed.path == "/results":
+                html = youtube_search(query.get("search_query", [""])[0], self.items)  # noqa: E501
+            elif parsed.path == "/":
+                html = youtube_homepage(self.items)
+            else:
+                return self.send_error(404)
+        elif host.startswith("amazon."):
+            if parsed.path == "/s":
+                html = amazon_search(query.get("k", [""])[0], self.items)
+            elif parsed.path.startswith("/dp/"):
+                html = amazon_product(parsed.path[4:])
+            elif parsed.path == "/":
+                html = amazon_homepage()
+            else:
+                return self.send_error(404)
+        else:
+            return self.send_error(404)
+
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port=0):
+    """
+    Starts the fake site in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The server, call shutdown() when you're done
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeSiteHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeSiteHandler)
+    print(f"http://youtube.localhost:{args.port}/")
+    print(f"http://amazon.localhost:{args.port}/")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Times a persona running through typical YouTube and Amazon commands against
+the fake site in benchmarks/fake_site.py, so Persine's own overhead can be
+measured (and regressions caught) without hitting the real sites.
+
+    poetry run python benchmarks/persona_run.py --repeat 3
+
+Needs Chrome and chromedriver, like Persine itself. Each stage is timed
+separately: the bridge (navigation, waiting and scraping), fetching the page
+source, simplifying it, taking the screenshot and writing history.
+
+Without Chrome, --dry-run checks that every command goes somewhere the
+fake site answers, by running the bridges against a stand-in driver and
+fetching each page they navigate to.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from unittest.mock import MagicMock
+from urllib.parse import urlparse
+
+import fake_site
+import persine.processing
+from persine import PersonaEngine
+from persine.bridges import AmazonBridge
+from persine.bridges import YoutubeBridge
+
+
+def fake_commands(port):
+    """A typical session, starting on a video so next_up and like
+    have something to click"""
+    return [
+        f"http://youtube.localhost:{port}/watch?v=vid00000001",
+        "youtube:next_up",
+        "youtube:like",
+        "youtube:homepage",
+        "youtube:search?dogs",
+        "amazon:search?dog toys",
+        f"http://amazon.localhost:{port}/dp/B000000001",
+        "amazon:homepage",
+    ]
+
+
+class StageTimer:
+    """Wraps functions so every call to them is timed under a stage name"""
+
+    def __init__(self):
+        self.times = defaultdict(list)
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.times[stage].append(time.perf_counter() - started)
+
+        setattr(owner, name, timed)
+
+    def report(self):
+        print(f"{'stage':<14}{'calls':>7}{'median':>10}{'total':>10}")
+        for stage, times in self.times.items():
+            print(
+                f"{stage:<14}{len(times):>7}"
+                f"{statistics.median(times):>9.3f}s{sum(times):>9.3f}s"
+            )
+
+
+def fake_bridges(port):
+    youtube = f"http://youtube.localhost:{port}"
+    amazon = f"http://amazon.localhost:{port}"
+
+    class FakeYoutubeBridge(YoutubeBridge):
+        home_url = f"{youtube}/"
+        search_url = f"{youtube}/results?search_query={{}}"
+
+    class FakeAmazonBridge(AmazonBridge):
+        home_url = f"{amazon}/"
+        search_url = f"{amazon}/s?k={{}}"
+
+    return FakeYoutubeBridge, FakeAmazonBridge
+
+
+def dry_run(commands, port):
+    """Prints where each command navigates to and what the fake site
+    sends back, without a browser"""
+    youtube, amazon = fake_bridges(port)
+    registry = {"youtube": youtube, "amazon": amazon}
+    for command in commands:
+        parsed = urlparse(command)
+        site = parsed.scheme if parsed.scheme not in ("http", "https") else parsed.hostname.split(".")[0]  # noqa: E501
+        driver = MagicMock()
+        try:
+            registry[site](driver).run(command)
+        except Exception:
+            # The stand-in driver can't be clicked or scraped, only
+            # navigation matters here
+            pass
+
+        if not driver.get.called:
+            print(f"{command:<50} (acts on the current page)")
+            continue
+        url = urlparse(driver.get.call_args[0][0])
+        # *.localhost only resolves inside Chrome, so ask for it by Host
+        path = f"{url.path}?{url.query}" if url.query else url.path
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}{path}", headers={"Host": url.netloc}
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, size = response.status, len(response.read())
+        except urllib.error.HTTPError as err:
+            status, size = err.code, 0
+        elapsed = time.perf_counter() - started
+        print(f"{command:<45} {path:<35} {status} {size:>8} bytes {elapsed * 1000:6.1f}ms")  # noqa: E501
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="How many times to run the commands")
+    parser.add_argument("--items", type=int, default=20,
+                        help="Recommendations on each fake page")
+    parser.add_argument("--headed", action="store_true",
+                        help="Show the browser")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Check the commands against the fake site without Chrome")  # noqa: E501
+    args = parser.parse_args()
+
+    fake_site.FakeSiteHandler.items = args.items
+    server = fake_site.start()
+    port = server.server_address[1]
+
+    if args.dry_run:
+        dry_run(fake_commands(port), port)
+        server.shutdown()
+        return
+
+    timer = StageTimer()
+    FakeYoutubeBridge, FakeAmazonBridge = fake_bridges(port)
+    for bridge_class in (FakeYoutubeBridge, FakeAmazonBridge):
+        timer.wrap(bridge_class, "run", "bridge")
+        timer.wrap(bridge_class, "get_data", "scrape")
+    timer.wrap(persine.processing, "simplify_source", "simplify")
+
+    commands = fake_commands(port) * args.repeat
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        engine = PersonaEngine(
+            headless=not args.headed,
+            data_dir=data_dir,
+            html="history",
+            screenshot="history",
+            watch="skip_ahead",
+        )
+        engine.register_bridge(FakeYoutubeBridge, hosts=("youtube.localhost",))
+        engine.register_bridge(FakeAmazonBridge, hosts=("amazon.localhost",))
+        timer.wrap(engine, "capture_screenshot", "screenshot")
+        timer.wrap(engine, "get_state", "state")
+
+        started = time.perf_counter()
+        with engine.persona(name="benchmark", overwrite=True) as persona:
+            timer.wrap(persona.journal, "append", "history")
+            timer.wrap(persona, "save_history", "history_save")
+            for command in commands:
+                persona.run(command)
+            persona.save_history()
+            recommendations = len(persona.recommendations)
+        elapsed = time.perf_counter() - started
+
+    server.shutdown()
+
+    print(f"{len(commands)} commands, {recommendations} recommendations, "
+          f"{elapsed:.2f}s total\n")
+    timer.report()
+
+
+if __name__ == "__main__":
+    main()
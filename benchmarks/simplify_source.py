@@ -0,0 +1,64 @@
+"""
+Compares the BeautifulSoup and fast paths of persine.utils.simplify_source.
+
+Point it at raw pages you've saved from the browser (driver.page_source),
+not the already-simplified files in the cache directory:
+
+    poetry run python benchmarks/simplify_source.py saved_pages/*.html
+
+With no arguments it uses a generated YouTube-sized page.
+"""
+import argparse
+import re
+import time
+
+from persine.utils import simplify_source
+
+
+def generated_page(items=2000):
+    style = "<style>" + ".a{color:red}" * 5000 + "</style>"
+    script = "<script>var data = " + '"<div>x</div>";' * 5000 + "</script>"
+    icon = '<svg viewBox="0 0 24 24"><g><path d="M0 0h24v24H0z"></path></g></svg>'  # noqa: E501
+    item = f'<div class="item"><a href="/watch?v=abc">{icon}<h3>Title</h3></a></div>'  # noqa: E501
+    return f"<html><head>{style}{script}</head><body>{item * items}</body></html>"  # noqa: E501
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def tag_counts(html):
+    return sorted(re.findall(r"<([a-zA-Z][\w-]*)", html))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pages", nargs="*", help="Raw HTML files")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path) as f:
+                pages.append((path, f.read()))
+    else:
+        pages = [("generated", generated_page())]
+
+    print(f"{'page':<30} {'size':>10} {'bs4 (s)':>10} {'fast (s)':>10} {'speedup':>8} same-tags")  # noqa: E501
+    for name, source in pages:
+        slow = best_time(lambda: simplify_source(source), args.repeat)
+        fast = best_time(lambda: simplify_source(source, method="fast"), args.repeat)  # noqa: E501
+        same = tag_counts(simplify_source(source)) == tag_counts(
+            simplify_source(source, method="fast")
+        )
+        print(f"{name[-30:]:<30} {len(source):>10} {slow:>10.3f} {fast:>10.3f} {slow / fast:>7.1f}x {same}")  # noqa: E501
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .persona_engine import PersonaEngine
+
+
+class AsyncPersona:
+    """
+    An asyncio version of :class:`~persine.Persona`. Selenium only talks to
+    the browser in a blocking way, so every persona gets its own thread
+    that all of its browser calls run in. While one browser is loading a
+    page or watching a video, the event loop is free to drive the others.
+
+    You'll usually get one from :meth:`AsyncPersonaEngine.persona`.
+
+    Args:
+        persona (Persona): The persona to drive
+        executor (ThreadPoolExecutor): The persona's thread, created if not
+            given
+    """
+
+    def __init__(self, persona, executor=None):
+        self.persona = persona
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="persine"
+        )
+
+    @property
+    def name(self):
+        return self.persona.name
+
+    @property
+    def history(self):
+        return self.persona.history
+
+    @property
+    def recommendations(self):
+        return self.persona.recommendations
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def launch(self):
+        """Launches the browser"""
+        await self._call(self.persona.launch)
+
+    async def run(self, url, notes=None):
+        """
+        Runs a single command, see :meth:`~persine.Persona.run`
+
+        Returns:
+            dict: The new state
+        """
+        return await self._call(self.persona.run, url, notes)
+
+    async def run_batch(self, urls):
+        """
+        Runs a series of commands, see :meth:`~persine.Persona.run_batch`
+
+        Returns:
+            list(dict): The last state of each command
+        """
+        return await self._call(self.persona.run_batch, urls)
+
+    async def quit(self):
+        """Quits the browser and lets the persona's thread go"""
+        try:
+            if self.persona.driver is not None:
+                await self._call(self.persona.quit)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        await self.launch()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.quit()
+
+
+class AsyncPersonaEngine:
+    """
+    An asyncio front end for :class:`~persine.PersonaEngine`, so one event
+    loop can run many personas side by side::
+
+        engine = AsyncPersonaEngine(headless=True)
+
+        async def search(name, term):
+            async with await engine.persona(name, overwrite=True) as persona:
+                await persona.run(f"youtube:search?{term}")
+                await persona.run("youtube:next_up#3")
+            return persona
+
+        personas = await asyncio.gather(
+            search("cats", "cats"),
+            search("dogs", "dogs"),
+        )
+
+    Any other settings are passed along to the PersonaEngine.
+
+    Args:
+        engine (PersonaEngine): An existing engine to use instead of
+            creating one
+    """
+
+    def __init__(self, engine=None, **kwargs):
+        self.engine = engine if engine is not None else PersonaEngine(**kwargs)
+
+    def __getattr__(self, name):
+        # Settings, register_bridge, on, etc all come from the engine
+        return getattr(self.engine, name)
+
+    async def persona(self, name=None, resume=False, **kwargs):
+        """
+        Creates a persona, see :meth:`~persine.PersonaEngine.persona`
+
+        Returns:
+            AsyncPersona: The persona
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persine")
+        loop = asyncio.get_running_loop()
+        persona = await loop.run_in_executor(
+            executor,
+            partial(self.engine.persona, name, resume=resume, **kwargs)
+        )
+        return AsyncPersona(persona, executor)
+
+    async def run_many(self, plans, max_browsers=4, resume=False):
+        """
+        Runs many personas at once, no more than max_browsers at a time.
+
+        Args:
+            plans (dict): Persona names mapped to their list of commands
+            max_browsers (int): Most browsers to have open at once
+            resume (boolean): Whether personas resume previous runs
+
+        Returns:
+            dict: Persona names mapped to the finished AsyncPersona, or to
+                the exception that stopped it
+        """
+        if self.engine.custom_driver and max_browsers > 1:
+            raise Exception("Can't run personas in parallel with a custom driver")
+
+        slots = asyncio.Semaphore(max_browsers)
+
+        async def run_persona(name, commands):
+            async with slots:
+                persona = await self.persona(name, resume=resume, overwrite=True)
+                async with persona:
+                    for command in commands:
+                        await persona.run(command)
+                return persona
+
+        results = await asyncio.gather(
+            *[run_persona(name, commands) for name, commands in plans.items()],
+            return_exceptions=True
+        )
+        return dict(zip(plans.keys(), results))
+
+    async def shutdown(self):
+        """Waits for any background processing to finish"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.engine.shutdown)
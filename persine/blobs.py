@@ -0,0 +1,116 @@
+import os
+import re
+import zlib
+import hashlib
+import threading
+
+BLOB = b"B"
+MANIFEST = b"M"
+
+# Break HTML up after closing angle brackets, so the chunks line up
+# with tags and an edit only changes the chunks around it
+PIECE = re.compile(rb"[^>]*>|[^>]+$")
+
+
+class BlobStore:
+    """
+    Stores page sources and screenshots by the hash of their contents, so
+    saving the same thing twice only takes up space once. Larger text like
+    HTML can be split into chunks along tag boundaries, so two nearly
+    identical pages share everything except the chunks that differ.
+
+    Args:
+        root (str): The folder to keep blobs in
+        min_chunk (int): Smallest chunk size, in bytes
+        max_chunk (int): Largest chunk size, in bytes
+        chunk_mask (int): Controls the average chunk size. A chunk ends after
+            a tag whose checksum has none of these bits set.
+    """
+
+    def __init__(self, root, min_chunk=2048, max_chunk=65536, chunk_mask=0x3F):
+        self.root = root
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.chunk_mask = chunk_mask
+
+    def path(self, digest):
+        """Where the blob with the given hash lives on disk"""
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data, chunked=False):
+        """
+        Saves data to the store, if it isn't there already.
+
+        Args:
+            data (Union[bytes, str]): What to save
+            chunked (boolean): Whether to split it into shared chunks
+
+        Returns:
+            str: The hash that the data can be retrieved with
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self:
+            return digest
+
+        chunks = list(self.chunks(data)) if chunked and len(data) > self.max_chunk else []  # noqa: E501
+        if len(chunks) > 1:
+            chunk_digests = [self.put(chunk) for chunk in chunks]
+            self._write(digest, MANIFEST + "\n".join(chunk_digests).encode("ascii"))  # noqa: E501
+        else:
+            # A single chunk is the whole thing, and a manifest pointing
+            # at itself would never finish loading
+            self._write(digest, BLOB + data)
+
+        return digest
+
+    def get(self, digest):
+        """
+        Args:
+            digest (str): The hash returned by put
+
+        Returns:
+            bytes: The saved data
+        """
+        with open(self.path(digest), "rb") as f:
+            contents = zlib.decompress(f.read())
+
+        kind, body = contents[:1], contents[1:]
+        if kind == MANIFEST:
+            return b"".join(self.get(chunk) for chunk in body.decode("ascii").split("\n"))  # noqa: E501
+        return body
+
+    def chunks(self, data):
+        """Splits data into chunks whose boundaries depend only on the content.
+        No chunk is ever longer than max_chunk."""
+        start = 0
+        end = 0
+        for piece in PIECE.finditer(data):
+            end = piece.end()
+            # Pieces can be huge (a data: URI, a minified script), so cut
+            # them at max_chunk no matter where the tags are
+            while end - start > self.max_chunk:
+                yield data[start:start + self.max_chunk]
+                start += self.max_chunk
+            size = end - start
+            at_boundary = (zlib.crc32(piece.group()) & self.chunk_mask) == 0
+            if size >= self.max_chunk or (at_boundary and size >= self.min_chunk):
+                yield data[start:end]
+                start = end
+        if start < len(data):
+            yield data[start:]
+
+    def _write(self, digest, contents):
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write somewhere else first, so a half-written blob never
+        # looks like a finished one
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(contents))
+        os.replace(tmp_path, path)
@@ -1,5 +1,6 @@
 from .youtube import YoutubeBridge
 from .amazon import AmazonBridge
 from .bridge import BaseBridge
+from .registry import BridgeRegistry
 
-__all__ = ['YoutubeBridge', 'AmazonBridge', 'BaseBridge']
+__all__ = ['YoutubeBridge', 'AmazonBridge', 'BaseBridge', 'BridgeRegistry']
@@ -5,182 +5,314 @@ from selenium.webdriver.common.by import By
 from urllib.parse import urlparse
 from urllib.parse import quote_plus
 from .bridge import BaseBridge
+from .. import timing
 
-class AmazonBridge(BaseBridge):
-    """A bridge that interacts with and scrapes Amazon"""
+# Each of these is a JavaScript function, installed on the page once and
+# then called by name (see BaseBridge.call_script)
 
+SEARCH_RESULTS_JS = """
+function() {
+    return [...document.querySelectorAll(".s-result-item")].map((d, i) => {
+        let data = {...d.dataset}
+        try { data['url'] = d.querySelector('a')['href']; } catch(err) {}
+        try { data['img'] = d.querySelector('img')['src']; } catch(err) {}
+        try { data['asin'] = d.getAttribute('data-asin'); } catch(err) {}
+        try { data['asin'] = data['asin'] || d.querySelector('[data-asin]').getAttribute('data-asin') } catch(err) {}
+        try { data['title'] = d.querySelector('[data-click-el="title"]').innerText; } catch(err) {}
+        try { data['title'] = data['title'] || d.querySelector('h2').innerText.trim(); } catch(err) {}
+        try { data['is_sponsored'] = d.querySelector('[data-component-type="sp-sponsored-result"]') != null; } catch(err) {}
+        try { data['stars'] = d.querySelector('[aria-label*="out of 5 stars"]').ariaLabel; } catch(err) {}
+        try { data['ratings'] = d.querySelector('[aria-label*="out of 5 stars"] + span').ariaLabel; } catch(err) {}
+        try { data['price'] = d.querySelector('.a-price .a-offscreen').innerText; } catch(err) {}
+        try { data['old_price'] = d.querySelector('.a-price[data-a-strike="true"] .a-offscreen').innerText; } catch(err) {}
+        try { data['price_range'] = d.querySelectorAll('.a-price-range .a-price .a-offscreen')[0].innerText + " - " + d.querySelectorAll('.a-price-range .a-price .a-offscreen')[1].innerText } catch(err) {}
+        try { data['free_shipping'] = d.querySelector('[aria-label*="shipping"]') != null; } catch(err) {}
+        try { data['is_prime'] = d.querySelector('.a-icon-prime') != null; } catch(err) {}
+        return data;
+        });
+}
+"""  # noqa: E501
 
-    def __init__(self, driver):
-        self.driver = driver
+# Scroll down to trigger lazy loading, then page through the carousels.
+# Each step only waits until the page stops changing (no DOM mutations or
+# network requests for quietPeriod), and the whole thing gives up after
+# timeout milliseconds.
+FORCE_LOAD_JS = """
+function(timeout, quietPeriod, onComplete) {
+    let deadline = performance.now() + timeout;
 
-    def __scrape_search_results(self):
-        return self.driver.execute_script(
-            """
-            return [...document.querySelectorAll(".s-result-item")].map((d, i) => {
-                let data = {...d.dataset}
-                try { data['url'] = d.querySelector('a')['href']; } catch(err) {}
-                try { data['img'] = d.querySelector('img')['src']; } catch(err) {}
-                try { data['asin'] = d.getAttribute('data-asin'); } catch(err) {}
-                try { data['asin'] = data['asin'] || d.querySelector('[data-asin]').getAttribute('data-asin') } catch(err) {}
-                try { data['title'] = d.querySelector('[data-click-el="title"]').innerText; } catch(err) {}
-                try { data['title'] = data['title'] || d.querySelector('h2').innerText.trim(); } catch(err) {}
-                try { data['is_sponsored'] = d.querySelector('[data-component-type="sp-sponsored-result"]') != null; } catch(err) {}
-                try { data['stars'] = d.querySelector('[aria-label*="out of 5 stars"]').ariaLabel; } catch(err) {}
-                try { data['ratings'] = d.querySelector('[aria-label*="out of 5 stars"] + span').ariaLabel; } catch(err) {}
-                try { data['price'] = d.querySelector('.a-price .a-offscreen').innerText; } catch(err) {}
-                try { data['old_price'] = d.querySelector('.a-price[data-a-strike="true"] .a-offscreen').innerText; } catch(err) {}
-                try { data['price_range'] = d.querySelectorAll('.a-price-range .a-price .a-offscreen')[0].innerText + " - " + d.querySelectorAll('.a-price-range .a-price .a-offscreen')[1].innerText } catch(err) {}
-                try { data['free_shipping'] = d.querySelector('[aria-label*="shipping"]') != null; } catch(err) {}
-                try { data['is_prime'] = d.querySelector('.a-icon-prime') != null; } catch(err) {}
-                return data;
-                });
-        """
-        )  # noqa: E501
+    function carouselsReady() {
+        return document.querySelector('.a-carousel[aria-busy="true"]') == null &&
+            document.querySelector('.a-carousel-card-empty') == null
+    }
 
-    def __force_page_contents_load(self):
-        self.driver.execute_script(
-            """
-            window.scrollTo({
-                top: document.body.scrollHeight,
-                left: 0,
-                behavior: 'smooth'
-            });"""
-        )
-        time.sleep(2)
-        self.driver.execute_script(
-            """
-            window.scrollTo({
-                top: document.body.scrollHeight,
-                left: 0,
-                behavior: 'smooth'
-            });"""
-        )
-        time.sleep(2)
-        self.driver.execute_script(
-            "document.querySelectorAll('.a-carousel-goto-nextpage').forEach(e => e.click())"
-        )
-        time.sleep(1)
-        self.driver.execute_script(
-            "document.querySelectorAll('.a-carousel-goto-nextpage').forEach(e => e.click())"
-        )
-        time.sleep(1)
-        self.driver.execute_script(
-            "document.querySelectorAll('.a-carousel-goto-nextpage').forEach(e => e.click())"
-        )
-        time.sleep(2)
+    function waitUntilQuiet(isReady) {
+        return new Promise(resolve => {
+            let started = performance.now();
+            let quietTimer = null;
+            let finished = false;
+            let mutations = new MutationObserver(activity);
+            let requests = new PerformanceObserver(activity);
+            let ceiling = setTimeout(finish, Math.max(0, deadline - performance.now()));
 
-    def __scrape_suggested_products(self):
-        return self.driver.execute_async_script(
-            """                
-            let onComplete = arguments[0];
-
-            function getItemDetails(d) {
-                let section = d.closest(".a-carousel-container")
-                let data = {}
-
-                try { data['title'] = d.querySelector('img')['alt']; } catch(err) {}
-                try { data['title'] = d.querySelector('.pba-lob-bundle-title .a-truncate-full').innerText; } catch(err) {}
-                try { data['title'] = d.querySelector('.p13n-sc-truncated').innerText; } catch(err) {}
-                try { data['asin'] = JSON.parse(d.querySelector("div.p13n-asin").dataset['p13nAsinMetadata'])['asin'] } catch(err) {}
-                try { data['url'] = d.querySelector('a.a-link-normal')['href']; } catch(err) {}
-                try { data['img'] = d.querySelector('img')['src']; } catch(err) {}
-                try { section.querySelector("h2 .sp_desktop_sponsored_label").remove() } catch(err) {}
-                try { section.querySelector("h2 a").remove() } catch(err) {}
-                try { data['section_title'] = section.querySelector("h2").innerText; } catch(err) {}
-                try { data['is_sponsored'] = section.innerText.indexOf("Sponsored") != -1 } catch(err) {}
-                try { data['stars'] = d.querySelector('[title*="out of 5 stars"]').title; } catch(err) {}
-                try { data['review_count'] = d.querySelector('[[title*="out of 5 stars"] .a-size-small').innerText; } catch(err) {}
-
-                if(!data['stars']) {
-                    try { data['stars'] = d.querySelector('.adReviewLink i').classList[2]; } catch(err) {}
-                }
-                if(!data['review_count']) {
-                    try { data['review_count'] = d.querySelector('.adReviewLink span').innerText; } catch(err) {}
-                }
-
-                try { data['best_seller'] = d.querySelector('.p13n-best-seller').innerText; } catch(err) {}
-                try { data['price'] = d.querySelector('.a-price .a-offscreen').innerText.trim(); } catch(err) {}
-                try { data['price'] = d.querySelector('.p13n-sc-price,.a-color-price').innerText.trim(); } catch(err) {}
-                try { data['free_shipping'] = d.innerText.indexOf("FREE shipping") != -1 } catch(err) {}
-                try { data['is_prime'] = d.querySelector('.a-icon-prime') != null; } catch(err) {}
-                return data;    
+            function finish() {
+                if(finished) { return }
+                finished = true;
+                mutations.disconnect();
+                requests.disconnect();
+                clearTimeout(quietTimer);
+                clearTimeout(ceiling);
+                resolve(performance.now() - started);
             }
 
-            function getCarouselCurrentContents(root) {
-                return [...root.querySelectorAll(".a-carousel-card:not(.vse-video-card)")].map((d, i) => {
-                    let data = getItemDetails(d)
-                    data['index'] = i;
-                    return data; 
-                });
+            function activity() {
+                clearTimeout(quietTimer);
+                quietTimer = setTimeout(() => isReady() ? finish() : activity(), quietPeriod);
             }
 
-            async function getContentsOfCarousel(root, previousFirst, step=0) {
-                if(step > 10) {
-                    return Promise.resolve([])
-                }
-                if(!root.offsetParent) {
-                    console.log(root.offsetParent)
-                    return Promise.resolve([])
-                }
-                return new Promise((resolve, reject) => {
-                    let contents = getCarouselCurrentContents(root)
-                    let firstVisible = parseFloat(root.querySelector(".a-carousel-firstvisibleitem").value)
-                    firstVisible = firstVisible == "" ? 1 : parseInt(firstVisible)
-                    if(firstVisible != 1 || step == 0) {
-                        console.log('scrolling to', root)
-                        root.scrollIntoView()
-                        root.querySelector(".a-carousel-goto-nextpage").click()
-
-                        let waitUntilReady = setInterval(function() {
-                            let isBusy = root.querySelector(".a-carousel").ariaBusy
-                            let isLoaded = root.querySelectorAll(".a-carousel-card-empty").length == 0
-                            console.log(isBusy)
-                            if(isBusy == 'true' || !isLoaded) {
-                                console.log("working")
-                            } else {
-                                clearInterval(waitUntilReady)
-                                getContentsOfCarousel(root, firstVisible, step + 1)
-                                    .then(nextPageContents => {
-                                        resolve([...contents, ...nextPageContents])
-                                    })
-                            }
-                        }, 200);
+            mutations.observe(document.body, {
+                childList: true,
+                subtree: true,
+                attributes: true,
+                attributeFilter: ['aria-busy', 'class']
+            });
+            requests.observe({ entryTypes: ['resource'] });
+            activity();
+        })
+    }
+
+    function scrollToBottom() {
+        window.scrollTo({
+            top: document.body.scrollHeight,
+            left: 0,
+            behavior: 'smooth'
+        });
+    }
+
+    function nextCarouselPage() {
+        document.querySelectorAll('.a-carousel-goto-nextpage').forEach(e => e.click())
+    }
+
+    async function load() {
+        let timings = {};
+        for(let i = 1; i <= 2; i++) {
+            scrollToBottom();
+            timings[`scroll_${i}`] = await waitUntilQuiet(() => true);
+        }
+        for(let i = 1; i <= 3; i++) {
+            nextCarouselPage();
+            timings[`carousel_${i}`] = await waitUntilQuiet(carouselsReady);
+        }
+        onComplete(timings);
+    }
+
+    load();
+}
+"""  # noqa: E501
+
+SUGGESTED_PRODUCTS_JS = """
+function(onComplete) {
+    function getItemDetails(d) {
+        let section = d.closest(".a-carousel-container")
+        let data = {}
+
+        try { data['title'] = d.querySelector('img')['alt']; } catch(err) {}
+        try { data['title'] = d.querySelector('.pba-lob-bundle-title .a-truncate-full').innerText; } catch(err) {}
+        try { data['title'] = d.querySelector('.p13n-sc-truncated').innerText; } catch(err) {}
+        try { data['asin'] = JSON.parse(d.querySelector("div.p13n-asin").dataset['p13nAsinMetadata'])['asin'] } catch(err) {}
+        try { data['url'] = d.querySelector('a.a-link-normal')['href']; } catch(err) {}
+        try { data['img'] = d.querySelector('img')['src']; } catch(err) {}
+        try { section.querySelector("h2 .sp_desktop_sponsored_label").remove() } catch(err) {}
+        try { section.querySelector("h2 a").remove() } catch(err) {}
+        try { data['section_title'] = section.querySelector("h2").innerText; } catch(err) {}
+        try { data['is_sponsored'] = section.innerText.indexOf("Sponsored") != -1 } catch(err) {}
+        try { data['stars'] = d.querySelector('[title*="out of 5 stars"]').title; } catch(err) {}
+        try { data['review_count'] = d.querySelector('[[title*="out of 5 stars"] .a-size-small').innerText; } catch(err) {}
+
+        if(!data['stars']) {
+            try { data['stars'] = d.querySelector('.adReviewLink i').classList[2]; } catch(err) {}
+        }
+        if(!data['review_count']) {
+            try { data['review_count'] = d.querySelector('.adReviewLink span').innerText; } catch(err) {}
+        }
+
+        try { data['best_seller'] = d.querySelector('.p13n-best-seller').innerText; } catch(err) {}
+        try { data['price'] = d.querySelector('.a-price .a-offscreen').innerText.trim(); } catch(err) {}
+        try { data['price'] = d.querySelector('.p13n-sc-price,.a-color-price').innerText.trim(); } catch(err) {}
+        try { data['free_shipping'] = d.innerText.indexOf("FREE shipping") != -1 } catch(err) {}
+        try { data['is_prime'] = d.querySelector('.a-icon-prime') != null; } catch(err) {}
+        return data;    
+    }
+
+    function getCarouselCurrentContents(root) {
+        return [...root.querySelectorAll(".a-carousel-card:not(.vse-video-card)")].map((d, i) => {
+            let data = getItemDetails(d)
+            data['index'] = i;
+            return data; 
+        });
+    }
+
+    async function getContentsOfCarousel(root, previousFirst, step=0) {
+        if(step > 10) {
+            return Promise.resolve([])
+        }
+        if(!root.offsetParent) {
+            console.log(root.offsetParent)
+            return Promise.resolve([])
+        }
+        return new Promise((resolve, reject) => {
+            let contents = getCarouselCurrentContents(root)
+            let firstVisible = parseFloat(root.querySelector(".a-carousel-firstvisibleitem").value)
+            firstVisible = firstVisible == "" ? 1 : parseInt(firstVisible)
+            if(firstVisible != 1 || step == 0) {
+                console.log('scrolling to', root)
+                root.scrollIntoView()
+                root.querySelector(".a-carousel-goto-nextpage").click()
+
+                let waitUntilReady = setInterval(function() {
+                    let isBusy = root.querySelector(".a-carousel").ariaBusy
+                    let isLoaded = root.querySelectorAll(".a-carousel-card-empty").length == 0
+                    console.log(isBusy)
+                    if(isBusy == 'true' || !isLoaded) {
+                        console.log("working")
                     } else {
-                        resolve(contents)
+                        clearInterval(waitUntilReady)
+                        getContentsOfCarousel(root, firstVisible, step + 1)
+                            .then(nextPageContents => {
+                                resolve([...contents, ...nextPageContents])
+                            })
                     }
-                })
+                }, 200);
+            } else {
+                resolve(contents)
             }
+        })
+    }
 
-            async function scrapePage() {
-                let results = [];
-                let buttons = [...document.querySelectorAll(".a-carousel-goto-nextpage")]
-                let roots = buttons.map(b => {
-                    let root = b.closest(".a-carousel-container")
-                    root.style.borderWidth = '10px'
-                    root.style.borderColor = 'magenta'
-                    root.style.borderStyle = 'solid'
-                    root.style.background = '#fff880'
-                    return root
-                })
-
-                for(let i=0; i < roots.length; i++) {
-                    results = results.concat(await getContentsOfCarousel(roots[i]));
-                    roots[i].style.background = '#c7ff80'
-                };
-
-                onComplete(results)
-            }
+    async function scrapePage() {
+        let results = [];
+        let buttons = [...document.querySelectorAll(".a-carousel-goto-nextpage")]
+        let roots = buttons.map(b => {
+            let root = b.closest(".a-carousel-container")
+            root.style.borderWidth = '10px'
+            root.style.borderColor = 'magenta'
+            root.style.borderStyle = 'solid'
+            root.style.background = '#fff880'
+            return root
+        })
 
-            scrapePage()
-            """
-        )  # noqa: E501
+        for(let i=0; i < roots.length; i++) {
+            results = results.concat(await getContentsOfCarousel(roots[i]));
+            roots[i].style.background = '#c7ff80'
+        };
+
+        onComplete(results)
+    }
+
+    scrapePage()
+}
+"""  # noqa: E501
+
+RAW_CAROUSEL_DATA_JS = """
+function() {
+    return [...document.querySelectorAll("[data-a-carousel-options*='}']")].map(d => {
+        return {...d.dataset}
+    })
+}
+"""
+
+
+class AmazonBridge(BaseBridge):
+    """A bridge that interacts with and scrapes Amazon
+
+    Args:
+        driver: A Selenium WebDriver used to navigate
+        wait_timeout (float): Most seconds to spend waiting for a page's
+            carousels to load
+        quiet_period (float): How many seconds the page has to go without
+            changing before it's considered loaded
+
+    How long the last page took to settle is kept in ``wait_timings``, and
+    is also recorded as ``wait_*`` phases when the engine has timings on.
+    """
+
+
+    schemes = ("amazon",)
+    # Any other Amazon store is caught by the domain
+    domains = ("amazon",)
+    hosts = (
+        "amazon.com",
+        "amazon.ca",
+        "amazon.com.mx",
+        "amazon.com.br",
+        "amazon.co.uk",
+        "amazon.de",
+        "amazon.fr",
+        "amazon.it",
+        "amazon.es",
+        "amazon.nl",
+        "amazon.in",
+        "amazon.co.jp",
+        "amazon.com.au",
+        "amazon.com.be",
+        "amazon.se",
+        "amazon.pl",
+        "amazon.sg",
+        "amazon.com.tr",
+        "amazon.ae",
+        "amazon.sa",
+        "amazon.eg",
+        "amazon.cn",
+    )
+    # Where amazon:homepage and amazon:search go, the search
+    # term is filled in for {}
+    home_url = "https://www.amazon.com/"
+    search_url = "https://smile.amazon.com/s?k={}"
+    scripts = {
+        "search_results": SEARCH_RESULTS_JS,
+        "force_load": FORCE_LOAD_JS,
+        "suggested_products": SUGGESTED_PRODUCTS_JS,
+        "raw_carousel_data": RAW_CAROUSEL_DATA_JS,
+    }
+
+    def __init__(self, driver, wait_timeout=8, quiet_period=0.5):
+        super().__init__(driver)
+        self.wait_timeout = wait_timeout
+        self.quiet_period = quiet_period
+        self.wait_timings = {}
+
+    @classmethod
+    def from_engine(cls, driver, engine):
+        return cls(
+            driver,
+            wait_timeout=engine.amazon_wait_timeout,
+            quiet_period=engine.amazon_quiet_period,
+        )
+
+    def __scrape_search_results(self):
+        return self.call_script("search_results")
+
+    def __force_page_contents_load(self):
+        started = time.perf_counter()
+        with timing.phase("wait"):
+            timings = self.call_async_script(
+                "force_load", self.wait_timeout * 1000, self.quiet_period * 1000
+            )
+
+        self.wait_timings = {
+            key: round(value / 1000, 3) for key, value in timings.items()
+        }
+        self.wait_timings["total"] = round(time.perf_counter() - started, 3)
+
+        # Each scroll and carousel page also shows up in the step's timings
+        for key, value in timings.items():
+            timing.record(f"wait_{key}", value / 1000)
+
+    def __scrape_suggested_products(self):
+        return self.call_async_script("suggested_products")
 
     def __scrape_raw_carousel_data(self):
-        return self.driver.execute_script("""
-        return [...document.querySelectorAll("[data-a-carousel-options*='}']")].map(d => {
-            return {...d.dataset}
-        })
-        """)
+        return self.call_script("raw_carousel_data")
 
     def get_data(self):
         parsed = urlparse(self.driver.current_url)
@@ -209,14 +341,12 @@ class AmazonBridge(BaseBridge):
         parsed = urlparse(url)
 
         if parsed.scheme in ["http", "https"]:
-            self.driver.get(url)
+            self.navigate(url)
         elif parsed.path == "homepage":
-            self.driver.get("https://www.amazon.com/")
+            self.navigate(self.home_url)
         elif parsed.path == "search":
-            self.driver.get(
-                f"https://smile.amazon.com/s?k={quote_plus(parsed.query)}"
-            )
+            self.navigate(self.search_url.format(quote_plus(parsed.query)))
 
         self.__force_page_contents_load()
 
-        return self.get_data()
\ No newline at end of file
+        return self.scrape()
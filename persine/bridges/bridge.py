@@ -1,13 +1,167 @@
+import json
+import hashlib
+
+from .. import timing
+from ..hooks import Hooks
+
+MISSING = "__persine_missing__"
+
+_script_versions = {}
+
+# Runs one of a bridge's installed scripts by name, or reports back
+# that the page doesn't have them yet
+CALL_SCRIPT_JS = """
+let [namespace, version, name, ...args] = arguments;
+let scripts = window.__persine && window.__persine[namespace];
+if(!scripts || scripts.__version != version) {
+    return "%s";
+}
+return scripts[name](...args);
+""" % MISSING
+
+CALL_ASYNC_SCRIPT_JS = """
+let [namespace, version, name, ...args] = arguments;
+let onComplete = args[args.length - 1];
+let scripts = window.__persine && window.__persine[namespace];
+if(!scripts || scripts.__version != version) {
+    onComplete("%s");
+    return;
+}
+scripts[name](...args);
+""" % MISSING
+
+
 class BaseBridge:
     """A completely useless Bridge that at least shows you
     what they're supposed to implement
+
+    A bridge is used for commands with one of its ``schemes``
+    (e.g. youtube:search) and for URLs on one of its ``hosts``, including
+    subdomains. ``domains`` catches every country's version of a site, so
+    "amazon" covers amazon.se and www.amazon.com.tr too. The engine keeps one bridge per browser, so anything saved
+    in ``cache`` sticks around from one command to the next.
+
+    JavaScript functions in ``scripts`` are installed on each page once and
+    then called by name with ``call_script``, instead of sending their
+    source to the browser every time they're used.
     
     Args:
         driver: A Selenium WebDriver used to navigate"""
 
+    schemes = ()
+    hosts = ()
+    domains = ()
+    scripts = {}
 
     def __init__(self, driver):
         self.driver = driver
+        self.cache = {}
+        # Replaced with the engine's hooks when the engine creates the bridge
+        self.hooks = Hooks()
+
+    @classmethod
+    def from_engine(cls, driver, engine):
+        """Creates the bridge, using any settings it needs from the engine
+
+        Returns:
+            BaseBridge: The new bridge"""
+        return cls(driver)
+
+    @classmethod
+    def script_version(cls):
+        """A fingerprint of the bridge's scripts, so pages with an older
+        version installed get the new one"""
+        if cls not in _script_versions:
+            sources = json.dumps(cls.scripts, sort_keys=True)
+            _script_versions[cls] = hashlib.sha1(sources.encode("utf-8")).hexdigest()[:12]  # noqa: E501
+        return _script_versions[cls]
+
+    @classmethod
+    def script_bundle(cls):
+        """
+        Returns:
+            str: JavaScript that installs all of the bridge's scripts
+        """
+        functions = "".join(
+            f"{json.dumps(name)}: ({source}),\n"
+            for name, source in cls.scripts.items()
+        )
+        return f"""
+        window.__persine = window.__persine || {{}};
+        window.__persine[{json.dumps(cls.__name__)}] = {{
+            "__version": {json.dumps(cls.script_version())},
+            {functions}
+        }};
+        """
+
+    def install_scripts(self):
+        """
+        Installs the bridge's scripts on the current page. When the browser
+        speaks the DevTools protocol, they're also set up to be added to
+        every page it loads from now on.
+        """
+        bundle = self.script_bundle()
+        self.driver.execute_script(bundle)
+
+        if "scripts_preloaded" not in self.cache:
+            self.cache["scripts_preloaded"] = False
+            if hasattr(self.driver, "execute_cdp_cmd"):
+                try:
+                    self.driver.execute_cdp_cmd(
+                        "Page.addScriptToEvaluateOnNewDocument", {"source": bundle}
+                    )
+                    self.cache["scripts_preloaded"] = True
+                except Exception:
+                    pass
+
+    def call_script(self, name, *args):
+        """Runs one of the bridge's scripts on the page, installing
+        them first if they aren't already there
+
+        Returns:
+            Whatever the script returns"""
+        return self.__call(self.driver.execute_script, CALL_SCRIPT_JS, name, args)
+
+    def call_async_script(self, name, *args):
+        """Runs one of the bridge's asynchronous scripts, which are given
+        a callback to call with their result as their last argument
+
+        Returns:
+            Whatever the script calls back with"""
+        return self.__call(
+            self.driver.execute_async_script, CALL_ASYNC_SCRIPT_JS, name, args
+        )
+
+    def __call(self, execute, caller, name, args):
+        namespace = self.__class__.__name__
+        version = self.script_version()
+
+        with timing.phase("script"):
+            result = execute(caller, namespace, version, name, *args)
+            if result == MISSING:
+                self.install_scripts()
+                result = execute(caller, namespace, version, name, *args)
+        return result
+
+    def navigate(self, url):
+        """Sends the browser to a URL"""
+        self.hooks.emit("before_navigate", bridge=self, url=url)
+        with timing.phase("navigate"):
+            self.driver.get(url)
+        self.hooks.emit("after_navigate", bridge=self, url=url)
+
+    def scrape(self):
+        """
+        Scrapes the current page with get_data
+
+        Returns:
+            dict: Representation of the page
+        """
+        self.hooks.emit("before_scrape", bridge=self)
+        with timing.phase("scrape"):
+            data = self.get_data()
+        self.hooks.emit("after_scrape", bridge=self, data=data)
+        return data
 
     def get_data(self):
         """Return import data from the page, as well as
@@ -26,6 +180,6 @@ class BaseBridge:
 
         Returns:
             dict: Representation of the page"""
-        self.driver.get(url)
-        
-        return self.get_data()
\ No newline at end of file
+        self.navigate(url)
+
+        return self.scrape()
\ No newline at end of file
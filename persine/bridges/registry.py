@@ -0,0 +1,113 @@
+import logging
+from urllib.parse import urlparse
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:  # Python < 3.8
+    entry_points = None
+
+ENTRY_POINT_GROUP = "persine.bridges"
+
+logger = logging.getLogger(__name__)
+
+
+class BridgeRegistry:
+    """
+    Keeps track of which bridge handles which commands and websites.
+    Commands are matched by their scheme (the ``youtube`` in
+    ``youtube:search?cats``) and URLs by their host, so finding a bridge
+    is a dictionary lookup instead of a search through every bridge.
+    """
+
+    def __init__(self):
+        self.schemes = {}
+        self.hosts = {}
+        self.domains = {}
+
+    @classmethod
+    def default(cls):
+        """
+        A registry with Persine's own bridges, plus any installed packages
+        that provide bridges under the ``persine.bridges`` entry point group
+
+        Returns:
+            BridgeRegistry
+        """
+        from .youtube import YoutubeBridge
+        from .amazon import AmazonBridge
+
+        registry = cls()
+        registry.register(YoutubeBridge)
+        registry.register(AmazonBridge)
+        registry.load_entry_points()
+        return registry
+
+    def register(self, bridge_class, schemes=None, hosts=None, domains=None):
+        """
+        Adds a bridge to the registry. Later registrations win.
+
+        Args:
+            bridge_class (type): The bridge
+            schemes (list): Command schemes to handle, defaults to the
+                bridge's ``schemes``
+            hosts (list): Hostnames to handle (subdomains included), defaults
+                to the bridge's ``hosts``
+            domains (list): Site names to handle on any country domain
+                (amazon for amazon.se, amazon.com.tr, etc), defaults to the
+                bridge's ``domains``. Exact hosts are checked first.
+        """
+        for scheme in bridge_class.schemes if schemes is None else schemes:
+            self.schemes[scheme.lower()] = bridge_class
+        for host in bridge_class.hosts if hosts is None else hosts:
+            self.hosts[host.lower()] = bridge_class
+        for domain in bridge_class.domains if domains is None else domains:
+            self.domains[domain.lower()] = bridge_class
+
+    def load_entry_points(self, group=ENTRY_POINT_GROUP):
+        """Registers every bridge that installed packages advertise. A
+        plugin that fails to load is skipped with a warning, so one broken
+        package doesn't take the rest of Persine down with it."""
+        if entry_points is None:
+            return
+
+        found = entry_points()
+        if hasattr(found, "select"):
+            found = found.select(group=group)
+        else:
+            found = found.get(group, [])
+
+        for entry_point in found:
+            try:
+                self.register(entry_point.load())
+            except Exception as err:
+                logger.warning(
+                    "Couldn't load bridge plugin %s: %r", entry_point.name, err
+                )
+
+    def find(self, url):
+        """
+        Args:
+            url (str): A command or URL
+
+        Returns:
+            type: The bridge that handles it, or None
+        """
+        parsed = urlparse(url)
+
+        if parsed.scheme not in ["http", "https"]:
+            return self.schemes.get(parsed.scheme.lower())
+
+        # Try www.youtube.com, then youtube.com, then com
+        labels = (parsed.hostname or "").split(".")
+        for i in range(len(labels)):
+            bridge_class = self.hosts.get(".".join(labels[i:]))
+            if bridge_class is not None:
+                return bridge_class
+
+        # Then the site name in front of a country ending like .se or
+        # .com.tr (but not amazon.example.com)
+        for i, label in enumerate(labels[:-1]):
+            suffix = labels[i + 1:]
+            if label in self.domains and len(suffix) <= 2 and all(len(part) <= 3 for part in suffix):  # noqa: E501
+                return self.domains[label]
+        return None
@@ -1,80 +1,352 @@
 import time
+import uuid
+import zlib
+import base64
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from urllib.parse import urlparse
 from urllib.parse import quote_plus
 from .bridge import BaseBridge
+from .. import timing
+
+# Each of these is a JavaScript function, installed on the page once and
+# then called by name (see BaseBridge.call_script)
+
+INITIAL_DATA_JS = """
+function() {
+    try {
+        return window.getPageData().data.response
+    } catch(err) {
+        return ytInitialData
+    }
+}
+"""
+
+# Only sends back a short string, instead of the enormous initial data
+PAGE_TYPE_JS = f"""
+function() {{
+    let types = {{
+        "twoColumnWatchNextResults": "video",
+        "twoColumnSearchResultsRenderer": "search_results",
+        "twoColumnBrowseResultsRenderer": "homepage",
+    }};
+    try {{
+        let data = ({INITIAL_DATA_JS})();
+        return types[Object.keys(data.contents)[0]] || "unknown";
+    }} catch(err) {{
+        return "unknown";
+    }}
+}}
+"""
+
+PLAYER_DATA_JS = """
+function() {
+    return document.getElementById('movie_player').getVideoData()
+}
+"""
+
+PLAYER_PAGE_DATA_JS = """
+function() {
+    let data = {};
+    let player = document.querySelector("#movie_player");
+
+    try { data['is_live'] = player.getVideoData().isLive } catch(err) {};
+    try { data['is_listed'] = player.getVideoData().isListed } catch(err) {};
+
+    try { data['channel_url'] = document.querySelector('.ytd-channel-name a')['href'] } catch(err) {};
+    try { data['channel_sub_count'] = document.querySelector("#owner-sub-count").innerText } catch(err) {};
+    try { data['view_count'] = document.querySelector('#info #count .view-count').innerText } catch(err) {};
+    try { data['posted_on'] = document.querySelector('#info #date yt-formatted-string').innerText } catch(err) {};
+    try { data['like_count'] = document.querySelector("yt-formatted-string[aria-label*= likes").ariaLabel } catch(err) {};
+    try { data['dislike_count'] = document.querySelector("yt-formatted-string[aria-label*= dislikes").ariaLabel } catch(err) {};
+    return data;
+}
+"""  # noqa: E501
+
+SIDEBAR_JS = """
+function() {
+    return [...document.querySelectorAll("#items.ytd-watch-next-secondary-results-renderer > *")].map((d, i) => {
+        let data = {};
+        try { data['item_type'] = d.tagName; } catch(err) {};
+        try { data['position'] = i + 1; } catch(err) {};
+        try { data['title'] = d.querySelector("h3").innerText } catch(err) {};
+        try { data['url'] = d.querySelector("a.yt-simple-endpoint")['href'] } catch(err) {};
+        try { data['channel_name'] = d.querySelector(".ytd-channel-name").innerText } catch(err) {};
+        try { data['metadata'] = d.querySelector("#metadata-line").innerText } catch(err) {};
+        try { data['duration_text'] = d.querySelector("span.ytd-thumbnail-overlay-time-status-renderer").innerText.trim() } catch(err) {};
+        try { data['thumbnail_url'] = d.querySelector("img")['src'] } catch(err) {};
+        return data;
+    })
+}
+"""  # noqa: E501
+
+CAPTION_TRACKS_JS = """
+function() {
+    let player = document.querySelector("#movie_player");
+    player.loadModule("captions");
+    return player.getOption("captions", "tracklist");
+}
+"""
+
+# Watches a video in the page, skipping ads when the skip button shows
+# up and listening for the player to finish. Resolves with the reason
+# it stopped, or "waiting" if it's still going after checkIn seconds.
+# Calling it again with the same token picks up the same watcher.
+WATCH_VIDEO_JS = """
+function(token, policy, watchSeconds, checkIn, onComplete) {
+
+function startWatching() {
+    let started = performance.now();
+    let player = null;
+    let policyApplied = false;
+    let timers = [];
+    let resolveWatch;
+
+    let watch = {
+        token: token,
+        result: null,
+        promise: new Promise(resolve => { resolveWatch = resolve }),
+        stop: () => finish("replaced"),
+    };
+
+    function finish(reason) {
+        if(watch.result) { return }
+        timers.forEach(timer => clearTimeout(timer));
+        try { player.removeEventListener('onStateChange', onStateChange) } catch(err) {}
+        if(reason == "ended") {
+            // Don't let autoplay move on without us
+            try { player.setAutonavState(1) } catch(err) {}
+        }
+        watch.result = {
+            reason: reason,
+            seconds: (performance.now() - started) / 1000,
+        };
+        resolveWatch(watch.result);
+    }
+
+    function giveUpAfter(seconds) {
+        timers.push(setTimeout(() => finish("timeout"), seconds * 1000));
+    }
+
+    function skipAd() {
+        let button = document.querySelector('.ytp-ad-skip-button, .ytp-ad-skip-button-modern, .ytp-skip-ad-button');
+        if(button && button.offsetParent !== null) {
+            button.click();
+        }
+    }
 
-class YoutubeBridge(BaseBridge):
-    """A bridge that interacts with and scrapes YouTube"""
+    function applyPolicy() {
+        policyApplied = true;
+        let duration = player.getDuration();
 
+        if(duration == 0 || player.getVideoData().isLive) {
+            finish("live");
+            return;
+        }
+        if(player.getPlayerState() != 1) {
+            player.playVideo();
+        }
+        if(window.location.href.indexOf('list') != -1) {
+            // Playlists won't stop on their own
+            finish("playlist");
+            return;
+        }
 
-    def __init__(self, driver):
-        self.driver = driver
+        if(policy == "skip_ahead") {
+            player.seekTo(duration - 2);
+            player.playVideo();
+            giveUpAfter(10);
+        } else if(policy == "full") {
+            giveUpAfter(duration - player.getCurrentTime() + 30);
+        } else {
+            timers.push(setTimeout(() => finish("watched"), watchSeconds * 1000));
+        }
+    }
 
-    def __disable_autoplay(self):
-        self.driver.execute_script(
-            "document.getElementById('movie_player').setAutonavState(1);"
-        )
+    function onCurrentVideo() {
+        let wanted = new URLSearchParams(window.location.search).get('v');
+        let data = player.getVideoData();
+        return !wanted || !data || !data.video_id || data.video_id == wanted;
+    }
 
-    def __click_link(self, text, timeout=3):
-        try:
-            WebDriverWait(self.driver, timeout).until(
-                EC.visibility_of_element_located((By.PARTIAL_LINK_TEXT, text))
-            )
-            self.driver.find_element_by_link_text(text).click()
-        except Exception:
-            pass
+    function onStateChange(state) {
+        if(state == 0 && policyApplied) {
+            finish("ended");
+        }
+    }
+
+    function tick() {
+        if(watch.result) { return }
+
+        if(!player) {
+            let candidate = document.getElementById('movie_player');
+            if(!candidate || !candidate.getPlayerState) { return }
+            player = candidate;
+            try { player.addEventListener('onStateChange', onStateChange) } catch(err) {}
+        }
 
-    def __get_player_state(self):
-        # -1 – unstarted
-        # 0 – ended
-        # 1 – playing
-        # 2 – paused
-        # 3 – buffering
-        # 5 – video cued
-        return self.driver.execute_script(
-            "return document.getElementById('movie_player').getPlayerState();"
-        )
-
-    def __play_video(self):
-        self.driver.execute_script(
-            """
-        document.getElementById('movie_player').playVideo();
-        """
-        )
-
-    def __get_player_data(self):
-        return self.driver.execute_script(
-            """
-        return document.getElementById('movie_player').getVideoData()
-        """
-        )
-
-    def __get_player_page_data(self):
-        return self.driver.execute_script(
-            """
-            data = {};
-            player = document.querySelector("#movie_player");
-
-            try { data['is_live'] = player.getVideoData().isLive } catch(err) {};
-            try { data['is_listed'] = player.getVideoData().isListed } catch(err) {};
-
-            try { data['channel_url'] = document.querySelector('.ytd-channel-name a')['href'] } catch(err) {};
-            try { data['channel_sub_count'] = document.querySelector("#owner-sub-count").innerText } catch(err) {};
-            try { data['view_count'] = document.querySelector('#info #count .view-count').innerText } catch(err) {};
-            try { data['view_count'] = document.querySelector('#info #count .view-count').innerText } catch(err) {};
-            try { data['posted_on'] = document.querySelector('#info #date yt-formatted-string').innerText } catch(err) {};
-            try { data['like_count'] = document.querySelector("yt-formatted-string[aria-label*= likes").ariaLabel } catch(err) {};
-            try { data['dislike_count'] = document.querySelector("yt-formatted-string[aria-label*= dislikes").ariaLabel } catch(err) {};
-            return data;
-        """
-        )
-
-    def __get_video_data(self):
-        data = self.__get_player_data()
-        player_page_data = self.__get_player_page_data()
+        let state = player.getPlayerState();
+        if(player.classList.contains('ad-showing')) {
+            skipAd();
+        } else if(!policyApplied) {
+            if(!onCurrentVideo()) {
+                // Still the video we came from (often ended, since autonav
+                // is off), wait for the new one to load
+            } else if(state == 1) {
+                applyPolicy();
+            } else {
+                // Not started, buffering, paused or cued, give it a nudge
+                player.playVideo();
+            }
+        } else if(state == 0) {
+            finish("ended");
+        }
+    }
+
+    // Ads can run long, so only give up on pages that never get going
+    timers.push(setTimeout(() => policyApplied || finish("no_video"), 120 * 1000));
+    timers.push(setInterval(tick, 250));
+    tick();
+
+    return watch;
+}
+
+let watch = window.__persineWatch;
+if(!watch || watch.token != token) {
+    if(watch) { watch.stop() }
+    watch = window.__persineWatch = startWatching();
+}
+
+if(watch.result) {
+    onComplete(watch.result);
+} else {
+    let checkInTimer = setTimeout(() => onComplete({ reason: "waiting" }), checkIn * 1000);
+    watch.promise.then(result => {
+        clearTimeout(checkInTimer);
+        onComplete(result);
+    });
+}
+}
+"""  # noqa: E501
+
+PAGE_CONTENTS_JS = f"""
+function(includeInitialData) {{
+let contents = {{ "page_type": ({PAGE_TYPE_JS})() }};
+
+if(includeInitialData) {{
+    // A string is much cheaper to send back than a giant nested object
+    try {{
+        contents["initial_data"] = JSON.stringify(({INITIAL_DATA_JS})());
+    }} catch(err) {{}}
+}}
+
+if(contents["page_type"] == "video") {{
+    contents["player_data"] = ({PLAYER_DATA_JS})();
+    contents["player_page_data"] = ({PLAYER_PAGE_DATA_JS})();
+    contents["sidebar"] = ({SIDEBAR_JS})();
+    contents["caption_tracks"] = ({CAPTION_TRACKS_JS})();
+}}
+return contents;
+}}
+"""
+
+SEARCH_RESULTS_JS = """
+function() {
+    return [...document.querySelectorAll("#contents.ytd-item-section-renderer > *")].map((d, i) => {
+        let data = {};
+        try { data['item_type'] = d.tagName; } catch(err) {};
+        try { data['position'] = i + 1; } catch(err) {};
+        try { data['thumbnail_url'] = d.querySelector("img")['src'] } catch(err) {};
+        try { data['title'] = d.querySelector("h3").innerText } catch(err) {};
+        try { data['url'] = d.querySelector("a.yt-simple-endpoint")['href'] } catch(err) {};
+        try { data['channel_name'] = d.querySelector(".ytd-channel-name a").innerText } catch(err) {};
+        try { data['channel_url'] = d.querySelector(".ytd-channel-name a")['href'] } catch(err) {};
+        try { data['metadata'] = d.querySelector("#metadata-line").innerText } catch(err) {};
+        try { data['metadata'] = d.querySelector(".movie-metadata-list").innerText } catch(err) {};
+        try { data['duration_text'] = d.querySelector("span.ytd-thumbnail-overlay-time-status-renderer").innerText } catch(err) {};
+        try { data['description'] = d.querySelector("#description-text ").innerText } catch(err) {};
+        return data;
+    })
+}
+"""  # noqa: E501
+
+HOMEPAGE_JS = """
+function() {
+    return [...document.querySelectorAll("#contents.ytd-rich-grid-renderer > ytd-rich-item-renderer")].map((d, i) => {
+        let data = {};
+        try { data['item_type'] = d.tagName; } catch(err) {};
+        try { data['position'] = i + 1; } catch(err) {};
+        try { data['thumbnail_url'] = d.querySelector("img")['src'] } catch(err) {};
+        try { data['title'] = d.querySelector("h3").innerText } catch(err) {};
+        try { data['url'] = d.querySelector("a.yt-simple-endpoint")['href'] } catch(err) {};
+        try { data['channel_name'] = d.querySelector(".ytd-channel-name a").innerText } catch(err) {};
+        try { data['channel_url'] = d.querySelector(".ytd-channel-name a")['href'] } catch(err) {};
+        try { data['metadata'] = d.querySelector("#metadata-line").innerText } catch(err) {};
+        try { data['metadata'] = d.querySelector(".movie-metadata-list").innerText } catch(err) {};
+        try { data['duration_text'] = d.querySelector("span.ytd-thumbnail-overlay-time-status-renderer").innerText } catch(err) {};
+        try { data['description'] = d.querySelector("#description-text ").innerText } catch(err) {};
+        return data;
+    })
+}
+"""  # noqa: E501
+
+REMOVE_POPUPS_JS = """
+function() {
+    document.querySelectorAll('.ytd-popup-container').forEach(d=> d.remove());
+}
+"""
+
+
+class YoutubeBridge(BaseBridge):
+    """A bridge that interacts with and scrapes YouTube
+
+    Args:
+        driver: A Selenium WebDriver used to navigate
+        initial_data (boolean): Whether to save YouTube's own data about
+            the page (ytInitialData), compressed, as initial_data
+        watch (Union[str, float]): How long to stay on each video.
+            "skip_ahead" jumps to the last couple seconds and waits for the
+            end, "full" watches the whole thing, and a number watches
+            that many seconds.
+        check_in (float): How often, in seconds, to check on the video
+            while it's being watched
+    """
+
+
+    schemes = ("youtube",)
+    hosts = ("youtube.com", "youtu.be")
+    # Where youtube:homepage and youtube:search go, the search
+    # term is filled in for {}
+    home_url = "https://www.youtube.com/"
+    search_url = "https://www.youtube.com/results?search_query={}"
+    scripts = {
+        "page_type": PAGE_TYPE_JS,
+        "page_contents": PAGE_CONTENTS_JS,
+        "search_results": SEARCH_RESULTS_JS,
+        "homepage": HOMEPAGE_JS,
+        "watch_video": WATCH_VIDEO_JS,
+        "remove_popups": REMOVE_POPUPS_JS,
+    }
+
+    def __init__(self, driver, initial_data=False, watch="skip_ahead", check_in=20):  # noqa: E501
+        super().__init__(driver)
+        self.initial_data = initial_data
+        self.watch = watch
+        self.check_in = check_in
+        self.watch_result = None
+
+    @classmethod
+    def from_engine(cls, driver, engine):
+        return cls(driver, initial_data=engine.initial_data, watch=engine.watch)
+
+    def __get_page_contents(self):
+        # Everything we need from a video page in a single round trip
+        return self.call_script("page_contents", self.initial_data)
+
+    def __build_video_data(self, contents):
+        data = contents["player_data"]
+        player_page_data = contents["player_page_data"]
         video = {
             **player_page_data,
             "page_type": "video",
@@ -83,72 +355,25 @@ class YoutubeBridge(BaseBridge):
             "channel_name": data.get("author", None),
             "is_live": player_page_data.get("is_live", None),
             "is_listed": player_page_data.get("is_listed", None),
-            "recommendations": self.__scrape_sidebar(),
-            "caption_tracks": self.driver.execute_script(
-                """
-                 player = document.querySelector("#movie_player");
-                 player.loadModule("captions");
-                 return player.getOption("captions", "tracklist");
-             """
-            ),
+            "recommendations": self.__filter_sidebar(contents["sidebar"]),
+            "caption_tracks": contents["caption_tracks"],
         }
 
         return video
 
-    def __get_page_data(self):
-        return self.driver.execute_script(
-            """
-            try {
-                return window.getPageData().data.response
-            } catch(err) {
-                return ytInitialData
-            }
-        """
-        )
-
-    def __scrape_sidebar(self):
-        recs = self.driver.execute_script(
-            """
-        return [...document.querySelectorAll("#items.ytd-watch-next-secondary-results-renderer > *")].map((d, i) => {
-            data = {};
-            try { data['item_type'] = d.tagName; } catch(err) {};
-            try { data['position'] = i + 1; } catch(err) {};
-            try { data['title'] = d.querySelector("h3").innerText } catch(err) {};
-            try { data['url'] = d.querySelector("a.yt-simple-endpoint")['href'] } catch(err) {};
-            try { data['channel_name'] = d.querySelector(".ytd-channel-name").innerText } catch(err) {};
-            try { data['metadata'] = d.querySelector("#metadata-line").innerText } catch(err) {};
-            try { data['duration_text'] = d.querySelector("span.ytd-thumbnail-overlay-time-status-renderer").innerText.trim() } catch(err) {};
-            try { data['thumbnail_url'] = d.querySelector("img")['src'] } catch(err) {};
-            return data;
-        })
-        """  # noqa: E501
-        )
-        recs = [
+    def __compress_initial_data(self, contents):
+        if contents.get("initial_data") is None:
+            return {}
+        compressed = zlib.compress(contents["initial_data"].encode("utf-8"))
+        return {"initial_data": base64.b64encode(compressed).decode("utf-8")}
+
+    def __filter_sidebar(self, recs):
+        return [
             rec for rec in recs if rec["item_type"] != "YTD-CONTINUATION-ITEM-RENDERER"
         ]
 
-        return recs
-
     def __scrape_search_results(self):
-        recs = self.driver.execute_script(
-            """
-        return [...document.querySelectorAll("#contents.ytd-item-section-renderer > *")].map((d, i) => {
-            data = {};
-            try { data['item_type'] = d.tagName; } catch(err) {};
-            try { data['position'] = i + 1; } catch(err) {};
-            try { data['thumbnail_url'] = d.querySelector("img")['src'] } catch(err) {};
-            try { data['title'] = d.querySelector("h3").innerText } catch(err) {};
-            try { data['url'] = d.querySelector("a.yt-simple-endpoint")['href'] } catch(err) {};
-            try { data['channel_name'] = d.querySelector(".ytd-channel-name a").innerText } catch(err) {};
-            try { data['channel_url'] = d.querySelector(".ytd-channel-name a")['href'] } catch(err) {};
-            try { data['metadata'] = d.querySelector("#metadata-line").innerText } catch(err) {};
-            try { data['metadata'] = d.querySelector(".movie-metadata-list").innerText } catch(err) {};
-            try { data['duration_text'] = d.querySelector("span.ytd-thumbnail-overlay-time-status-renderer").innerText } catch(err) {};
-            try { data['description'] = d.querySelector("#description-text ").innerText } catch(err) {};
-            return data;
-        })
-        """  # noqa: E501
-        )
+        recs = self.call_script("search_results")
         recs = [
             rec
             for rec in recs
@@ -157,121 +382,38 @@ class YoutubeBridge(BaseBridge):
         return recs
 
     def __scrape_homepage(self):
-        return self.driver.execute_script(
-            """
-        return [...document.querySelectorAll("#contents.ytd-rich-grid-renderer > ytd-rich-item-renderer")].map((d, i) => {
-            data = {};
-            try { data['item_type'] = d.tagName; } catch(err) {};
-            try { data['position'] = i + 1; } catch(err) {};
-            try { data['thumbnail_url'] = d.querySelector("img")['src'] } catch(err) {};
-            try { data['title'] = d.querySelector("h3").innerText } catch(err) {};
-            try { data['url'] = d.querySelector("a.yt-simple-endpoint")['href'] } catch(err) {};
-            try { data['channel_name'] = d.querySelector(".ytd-channel-name a").innerText } catch(err) {};
-            try { data['channel_url'] = d.querySelector(".ytd-channel-name a")['href'] } catch(err) {};
-            try { data['metadata'] = d.querySelector("#metadata-line").innerText } catch(err) {};
-            try { data['metadata'] = d.querySelector(".movie-metadata-list").innerText } catch(err) {};
-            try { data['duration_text'] = d.querySelector("span.ytd-thumbnail-overlay-time-status-renderer").innerText } catch(err) {};
-            try { data['description'] = d.querySelector("#description-text ").innerText } catch(err) {};
-            return data;
-        })
-        """  # noqa: E501
-        )
-
-    def __attempt_ad_skip(self, delay=6):
-        time.sleep(delay)
-        self.driver.find_element_by_class_name("ytp-ad-skip-button-text").click()
-
-    def __wait_for_video_completion(self, skipahead=True):
-        try:
-            # Confirm it's a video page
-            self.driver.find_element_by_css_selector("#movie_player")
+        return self.call_script("homepage")
+
+    def __wait_for_video_completion(self):
+        # The watching happens in the browser, and we check back in every
+        # few seconds so no single script runs into WebDriver's timeout
+        token = uuid.uuid4().hex
+        if self.watch in ("skip_ahead", "full"):
+            policy, seconds = self.watch, 0
+        else:
+            policy, seconds = "seconds", float(self.watch)
 
-            # Wait for the player to be ready
+        with timing.phase("wait"):
             while True:
-                try:
-                    # This will throw an exception if the player 
-                    # is not initialized
-                    self.__get_player_state()
+                result = self.call_async_script(
+                    "watch_video", token, policy, seconds, self.check_in
+                )
+                if result["reason"] != "waiting":
                     break
-                except:
-                    time.sleep(1)
-        except:
-            pass
-
-        try:
-            # Wait for ad overlay to show up, then click the 
-            # skip button.
-            WebDriverWait(self.driver, 3).until(
-                EC.visibility_of_element_located((By.CLASS_NAME, "ad-showing"))
-            )
-            self.__attempt_ad_skip()
-        except:
-            # No ad
-            pass
 
-        if self.__get_player_state() != 1:
-            self.__play_video()
-
-        if skipahead:
-            time.sleep(1)
-            self.driver.execute_script(
-                """
-                let player = document.getElementById('movie_player');
-                player.seekTo(player.getDuration() - 2);
-                player.playVideo()
-            """
-            )
-
-        # In case we do get stuck behind an ad, we'll wait for a long time
-        length = self.driver.execute_script(
-            "return document.getElementById('movie_player').getDuration()"
-        )
-        
-        is_live = self.driver.execute_script(
-            "return document.getElementById('movie_player').getVideoData().isLive"
-        )
-
-        if length == 0 or is_live:
-            # It's live, just exit
-            time.sleep(1)
-            return
-        elif 'list' in self.driver.current_url:
-            # It's a playlist, just move on because
-            # it won't autostop
-            return
-        else:
-            try:
-                # Wait until it's done, or up to XX seconds
-                # max_wait = length + 20
-                max_wait = 10
-                WebDriverWait(self.driver, max_wait).until(
-                    lambda s: self.__get_player_state() == 0
-                )
-                self.__disable_autoplay()
-            except:
-                return
+        self.watch_result = result
+        return result
 
     def __get_page_type(self):
-        # TODO remove and replace
-        try:
-            key = list(self.__get_page_data()["contents"].keys())[0]
-            types = {
-                "twoColumnWatchNextResults": "video",
-                "twoColumnSearchResultsRenderer": "search_results",
-                "twoColumnBrowseResultsRenderer": "homepage",
-            }
-            return types[key]
-        except:
-            return "unknown"
+        return self.call_script("page_type")
 
     def get_data(self):
-        page_type = self.__get_page_type()
-        if page_type == "unknown":
-            return { "page_type": page_type }
-        elif page_type == "video":
-            return self.__get_video_data()
+        contents = self.__get_page_contents()
+        page_type = contents["page_type"]
+        if page_type == "video":
+            data = self.__build_video_data(contents)
         elif page_type == "search_results":
-            return {
+            data = {
                 "page_type": page_type,
                 "term": self.driver.find_element_by_css_selector(
                     "input#search"
@@ -279,32 +421,30 @@ class YoutubeBridge(BaseBridge):
                 "recommendations": self.__scrape_search_results(),
             }
         elif page_type == "homepage":
-            return {"page_type": page_type, "recommendations": self.__scrape_homepage()}
+            data = {"page_type": page_type, "recommendations": self.__scrape_homepage()}
+        else:
+            data = { "page_type": page_type }
+
+        return {**data, **self.__compress_initial_data(contents)}
 
     def run(self, url):
         parsed = urlparse(url)
 
         # Remove popups that might get in the way of clicking
         try:
-            self.driver.execute_script(
-                """
-                document.querySelectorAll('.ytd-popup-container').forEach(d=> d.remove());
-            """  # noqa: E501
-            )
+            self.call_script("remove_popups")
         except Exception:
             pass
 
         # Execute the command
         if parsed.scheme in ["http", "https"]:
-            self.driver.get(url)
+            self.navigate(url)
             if self.__get_page_type() == "video":
                 self.__wait_for_video_completion()
         elif parsed.path == "homepage":
-            self.driver.get("https://www.youtube.com/")
+            self.navigate(self.home_url)
         elif parsed.path == "search":
-            self.driver.get(
-                f"https://www.youtube.com/results?search_query={quote_plus(parsed.query)}"  # noqa: E501
-            )
+            self.navigate(self.search_url.format(quote_plus(parsed.query)))
         elif parsed.path == "next_up":
             self.driver.find_element_by_css_selector(
                 "ytd-compact-autoplay-renderer h3"
@@ -344,4 +484,4 @@ class YoutubeBridge(BaseBridge):
         else:
             raise Exception(f"unknown URL {url}")
 
-        return self.get_data()
+        return self.scrape()
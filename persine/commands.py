@@ -0,0 +1,174 @@
+import json
+import os
+from urllib.parse import urlparse, urldefrag
+
+
+def expand(commands):
+    """
+    Splits repeated commands like youtube:next_up#3 into one entry per
+    repetition, so each one can be checkpointed on its own.
+
+    Returns:
+        list: Dicts with the command to run and the index of the
+            command it came from
+    """
+    entries = []
+    for index, command in enumerate(commands):
+        parsed = urlparse(command)
+        if parsed.scheme not in ["http", "https"] and parsed.fragment:
+            repeat = int(parsed.fragment)
+            command = urldefrag(command).url
+        else:
+            repeat = 1
+        entries.extend({"command": command, "index": index} for _ in range(repeat))
+    return entries
+
+
+class CommandQueue:
+    """
+    A batch of commands saved to disk, along with how far we've gotten
+    through it, so if the browser (or Python) crashes, running the same
+    batch again picks up right where it stopped.
+
+    The file is JSON Lines: the plan is written once when the batch
+    starts, then each finished command appends a line with the key of its
+    state. Like the history journal, lines are flushed to the OS right
+    away and only forced to disk every so often.
+
+    Args:
+        path (str): Where to keep the queue
+        fsync_every (int): Force the file to disk after this many finished
+            commands
+    """
+
+    def __init__(self, path, fsync_every=50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.plan = None
+        self.entries = []
+        self.keys = []
+        self._handle = None
+        self._unsynced = 0
+        self.load()
+
+    def load(self):
+        """Reads the queue back from disk, if there is one"""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            lines = f.read().splitlines()
+        if not lines:
+            return
+        saved = json.loads(lines[0])
+        keys = []
+        for line in lines[1:]:
+            try:
+                keys.append(json.loads(line))
+            except ValueError:
+                # Cut off mid-write, that command never finished
+                break
+        self.plan = saved["plan"]
+        self.entries = saved["entries"]
+        self.keys = keys
+
+    def start(self, commands):
+        """
+        Starts a new batch, unless the same batch was already started and
+        never finished, in which case it's continued.
+
+        Args:
+            commands (list): The commands in the batch
+
+        Returns:
+            boolean: Whether an unfinished batch is being continued
+        """
+        commands = list(commands)
+        if self.plan == commands and self.remaining():
+            return True
+
+        self.plan = commands
+        self.entries = expand(commands)
+        self.keys = []
+        self.save()
+        return False
+
+    def remaining(self):
+        """
+        Returns:
+            list: The entries that haven't finished yet
+        """
+        return self.entries[len(self.keys):]
+
+    def complete(self, key):
+        """Marks the next entry as finished, with the key of its state"""
+        if self._handle is None:
+            self._handle = open(self.path, "r+b")
+            # Drop anything cut off mid-write, so the key gets a line of
+            # its own
+            contents = self._handle.read()
+            self._handle.truncate(contents.rfind(b"\n") + 1)
+            self._handle.seek(0, os.SEEK_END)
+
+        self._handle.write((json.dumps(key) + "\n").encode("utf-8"))
+        self._handle.flush()
+        self.keys.append(key)
+
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def results(self):
+        """
+        Returns:
+            list: The key of the last state from each command in the plan
+        """
+        last = {}
+        for entry, key in zip(self.entries, self.keys):
+            last[entry["index"]] = key
+        return [last.get(index) for index in range(len(self.plan or []))]
+
+    def save(self):
+        """Writes the plan (and any finished keys) out from scratch"""
+        self.close()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write next to the old file and swap it in, so a crash never
+        # leaves a half-written plan
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            lines = [{"plan": self.plan, "entries": self.entries}] + self.keys
+            f.write(b"".join((json.dumps(line) + "\n").encode("utf-8") for line in lines))  # noqa: E501
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def sync(self):
+        """Forces any finished commands to disk"""
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """Syncs and closes the file"""
+        if self._handle is not None:
+            self.sync()
+            self._handle.close()
+            self._handle = None
+
+    def delete(self):
+        """Forgets the batch and removes the file"""
+        self.close()
+        self.plan = None
+        self.entries = []
+        self.keys = []
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
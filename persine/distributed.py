@@ -0,0 +1,442 @@
+import abc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from .history import LazyState
+from .utils import RecommendationList
+from .utils import state_recommendations
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    A list of commands for a single persona, handed out by a JobQueue
+
+    Args:
+        id: The job's id in the queue
+        persona (str): The persona's name
+        commands (list): The commands to run
+        worker (str): The worker it was handed to
+        attempt (int): Which try this is, starting at 1
+    """
+
+    def __init__(self, id, persona, commands, worker=None, attempt=1):
+        self.id = id
+        self.persona = persona
+        self.commands = commands
+        self.worker = worker
+        self.attempt = attempt
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.persona!r}, {len(self.commands)} commands)"  # noqa: E501
+
+
+class JobQueue(abc.ABC):
+    """
+    Where a coordinator puts persona jobs and workers pick them up. A
+    persona's Chrome profile lives on whichever worker ran it first, so
+    every later job for that persona goes to the same worker.
+
+    Subclass this to use your own queue (Redis, a database, a cloud queue,
+    etc). :class:`SQLiteJobQueue` works for a single machine, or machines
+    sharing a network drive.
+    """
+
+    @abc.abstractmethod
+    def submit(self, persona, commands):
+        """
+        Adds a job
+
+        Args:
+            persona (str): The persona's name
+            commands (list): The commands the persona should run
+
+        Returns:
+            The job's id
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self, worker):
+        """
+        Hands the next job to a worker. Only jobs for personas that belong
+        to this worker, or that don't belong to anyone yet, are handed out.
+
+        Args:
+            worker (str): The worker's id
+
+        Returns:
+            Job: The job, or None if there's nothing for this worker
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, job, states):
+        """
+        Marks a job as finished and saves the history it produced
+
+        Args:
+            job (Job): The finished job
+            states (list): The new history states, in order
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, job, error):
+        """
+        Reports that a job crashed. It goes back in the queue to be tried
+        again (on the same worker, which has its checkpoint) until it's
+        out of attempts, then it's marked as failed for good.
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, job):
+        """Lets the queue know a job is still running, so it isn't taken
+        for abandoned. Queues without leases can ignore it."""
+        pass
+
+    @abc.abstractmethod
+    def release(self, worker):
+        """Gives a worker's personas and unfinished jobs back to the pool,
+        e.g. after the machine died and its profiles are gone"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def history(self, persona):
+        """
+        Returns:
+            list: Every state the persona's jobs have pushed back
+        """
+        raise NotImplementedError
+
+    def recommendations(self, persona):
+        """
+        Returns:
+            RecommendationList: The persona's recommendations, rebuilt from
+                its history
+        """
+        recommendations = RecommendationList([])
+        for state in self.history(persona):
+            recommendations.extend(state_recommendations(state))
+        return recommendations
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    persona TEXT NOT NULL,
+    commands TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS owners (
+    persona TEXT PRIMARY KEY,
+    worker TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    job INTEGER NOT NULL,
+    persona TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_persona ON history (persona, job, position);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    A JobQueue kept in a SQLite file. Safe to use from many threads and
+    processes at once.
+
+    A running job holds a lease that the worker renews with heartbeat. If
+    the worker goes quiet for longer than that (it lost power, got killed,
+    etc), the job goes back in the queue the next time anyone claims one.
+
+    Args:
+        path (str): The database file
+        max_attempts (int): How many times a job is tried before it's
+            marked as failed for good
+        lease (float): Seconds a running job can go without a heartbeat
+            before it's taken for abandoned
+    """
+
+    def __init__(self, path, max_attempts=3, lease=600):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease = lease
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path, timeout=30)
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self):
+        # A connection per call keeps it thread-safe, and sqlite waits
+        # (up to timeout) for other writers instead of failing
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return _Transaction(db)
+
+    def submit(self, persona, commands):
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO jobs (persona, commands, updated) VALUES (?, ?, ?)",
+                (persona, json.dumps(list(commands)), time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker):
+        with self._connect() as db:
+            self._expire_leases(db)
+            # Oldest job whose persona is ours or nobody's, skipping personas
+            # that already have a job running
+            row = db.execute(
+                """
+                SELECT jobs.id, jobs.persona, jobs.commands, jobs.attempts
+                FROM jobs
+                LEFT JOIN owners ON owners.persona = jobs.persona
+                WHERE jobs.status = 'queued'
+                AND (owners.worker IS NULL OR owners.worker = ?)
+                AND jobs.persona NOT IN (
+                    SELECT persona FROM jobs WHERE status = 'running'
+                )
+                ORDER BY jobs.id LIMIT 1
+                """,
+                (worker,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, updated = ? WHERE id = ?",  # noqa: E501
+                (worker, time.time(), row["id"]),
+            )
+            db.execute(
+                "INSERT OR IGNORE INTO owners (persona, worker) VALUES (?, ?)",
+                (row["persona"], worker),
+            )
+            return Job(
+                row["id"],
+                row["persona"],
+                json.loads(row["commands"]),
+                worker=worker,
+                attempt=row["attempts"] + 1,
+            )
+
+    def _expire_leases(self, db):
+        stale = time.time() - self.lease
+        db.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired', worker = NULL WHERE status = 'running' AND updated < ? AND attempts >= ?",  # noqa: E501
+            (stale, self.max_attempts),
+        )
+        # The persona still belongs to the same worker, so when it comes
+        # back it picks the job up from its checkpoint
+        db.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND updated < ?",  # noqa: E501
+            (stale,),
+        )
+
+    def _still_running(self, db, job):
+        # False if the job's lease ran out and it was handed out again,
+        # even if it went back to the same worker
+        cursor = db.execute(
+            "UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?",  # noqa: E501
+            (time.time(), job.id, job.worker, job.attempt),
+        )
+        return cursor.rowcount > 0
+
+    def heartbeat(self, job):
+        with self._connect() as db:
+            self._still_running(db, job)
+
+    def complete(self, job, states):
+        with self._connect() as db:
+            if not self._still_running(db, job):
+                raise Exception(
+                    f"{job!r} went without a heartbeat for too long and "
+                    "was put back in the queue"
+                )
+            db.executemany(
+                "INSERT INTO history (job, persona, position, state) VALUES (?, ?, ?, ?)",  # noqa: E501
+                [
+                    (job.id, job.persona, position, json.dumps(state))
+                    for position, state in enumerate(states)
+                ],
+            )
+            db.execute(
+                "UPDATE jobs SET status = 'done', updated = ? WHERE id = ?",
+                (time.time(), job.id),
+            )
+
+    def fail(self, job, error):
+        with self._connect() as db:
+            db.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE
+                        WHEN attempts >= ? THEN 'failed' ELSE 'queued'
+                    END,
+                    worker = NULL, error = ?, updated = ?
+                WHERE id = ? AND status = 'running' AND worker = ?
+                AND attempts = ?
+                """,
+                (self.max_attempts, str(error), time.time(), job.id, job.worker, job.attempt),  # noqa: E501
+            )
+
+    def release(self, worker):
+        with self._connect() as db:
+            db.execute("DELETE FROM owners WHERE worker = ?", (worker,))
+            db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND worker = ?",  # noqa: E501
+                (worker,),
+            )
+
+    def status(self):
+        """
+        Returns:
+            dict: How many jobs are queued, running, done and failed
+        """
+        with self._connect() as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+            return {status: count for status, count in rows}
+
+    def history(self, persona):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT state FROM history WHERE persona = ? ORDER BY job, position",  # noqa: E501
+                (persona,),
+            )
+            return [json.loads(row["state"]) for row in rows]
+
+
+class _Transaction:
+    """Runs everything inside a with block as one write transaction,
+    then closes the connection"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+
+
+class Worker:
+    """
+    Pulls jobs off a queue and runs them on this machine, one persona at a
+    time. Personas keep their Chrome profile here between jobs, and each
+    job's commands are checkpointed (see :meth:`~persine.Persona.run_batch`).
+    A job that crashes goes back in the queue, and since its persona
+    belongs to this worker, it's retried here and picks up where it left
+    off.
+
+    Args:
+        engine (PersonaEngine): Runs the personas
+        queue (JobQueue): Where the jobs come from
+        worker_id (str): A name for this worker that stays the same across
+            restarts, so it keeps its personas. Defaults to the hostname.
+        heartbeat_interval (float): Seconds between letting the queue know
+            a job is still running. Keep it well under the queue's lease.
+    """
+
+    def __init__(self, engine, queue, worker_id=None, heartbeat_interval=60):
+        self.engine = engine
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.getnode():x}"
+        self.heartbeat_interval = heartbeat_interval
+
+    def run_job(self, job):
+        """Runs a single job and reports back to the queue"""
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, stop), daemon=True)  # noqa: E501
+        heartbeat.start()
+        try:
+            # Anything that goes wrong, from loading the persona to pushing
+            # its history back, sends the job back to the queue
+            persona = self.engine.persona(job.persona, resume=True, overwrite=True)  # noqa: E501
+            start = self._job_start(persona, job)
+            try:
+                persona.run_batch(job.commands)
+            finally:
+                if persona.driver is not None:
+                    persona.quit()
+
+            self.queue.complete(job, [
+                state.materialize() if isinstance(state, LazyState) else state
+                for state in persona.history[start:]
+            ])
+        except Exception as err:
+            self.queue.fail(job, err)
+            raise
+        finally:
+            stop.set()
+            heartbeat.join()
+        return persona
+
+    def _heartbeat(self, job, stop):
+        while not stop.wait(self.heartbeat_interval):
+            self.queue.heartbeat(job)
+
+    def _job_start(self, persona, job):
+        # A retried job continues its checkpointed batch, so the states it
+        # made before the crash need to be pushed back too
+        queued = persona.commands
+        if queued.plan == list(job.commands) and queued.keys:
+            for index, state in enumerate(persona.history):
+                if state["key"] == queued.keys[0]:
+                    return index
+        return len(persona.history)
+
+    def run_once(self):
+        """
+        Claims and runs one job
+
+        Returns:
+            boolean: Whether there was a job to run
+        """
+        job = self.queue.claim(self.worker_id)
+        if job is None:
+            return False
+        try:
+            self.run_job(job)
+        except Exception:
+            # Already reported to the queue (if it could be), move on to
+            # the next one
+            logger.exception("Job %r failed on worker %s", job, self.worker_id)
+        return True
+
+    def run(self, poll_interval=5, stop_when_empty=False):
+        """
+        Keeps running jobs, waiting poll_interval seconds whenever the
+        queue has nothing for this worker
+
+        Args:
+            poll_interval (float): Seconds to wait between checks
+            stop_when_empty (boolean): Return instead of waiting once
+                there's nothing left to do
+        """
+        while True:
+            if not self.run_once():
+                if stop_when_empty:
+                    return
+                time.sleep(poll_interval)
@@ -0,0 +1,245 @@
+import json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+STRING = "string"
+# Columns that repeat the same few values over and over are stored once
+# per chunk and referenced by number
+CATEGORY = "category"
+INTEGER = "integer"
+BOOLEAN = "boolean"
+
+# Known columns for each bridge. Anything else ends up in the "extra"
+# column as JSON, so the schema never changes from file to file.
+RECOMMENDATION_COLUMNS = {
+    "youtube": {
+        "action_key": CATEGORY,
+        "item_type": CATEGORY,
+        "position": INTEGER,
+        "title": STRING,
+        "url": CATEGORY,
+        "channel_name": CATEGORY,
+        "channel_url": CATEGORY,
+        "metadata": STRING,
+        "duration_text": STRING,
+        "thumbnail_url": STRING,
+        "description": STRING,
+    },
+    "amazon": {
+        "action_key": CATEGORY,
+        "index": INTEGER,
+        "asin": CATEGORY,
+        "title": STRING,
+        "url": CATEGORY,
+        "img": STRING,
+        "section_title": CATEGORY,
+        "is_sponsored": BOOLEAN,
+        "stars": CATEGORY,
+        "ratings": STRING,
+        "review_count": STRING,
+        "best_seller": STRING,
+        "price": STRING,
+        "old_price": STRING,
+        "price_range": STRING,
+        "free_shipping": BOOLEAN,
+        "is_prime": BOOLEAN,
+    },
+}
+
+HISTORY_COLUMNS = {
+    "key": STRING,
+    "action": CATEGORY,
+    "page_title": STRING,
+    "url": CATEGORY,
+    "date": STRING,
+    "url_before_action": CATEGORY,
+    "page_type": CATEGORY,
+    "title": STRING,
+    "id": CATEGORY,
+    "channel_name": CATEGORY,
+    "channel_url": CATEGORY,
+    "channel_sub_count": STRING,
+    "view_count": STRING,
+    "posted_on": STRING,
+    "like_count": STRING,
+    "dislike_count": STRING,
+    "is_live": BOOLEAN,
+    "is_listed": BOOLEAN,
+    "term": STRING,
+    "query": STRING,
+    "page_source": STRING,
+    "page_source_blob": STRING,
+    "screenshot": STRING,
+    "screenshot_blob": STRING,
+}
+
+# Recommendations are exported separately
+HISTORY_SKIPPED = ("recommendations",)
+
+
+def recommendation_columns(bridge=None):
+    """
+    Args:
+        bridge (str): "youtube", "amazon", or None for every known column
+
+    Returns:
+        dict: Column names mapped to their kind
+    """
+    if bridge is not None:
+        return RECOMMENDATION_COLUMNS[bridge]
+
+    columns = {}
+    for bridge_columns in RECOMMENDATION_COLUMNS.values():
+        columns.update(bridge_columns)
+    return columns
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError(
+            "Exporting to Parquet or Arrow needs pyarrow: pip install persine[parquet]"  # noqa: E501
+        )
+
+
+def _arrow_type(kind):
+    if kind == INTEGER:
+        return pa.int64()
+    elif kind == BOOLEAN:
+        return pa.bool_()
+    elif kind == CATEGORY:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+def schema(columns):
+    """
+    Builds the Arrow schema for a set of columns, plus the "extra" column
+
+    Returns:
+        pyarrow.Schema
+    """
+    _require_pyarrow()
+    fields = [pa.field(name, _arrow_type(kind)) for name, kind in columns.items()]
+    fields.append(pa.field("extra", pa.string()))
+    return pa.schema(fields)
+
+
+# Strings that mean true or false, anything else becomes null
+BOOLEAN_STRINGS = {
+    "true": True,
+    "t": True,
+    "yes": True,
+    "y": True,
+    "1": True,
+    "false": False,
+    "f": False,
+    "no": False,
+    "n": False,
+    "0": False,
+    "": False,
+}
+
+
+def _coerce(value, kind):
+    # Scraped values aren't always the type we expect (e.g. Amazon's
+    # data-index attributes are strings), so convert what we can
+    if value is None:
+        return None
+    if kind == INTEGER:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == BOOLEAN:
+        if isinstance(value, str):
+            # bool("false") is True, so read strings for what they say
+            return BOOLEAN_STRINGS.get(value.strip().lower())
+        return bool(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _column(values, kind):
+    values = [_coerce(value, kind) for value in values]
+    if kind == CATEGORY:
+        return pa.array(values, pa.string()).dictionary_encode()
+    return pa.array(values, _arrow_type(kind))
+
+
+def record_batch(rows, columns, skip=()):
+    """
+    Turns a list of dicts into a single Arrow record batch
+
+    Returns:
+        pyarrow.RecordBatch
+    """
+    _require_pyarrow()
+    arrays = [
+        _column([row.get(name) for row in rows], kind)
+        for name, kind in columns.items()
+    ]
+
+    extras = []
+    for row in rows:
+        # Only look up the keys we keep, so lazy history states don't read
+        # page sources back from disk just to skip them
+        extra = {
+            key: row[key]
+            for key in row
+            if key not in columns and key not in skip
+        }
+        extras.append(json.dumps(extra) if extra else None)
+    arrays.append(pa.array(extras, pa.string()))
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema(columns))
+
+
+def batches(rows, columns, chunk_size=10000, skip=()):
+    """Groups rows into record batches of up to chunk_size rows each,
+    so only one chunk is in memory at a time"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield record_batch(chunk, columns, skip)
+            chunk = []
+    if chunk:
+        yield record_batch(chunk, columns, skip)
+
+
+def write_parquet(rows, filename, columns, chunk_size=10000, skip=()):
+    """
+    Streams rows (any iterable of dicts) into a Parquet file
+
+    Args:
+        rows (iterable): The rows to write
+        filename (str): Where to save the file
+        columns (dict): Column names mapped to their kind
+        chunk_size (int): How many rows to convert at a time
+        skip (tuple): Keys to leave out entirely
+    """
+    _require_pyarrow()
+    with pq.ParquetWriter(filename, schema(columns)) as writer:
+        for batch in batches(rows, columns, chunk_size, skip):
+            writer.write_batch(batch)
+
+
+def write_arrow(rows, filename, columns, chunk_size=10000, skip=()):
+    """
+    Streams rows (any iterable of dicts) into an Arrow IPC stream file,
+    readable with ``pyarrow.ipc.open_stream``. See write_parquet for
+    the arguments.
+    """
+    _require_pyarrow()
+    with pa.OSFile(str(filename), "wb") as sink:
+        with pa.ipc.new_stream(sink, schema(columns)) as writer:
+            for batch in batches(rows, columns, chunk_size, skip):
+                writer.write_batch(batch)
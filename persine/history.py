@@ -0,0 +1,443 @@
+import copy
+import json
+import os
+import weakref
+from functools import partial
+
+HEAVY_FIELDS = ("page_source", "screenshot")
+
+
+# Lines with heavy fields start with where those fields begin, so the rest
+# of the state can be read without decoding a whole page source. The
+# number is always the same width, so it can be filled in afterwards.
+HEAVY_HEADER = b'{"_heavy_at": '
+HEAVY_AT_WIDTH = 10
+
+
+def _encode(state):
+    heavy = {field: state[field] for field in HEAVY_FIELDS if field in state}
+    if not heavy:
+        return (json.dumps(state) + "\n").encode("utf-8")
+
+    light = {"_heavy": list(heavy)}
+    light.update((key, value) for key, value in state.items() if key not in heavy)
+    light_part = json.dumps(light).encode("utf-8")[1:-1]
+    heavy_part = json.dumps(heavy).encode("utf-8")[1:]
+
+    heavy_at = len(HEAVY_HEADER) + HEAVY_AT_WIDTH + 2 + len(light_part)
+    return b"".join([
+        HEAVY_HEADER,
+        str(heavy_at).rjust(HEAVY_AT_WIDTH).encode("ascii"),
+        b", ",
+        light_part,
+        b", ",
+        heavy_part,
+        b"\n",
+    ])
+
+
+def _heavy_at(line):
+    if line.startswith(HEAVY_HEADER):
+        start = len(HEAVY_HEADER)
+        return int(line[start:start + HEAVY_AT_WIDTH])
+    return None
+
+
+def _decode(line):
+    """Reads a complete state back from a journal line"""
+    state = json.loads(line)
+    state.pop("_heavy_at", None)
+    state.pop("_heavy", None)
+    return state
+
+
+def _decode_light(line):
+    """
+    Reads a journal line without its heavy fields
+
+    Returns:
+        tuple: The state and the names of the heavy fields left out
+    """
+    heavy_at = _heavy_at(line)
+    if heavy_at is None:
+        # Written by an older version, there's no way around parsing it all
+        state = json.loads(line)
+        lazy_fields = tuple(field for field in HEAVY_FIELDS if field in state)
+        for field in lazy_fields:
+            del state[field]
+        return state, lazy_fields
+
+    state = json.loads(line[:heavy_at] + b"}")
+    del state["_heavy_at"]
+    return state, tuple(state.pop("_heavy"))
+
+
+def _decode_heavy(line):
+    """Reads only the heavy fields from a journal line"""
+    heavy_at = _heavy_at(line)
+    if heavy_at is None:
+        return _decode(line)
+    return json.loads(b"{" + line[heavy_at + 2:])
+
+
+class LazyState(dict):
+    """
+    A saved state whose heavy fields (page source, screenshots) stay on
+    disk. They're read back every time they're asked for and never kept,
+    so going through a long history doesn't fill memory up with page
+    sources. Looking at, iterating over or counting the keys never
+    touches the disk. Use materialize() for a plain dict of everything.
+
+    Args:
+        data (dict): The lightweight fields of the state
+        lazy_fields (tuple): The fields that were left on disk
+        loader (callable): Returns the heavy fields (or the complete
+            state) when called
+    """
+
+    def __init__(self, data, lazy_fields, loader):
+        super().__init__(data)
+        self._lazy_fields = tuple(lazy_fields)
+        self._loader = loader
+
+    @property
+    def lazy_fields(self):
+        """The heavy fields that are only on disk"""
+        if self._loader is None:
+            return ()
+        return tuple(
+            field for field in self._lazy_fields
+            if not dict.__contains__(self, field)
+        )
+
+    def _read(self):
+        lazy_fields = self.lazy_fields
+        if not lazy_fields:
+            return {}
+        loaded = self._loader()
+        return {field: loaded[field] for field in lazy_fields if field in loaded}
+
+    def __missing__(self, key):
+        if key in self.lazy_fields:
+            return self._read()[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.lazy_fields
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        yield from dict.__iter__(self)
+        yield from self.lazy_fields
+
+    def __len__(self):
+        return dict.__len__(self) + len(self.lazy_fields)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyState):
+            other = other.materialize()
+        return self.materialize() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return self.materialize().values()
+
+    def items(self):
+        return self.materialize().items()
+
+    def copy(self):
+        return self.materialize()
+
+    # Copies and pickles are plain dicts, since the loader points into an
+    # open history file that can't come along
+
+    def __copy__(self):
+        return self.materialize()
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.materialize(), memo)
+
+    def __reduce__(self):
+        return (dict, (self.materialize(),))
+
+    def materialize(self):
+        """
+        Returns the complete state as a plain dict, without keeping the
+        heavy fields around afterwards
+        """
+        full = dict(dict.items(self))
+        full.update(self._read())
+        return full
+
+    def repoint(self, loader):
+        """Reads the heavy fields from somewhere else from now on, e.g.
+        after the history file was rewritten"""
+        self._loader = loader
+
+    def keep(self):
+        """Reads the heavy fields into memory for good, for when they're
+        about to disappear from disk"""
+        dict.update(self, self._read())
+        self._loader = None
+
+
+class LazySource:
+    """
+    Hands out LazyStates that read from a saved history, and keeps an eye
+    on them (without keeping them alive) so rewriting the history never
+    leaves one reading from the wrong place. Subclasses implement
+    ``_read_at``.
+    """
+
+    def __init__(self):
+        # Bumped every time the history is rewritten, so states pointing
+        # into the old one can tell
+        self.generation = 0
+        self._handed_out = weakref.WeakValueDictionary()
+
+    def _lazy(self, data, lazy_fields, where):
+        state = LazyState(data, lazy_fields, self._loader(where))
+        self._handed_out[id(state)] = state
+        return state
+
+    def _loader(self, where):
+        return partial(self._checked_read, where, self.generation)
+
+    def _checked_read(self, where, generation):
+        if generation != self.generation:
+            raise Exception(
+                "The history was rewritten or deleted after this state was "
+                "loaded, so its page source and screenshot are gone"
+            )
+        return self._read_at(where)
+
+    def lazy_state(self, state, where):
+        """
+        Swaps a state for a LazyState that reads its page source and
+        screenshot back from the saved history. States without heavy fields
+        are returned as-is.
+
+        Args:
+            state (dict): The state, as saved. A LazyState is pointed at its
+                new spot in place, so anything else holding it follows along.
+            where: Where the state was saved, from append or compact
+
+        Returns:
+            dict: The state or a LazyState
+        """
+        if isinstance(state, LazyState):
+            if state.lazy_fields:
+                state.repoint(self._loader(where))
+                self._handed_out[id(state)] = state
+            return state
+
+        lazy_fields = self._heavy_fields(state)
+        if not lazy_fields:
+            return state
+        light = {
+            key: value
+            for key, value in state.items()
+            if key not in lazy_fields
+        }
+        return self._lazy(light, lazy_fields, where)
+
+    def _heavy_fields(self, state):
+        return tuple(field for field in HEAVY_FIELDS if field in state)
+
+    def _before_rewrite(self, states):
+        # Anything still reading from the old history that isn't coming
+        # along to the new one reads its heavy fields while it still can
+        keeping = {id(state) for state in states}
+        for key, state in list(self._handed_out.items()):
+            if key not in keeping:
+                state.keep()
+
+    def _after_rewrite(self, states, positions):
+        old = self._handed_out
+        self.generation += 1
+        self._handed_out = weakref.WeakValueDictionary()
+        for state, where in zip(states, positions):
+            if old.get(id(state)) is state and state.lazy_fields:
+                self.lazy_state(state, where)
+
+
+class HistoryJournal(LazySource):
+    """
+    An append-only history file. Every state is written as a single line
+    of JSON (JSON Lines), so recording a new step only writes that step
+    instead of rewriting the entire history.
+
+    Page sources and screenshots go at the end of the line, after the
+    rest of the state. The line starts with a ``_heavy_at`` field saying
+    where they begin, so a lazy load never has to decode them.
+
+    Args:
+        path (str): Path to the journal file
+        fsync_every (int): Force the file to disk after this many appended
+            states. Lines are always flushed to the OS immediately, this only
+            controls how often we wait on the disk itself.
+    """
+
+    def __init__(self, path, fsync_every=50):
+        super().__init__()
+        self.path = path
+        self.fsync_every = fsync_every
+        self._handle = None
+        self._unsynced = 0
+        self._needs_compaction = False
+
+    def __iter__(self):
+        return self.load()
+
+    def load(self, lazy=False):
+        """
+        Streams the saved states back, one at a time. Also reads history
+        files saved as a single JSON list by older versions of Persine.
+
+        Args:
+            lazy (boolean): Whether to leave page sources and screenshots on
+                disk until they're used (see LazyState)
+
+        Yields:
+            dict: A saved state
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            first = f.read(1)
+            while first.isspace():
+                first = f.read(1)
+            f.seek(0)
+
+            if first == b"[":
+                # Old-style history, convert it the next time we write
+                self._needs_compaction = True
+                yield from json.load(f)
+                return
+
+            offset = 0
+            for line in f:
+                if line.strip():
+                    if lazy:
+                        state, lazy_fields = _decode_light(line)
+                        if lazy_fields:
+                            state = self._lazy(state, lazy_fields, offset)
+                    else:
+                        state = _decode(line)
+                    yield state
+                offset += len(line)
+
+    def _read_at(self, offset):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return _decode_heavy(f.readline())
+
+    def append(self, state):
+        """
+        Appends a single state to the end of the journal
+
+        Returns:
+            int: Where the state's line starts in the file, for lazy_state
+        """
+        if self._needs_compaction:
+            self.compact(list(self.load()))
+
+        if self._handle is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._handle = open(self.path, "ab")
+
+        offset = self._handle.tell()
+        self._handle.write(_encode(state))
+        self._handle.flush()
+
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+
+        return offset
+
+    def flush(self):
+        """Makes sure appended states can be read back. Lines are flushed
+        as they're written, so there's never anything left to do."""
+        if self._handle is not None:
+            self._handle.flush()
+
+    def sync(self):
+        """Forces any appended states to disk"""
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+        self._unsynced = 0
+
+    def compact(self, states):
+        """
+        Rewrites the journal so it contains exactly the given states. The new
+        file is written next to the old one and swapped in, so a crash
+        mid-write never leaves a half-written history behind. Lazy states
+        from this journal are pointed at their new lines, and ones that
+        aren't in the new file read their heavy fields into memory first.
+
+        Args:
+            states (list): Every state that should be in the history
+
+        Returns:
+            list: Where each state's line starts in the new file
+        """
+        self.close()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        offsets = []
+        states = list(states)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for state in states:
+                if isinstance(state, LazyState):
+                    # Don't pull every page source into memory at once
+                    state = state.materialize()
+                offsets.append(f.tell())
+                f.write(_encode(state))
+            f.flush()
+            os.fsync(f.fileno())
+        self._before_rewrite(states)
+        os.replace(tmp_path, self.path)
+        self._after_rewrite(states, offsets)
+
+        self._needs_compaction = False
+        return offsets
+
+    def close(self):
+        """Syncs and closes the journal file"""
+        if self._handle is not None:
+            self.sync()
+            self._handle.close()
+            self._handle = None
+
+    def delete(self):
+        """Removes the journal file from disk"""
+        self.close()
+        self.generation += 1
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,45 @@
+EVENTS = (
+    # Keyword arguments each event's hooks are called with
+    "before_action",    # driver, url
+    "before_navigate",  # bridge, url
+    "after_navigate",   # bridge, url
+    "before_scrape",    # bridge
+    "after_scrape",     # bridge, data
+    "after_state",      # persona, state
+    "timings",          # persona, state, timings
+)
+
+
+class Hooks:
+    """
+    Functions to call when things happen while a command runs, like
+    before the browser navigates or after a page is scraped. Events come
+    in before/after pairs, so it's easy to start a profiler (or take a
+    tracemalloc snapshot) on one and stop it on the other.
+
+    Hooks are called with keyword arguments, see ``EVENTS`` for which
+    ones each event gets.
+    """
+
+    def __init__(self):
+        self.hooks = {event: [] for event in EVENTS}
+
+    def add(self, event, hook):
+        """
+        Calls a function every time an event happens
+
+        Args:
+            event (str): The event name, e.g. "after_scrape"
+            hook (callable): Called with the event's keyword arguments
+        """
+        if event not in self.hooks:
+            raise Exception(f"Unknown event {event}")
+        self.hooks[event].append(hook)
+
+    def remove(self, event, hook):
+        """Stops calling a function for an event"""
+        self.hooks[event].remove(hook)
+
+    def emit(self, event, **info):
+        for hook in self.hooks[event]:
+            hook(**info)
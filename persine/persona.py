@@ -1,9 +1,17 @@
 from datetime import datetime
+from collections import deque
+from concurrent.futures import Future
 import os
+import time
 import shutil
-import json
+from .commands import CommandQueue
+from .history import HistoryJournal
+from .store import HistoryDatabase
+from .store import is_sqlite_path
+from .timing import TimingProfile
 from .utils import HistoryList
 from .utils import RecommendationList
+from .utils import state_recommendations
 
 
 class Persona:
@@ -16,14 +24,23 @@ class Persona:
         engine (PersonaEngine): The engine to associate with this persona
         name (str): The name to be given to this profile. If not named, an
             empty profile is used.
-        history_path (str): Path to the JSON file that holds this persona's
-            action/browsing history
+        history_path (str): Path to the JSON Lines file that holds this
+            persona's action/browsing history. Each new state is appended
+            to the end of the file. If it ends in .db or .sqlite, history
+            and recommendations are saved to a SQLite database instead,
+            which can be shared between personas (see
+            :class:`~persine.store.HistoryDatabase`).
         user_data_dir (str): If specified, load the Chrome profile from this
             folder
         resume (boolean): Whether this persona should resume a previous persona
             with the same name. If False, the previous Chrome profile is deleted.
         overwrite (boolean): Whether to prompt the user when overwriting a previous
             persona's Chrome profile (see resume)
+        fsync_every (int): How many history entries (and finished batch
+            commands) to write before forcing them to disk
+        lazy_history (boolean): Only keep page sources and screenshots
+            saved to history on disk, reading them back when they're
+            accessed, so memory use doesn't grow with every page visited
     """
     def __init__(
         self,
@@ -33,6 +50,8 @@ class Persona:
         user_data_dir=None,
         resume=False,
         overwrite=False,
+        fsync_every=50,
+        lazy_history=True,
     ):
         self.engine = engine
         self.history = HistoryList([])
@@ -41,6 +60,9 @@ class Persona:
         self.driver = None
         session_key = datetime.now().strftime("%Y-%m-%d-%H.%M.%S.%f")[:-3]
         self.overwrite = overwrite
+        self.lazy_history = lazy_history
+        self.pending = deque()
+        self.profile = TimingProfile()
 
         if name is not None and user_data_dir is None:
             self.user_data_dir = os.path.join(self.engine.data_dir, "personas", name)  # noqa: E501
@@ -51,10 +73,30 @@ class Persona:
             self.history_path = history_path
         elif name is None and history_path is None:
             self.history_path = os.path.join(
-                self.engine.data_dir, f"{session_key}.json"
+                self.engine.data_dir, f"{session_key}.jsonl"
             )
         elif history_path is None:
-            self.history_path = os.path.join(self.engine.data_dir, f"{name}.json")  # noqa: E501
+            self.history_path = os.path.join(self.engine.data_dir, f"{name}.jsonl")  # noqa: E501
+            # Older versions saved history as a plain JSON file
+            legacy_path = os.path.join(self.engine.data_dir, f"{name}.json")
+            if resume and not os.path.exists(self.history_path) and os.path.exists(legacy_path):  # noqa: E501
+                self.history_path = legacy_path
+
+        if is_sqlite_path(self.history_path):
+            self.journal = HistoryDatabase(
+                self.history_path,
+                persona=name or session_key,
+                fsync_every=fsync_every,
+            )
+            # The database can be shared, so each persona needs its own file
+            commands_path = "{}.{}.commands.jsonl".format(
+                os.path.splitext(self.history_path)[0], name or session_key
+            )
+        else:
+            self.journal = HistoryJournal(self.history_path, fsync_every=fsync_every)  # noqa: E501
+            commands_path = os.path.splitext(self.history_path)[0] + ".commands.jsonl"  # noqa: E501
+        # The batch in progress lives next to the history
+        self.commands = CommandQueue(commands_path, fsync_every=fsync_every)
 
         if not resume:
             self.clear()
@@ -63,7 +105,8 @@ class Persona:
 
     def clear(self):
         """
-        Deletes all previous data for that Chrome profile, including history file and user_data_dir
+        Deletes all previous data for that Chrome profile, including history file and user_data_dir.
+        If the engine uses a template profile, a fresh copy is made the next time the browser launches.
         """
         if self.user_data_dir:
             if not self.overwrite:
@@ -72,10 +115,8 @@ class Persona:
                     raise Exception("Don't want to delete")
             shutil.rmtree(self.user_data_dir, ignore_errors=True)
         if self.history_path:
-            try:
-                os.remove(self.history_path)
-            except Exception:
-                pass
+            self.journal.delete()
+            self.commands.delete()
 
     def __enter__(self):
         """
@@ -94,15 +135,55 @@ class Persona:
         """Launches a browser through PersonaEngine"""
         self.driver = self.engine.launch(user_data_dir=self.user_data_dir)
 
+    def prewarm(self):
+        """Starts this persona's browser in the background, so it's ready
+        (or closer to ready) when the persona runs its first command"""
+        self.engine.prewarm(self)
+
     def quit(self):
         """Quits the browser"""
         self.driver.quit()
+        self.engine.forget_driver(self.driver)
         self.driver = None
+        self.journal.close()
+        self.commands.close()
+
+    def run_batch(self, urls=None):
+        """
+        Run a series of commands. If the engine has background workers,
+        each command starts while the previous page is still being processed.
+
+        Progress is saved after every command (repeated commands like
+        youtube:next_up#30 count each repetition), so if the run crashes,
+        calling run_batch with the same commands again - even from a
+        resumed persona - skips everything that already finished.
+
+        Args:
+            urls (list): The commands to run. Leave it out to finish
+                whatever batch was interrupted last time.
+
+        Returns:
+            list(dict): The last state of each command
+        """
+        if urls is not None:
+            self.commands.start(urls)
+
+        try:
+            for entry in self.commands.remaining():
+                self.queue(entry["command"], checkpoint=True)
+        finally:
+            self.flush()
 
-    def run_batch(self, urls):
-        """Run a series of commands"""
-        return [self.run(url) for url in urls]
+        keys = self.commands.results()
+        states = {}
+        for state in reversed(self.history):
+            if state["key"] in keys:
+                states.setdefault(state["key"], state)
+            if len(states) == len(keys):
+                break
 
+        self.commands.delete()
+        return [states.get(key) for key in keys]
 
     def run(self, url, notes=None):
         """
@@ -115,28 +196,70 @@ class Persona:
                 a list of state representations if it's a multi-step command.
                 For example, youtube:next_up#30 to hit 'next up' 30 times
         """
+        try:
+            self.queue(url, notes)
+        finally:
+            self.flush()
+
+        return self.history[-1]
+
+    def queue(self, url, notes=None, checkpoint=False):
+        """
+        Runs a single command, but if the engine is processing pages in the
+        background it doesn't wait for them to be added to the history. Use
+        flush to wait for everything to be finished.
+
+        Args:
+            url (str): The action to run or URL to visit
+            notes (dict): Additional information to include in the history row
+            checkpoint (boolean): Whether to mark the next command in the saved
+                batch as finished once the state is in the history
+
+        Returns:
+            int: How many states the command produced
+        """
         if self.driver is None:
             self.launch()
 
-        state = self.engine.run(self.driver, url)
+        states = self.engine.run(self.driver, url)
+        if not isinstance(states, list):
+            states = [states]
 
-        if isinstance(state, list):
-            for s in state:
-                self.update_history(s, notes)
-        else:
+        for position, state in enumerate(states, 1):
+            last = position == len(states)
+            self.pending.append((state, notes, checkpoint and last))
+        self.process_pending(wait=False)
+
+        return len(states)
+
+    def flush(self):
+        """Waits for queued states to finish, adds them to the history and
+        commits them"""
+        try:
+            self.process_pending(wait=True)
+        finally:
+            self.journal.flush()
+
+    def process_pending(self, wait=True):
+        """
+        Adds finished states to the history, always in the order they were
+        run. Stops at the first unfinished one unless wait is True.
+        """
+        while self.pending:
+            state, notes, checkpoint = self.pending[0]
+            if isinstance(state, Future):
+                if not wait and not state.done():
+                    break
+                self.pending.popleft()
+                state = state.result()
+            else:
+                self.pending.popleft()
             self.update_history(state, notes)
-        
-        return self.history[-1]
+            if checkpoint:
+                self.commands.complete(state["key"])
 
     def update_history(self, state, notes=None):
         """Updates history/recommendations lists with the given state"""
-        same_page = [
-            "youtube:like",
-            "youtube:dislike",
-            "youtube:subscribe",
-            "youtube:unsubscribe",
-        ]
-
         new_state = state.copy()
         if notes is not None:
             for key, value in notes.items():
@@ -144,27 +267,44 @@ class Persona:
                     raise Exception(f"key {key} already exists in state")
                 new_state[key] = value
 
+        started = time.perf_counter()
         self.history.append(new_state)
-        if "recommendations" in new_state and new_state["action"] not in same_page:
-            for rec in state["recommendations"]:
-                self.recommendations.append({
-                    **rec,
-                    'action_key': new_state['key']
-                })
-        self.save_history()
+        self.add_recommendations(new_state)
 
-    def save_history(self):
-        """Saves the browsing/command history to a file"""
-        os.makedirs(os.path.dirname(self.history_path), exist_ok=True)
+        if "timings" in new_state:
+            timings = {
+                **new_state["timings"],
+                "persist": round(time.perf_counter() - started, 4),
+            }
+            self.profile.add(timings)
+            self.engine.hooks.emit(
+                "timings", persona=self, state=new_state, timings=timings
+            )
+
+        self.engine.hooks.emit("after_state", persona=self, state=new_state)
 
-        with open(self.history_path, "w") as f:
-            json.dump(list(self.history), f)
+    def add_recommendations(self, state):
+        """Adds the recommendations from a state to the recommendations list"""
+        for rec in state_recommendations(state):
+            self.recommendations.append(rec)
+
+    def save_history(self):
+        """
+        Rewrites the entire browsing/command history file. New states are
+        already appended as they happen, so this is only needed if you've
+        edited the history yourself.
+        """
+        self.history.save()
 
     def load_history(self):
-        """Loads the browsing/command history from a file"""
-        try:
-            with open(self.history_path, "r") as f:
-                for visit in json.load(f):
-                    self.update_history(visit)
-        except FileNotFoundError:
-            self.history = HistoryList([])
+        """
+        Loads the browsing/command history from a file, rebuilding the
+        recommendations list as it goes. Nothing is written back to disk.
+        """
+        self.history = HistoryList(
+            [], journal=self.journal, lazy=self.lazy_history
+        )
+        self.recommendations = RecommendationList([])
+        for visit in self.journal.load(lazy=self.lazy_history):
+            self.history.data.append(visit)
+            self.add_recommendations(visit)
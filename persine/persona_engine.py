@@ -1,16 +1,28 @@
 import os
+import hashlib
+import zipfile
+import shutil
+import tempfile
+import threading
 from selenium import webdriver
 from datetime import datetime
 import base64
-import zlib
-import io
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from urllib.parse import urlparse, urldefrag
 
-from .utils import simplify_source
-from .bridges import YoutubeBridge
-from .bridges import AmazonBridge
+from . import timing
+from .hooks import Hooks
+from .processing import finish_state, resize_screenshot
+from .blobs import BlobStore
+from .bridges import BridgeRegistry
 from .persona import Persona
+from .pool import BrowserPool
+from .profiles import clone_profile
+from .runner import PersonaRunner
+
+UBLOCK_CRX = os.path.join(
+    os.path.dirname(__file__), "../extensions/ublock-origin.crx"
+)
 
 
 class PersonaEngine:
@@ -21,8 +33,10 @@ class PersonaEngine:
         height (int): Height of the browser window
         weight (int): Width of the browser window
         screenshot_scale (float): Scaling factor for saved screenshots
-        screenshot (Union[str, list]): Whether screenshots are saved, and whether they go to history or to disk
-        html (Union[str, list]): Whether HTML is saved, and whether it goes to history or to disk
+        screenshot (Union[str, list]): Whether screenshots are saved, and whether they go to history, to disk,
+            or to the deduplicated blob store ("history", "file", "blobs")
+        html (Union[str, list]): Whether HTML is saved, and whether it goes to history, to disk, or to the
+            deduplicated blob store ("history", "file", "blobs")
         compress_html (boolean): Whether HTML should be compressed or not before saving to the history
         cache_dir (str): Where to save on-disk screenshots and HTML files
         data_dir (str): Root directory where persona data (Chrome profiles) are stored
@@ -30,6 +44,24 @@ class PersonaEngine:
         driver: WebDriver to use instead of starting a new one
         resume (boolean): Whether to pick up where the previous run left off.
         ublock (boolean): Whether to automatically install uBlock Origin
+        screenshot_mode (str): "cdp" to have Chrome resize and encode screenshots, "webdriver" for
+            full-size PNGs resized in Python, or "auto" to use cdp when the driver supports it
+        workers (int): If set, simplify HTML and encode screenshots on this many
+            background workers so the browser doesn't wait on them
+        worker_type (str): Use "thread" or "process" workers
+        simplify (str): How to strip tags from saved HTML, "bs4" to re-build the
+            page with BeautifulSoup or "fast" to just cut the tags out
+        initial_data (boolean): Whether to save YouTube's ytInitialData (compressed) with each
+            YouTube page
+        watch (Union[str, float]): How long to watch YouTube videos: "skip_ahead" to skip to the end,
+            "full" for the whole video, or a number of seconds
+        amazon_wait_timeout (float): Most seconds to wait for an Amazon page's carousels to load
+        amazon_quiet_period (float): How many seconds an Amazon page has to go without changing
+            before it's considered loaded
+        timings (boolean): Whether to time each phase of every command (navigation, waiting, scripts,
+            screenshots, etc) and save it as the state's timings
+        template_profile (boolean): Whether new persona profiles start as a copy of a template profile
+            that's already been through Chrome's first-run setup (see build_template)
     """
 
     def __init__(
@@ -46,6 +78,16 @@ class PersonaEngine:
         driver=None,
         resume=False,
         ublock=False,
+        screenshot_mode="auto",
+        workers=None,
+        worker_type="thread",
+        simplify="bs4",
+        initial_data=False,
+        watch="skip_ahead",
+        amazon_wait_timeout=8,
+        amazon_quiet_period=0.5,
+        timings=False,
+        template_profile=False,
     ):
         # Settings
         self.height = height
@@ -54,10 +96,21 @@ class PersonaEngine:
         self.screenshot = screenshot
         self.html = html
         self.compress_html = compress_html
-        self.url_before_action = None
         self.headless = headless
         self.resume = resume
         self.ublock = ublock
+        self.screenshot_mode = screenshot_mode
+        self.workers = workers
+        self.worker_type = worker_type
+        self.simplify = simplify
+        self.initial_data = initial_data
+        self.watch = watch
+        self.amazon_wait_timeout = amazon_wait_timeout
+        self.amazon_quiet_period = amazon_quiet_period
+        self.timings = timings
+        self.template_profile = template_profile
+        self.hooks = Hooks()
+        self.executor = None
 
         if data_dir is not None:
             self.data_dir = data_dir
@@ -71,15 +124,49 @@ class PersonaEngine:
             self.cache_dir = os.path.join(self.data_dir, "cache")
         os.makedirs(self.cache_dir, exist_ok=True)
 
+        self.blob_dir = os.path.join(self.data_dir, "blobs")
+        self.template_dir = os.path.join(self.data_dir, "template_profile")
+        self._template_lock = threading.Lock()
+        self.blobs = BlobStore(self.blob_dir)
+
         self.custom_driver = driver
 
-    def persona(self, name=None, resume=False):
-        """Initializes a persona with the given name.
+        self.bridges = BridgeRegistry.default()
+        self.bridge_instances = {}
+
+        self.pool = BrowserPool(self.start_browser)
+
+    def persona(self, name=None, resume=False, **kwargs):
+        """Initializes a persona with the given name. Any other keyword
+        arguments are passed along to :class:`~persine.Persona`.
         
         Returns:
             Persona: The persona initialized by the engine.
         """
-        return Persona(self, name=name, resume=resume)
+        return Persona(self, name=name, resume=resume, **kwargs)
+
+    def run_many(self, plans, max_browsers=None, browsers_per_core=1, **kwargs):
+        """Runs many personas at once, each in its own browser. Other
+        keyword arguments are passed to :class:`~persine.runner.PersonaRunner`.
+
+        Args:
+            plans (dict): Persona names mapped to the list of commands each
+                persona should run
+            max_browsers (int): Most browsers to have open at once
+            browsers_per_core (float): If max_browsers isn't set, how many
+                browsers to allow per CPU core
+
+        Returns:
+            dict: Persona names mapped to the finished Persona, or to the
+                exception that stopped it
+        """
+        runner = PersonaRunner(
+            self,
+            max_browsers=max_browsers,
+            browsers_per_core=browsers_per_core,
+            **kwargs
+        )
+        return runner.run(plans)
 
     def get_driver_options(self, user_data_dir=None):
         """Create the options necessary to start the appropriate
@@ -106,11 +193,9 @@ class PersonaEngine:
             options.add_argument("--mute-audio")
 
         if self.ublock:
-            # TODO this should be an option. Also, maybe no ad blocking?
-            ext_path = os.path.join(
-                os.path.dirname(__file__), "../extensions/ublock-origin.crx"
-            )
-            options.add_extension(ext_path)
+            # Loading it unpacked skips sending and unzipping the whole
+            # .crx every time Chrome starts
+            options.add_argument(f"--load-extension={self.unpack_extension(UBLOCK_CRX)}")  # noqa: E501
 
         if user_data_dir:
             options.add_argument(f"user-data-dir={user_data_dir}")
@@ -119,24 +204,163 @@ class PersonaEngine:
 
         return options
 
+    def unpack_extension(self, crx_path):
+        """
+        Unzips a Chrome extension into the data directory, once per
+        version of the extension.
+
+        Returns:
+            str: The folder the extension was unpacked to
+        """
+        with open(crx_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:12]
+        name = os.path.splitext(os.path.basename(crx_path))[0]
+        ext_dir = os.path.join(self.data_dir, "extensions", f"{name}-{digest}")
+
+        if not os.path.exists(ext_dir):
+            # Prewarm workers and runner threads can get here at the same
+            # time, so each one unpacks into a folder of its own
+            os.makedirs(os.path.dirname(ext_dir), exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(
+                prefix=f"{os.path.basename(ext_dir)}.",
+                suffix=".tmp",
+                dir=os.path.dirname(ext_dir),
+            )
+            # A .crx is a zip file with an extra header on the front
+            with zipfile.ZipFile(crx_path) as crx:
+                members = [
+                    member for member in crx.namelist()
+                    # Chrome won't load unpacked extensions with this folder
+                    if not member.startswith("_metadata/")
+                ]
+                crx.extractall(tmp_dir, members)
+            try:
+                os.replace(tmp_dir, ext_dir)
+            except OSError:
+                # Someone else unpacked it first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return ext_dir
+
     def launch(self, user_data_dir=None):
-        """Launches a Chrome instance.
-        
+        """Launches a Chrome instance, or hands over one that was already
+        started with :meth:`prewarm`.
+
         Returns:
             webdriver.Chrome"""
         if self.custom_driver:
             return self.custom_driver
 
+        driver = self.pool.take(user_data_dir)
+        if driver is not None:
+            return driver
+
+        return self.start_browser(user_data_dir)
+
+    def start_browser(self, user_data_dir=None):
+        """Starts a brand new Chrome instance.
+
+        Returns:
+            webdriver.Chrome"""
+        if user_data_dir and self.template_profile and not os.path.exists(user_data_dir):  # noqa: E501
+            self.clone_template(user_data_dir)
+
         options = self.get_driver_options(user_data_dir)
 
         return webdriver.Chrome(options=options)
 
-    def get_state(self, driver, url):
+    def build_template(self, setup=None, rebuild=False):
+        """
+        Creates the template profile new personas are copied from. Chrome
+        is started once so it can do its first-run setup (and install
+        uBlock, if it's turned on), then setup can do anything else you'd
+        like every persona to start with, like accepting cookie banners.
+
+        Args:
+            setup (callable): Called with the driver before Chrome is closed
+            rebuild (boolean): Replace the template if it already exists
+
+        Returns:
+            str: The template's folder
+        """
+        if os.path.exists(self.template_dir) and not rebuild:
+            return self.template_dir
+
+        # Personas launching side by side all ask for the template at
+        # once, but only one of them should start Chrome to build it
+        with self._template_lock:
+            if os.path.exists(self.template_dir) and not rebuild:
+                return self.template_dir
+
+            # Build it next to where it goes, under a name no other process
+            # building it at the same time could pick
+            tmp_dir = tempfile.mkdtemp(
+                prefix=f"{os.path.basename(self.template_dir)}.",
+                suffix=".tmp",
+                dir=os.path.dirname(self.template_dir),
+            )
+            try:
+                driver = webdriver.Chrome(options=self.get_driver_options(tmp_dir))
+                try:
+                    if setup is not None:
+                        setup(driver)
+                finally:
+                    driver.quit()
+
+                if rebuild:
+                    shutil.rmtree(self.template_dir, ignore_errors=True)
+                try:
+                    os.replace(tmp_dir, self.template_dir)
+                except OSError:
+                    # Another process (a Worker sharing data_dir, say)
+                    # finished first. Its template may already be getting
+                    # cloned, so leave it be and use it.
+                    if rebuild or not os.path.exists(self.template_dir):
+                        raise
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            except BaseException:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+        return self.template_dir
+
+    def clone_template(self, user_data_dir):
+        """
+        Starts a persona's profile off as a copy of the template profile,
+        building the template first if needed. See
+        :func:`~persine.profiles.clone_profile` for how it's copied.
+        """
+        self.build_template()
+        clone_profile(self.template_dir, user_data_dir)
+
+    def prewarm(self, persona=None, count=1):
+        """
+        Starts Chrome in the background for a persona that's about to run,
+        so launching it later doesn't have to wait for Chrome to boot.
+
+        Args:
+            persona (Persona): The persona, or None for browsers without a
+                saved profile
+            count (int): How many browsers to start
+        """
+        if self.custom_driver:
+            return
+        user_data_dir = persona.user_data_dir if persona is not None else None
+        self.pool.prewarm(user_data_dir, count)
+
+    def get_state(self, driver, url, bridge_data=None, url_before_action=None):
         """
         Get the current state of the page.
 
+        Args:
+            driver: The WebDriver that ran the command
+            url (str): The command that was run
+            bridge_data (dict): Data scraped from the page by the bridge
+            url_before_action (str): Where the browser was before the command
+
         Returns:
-            dict: A representation of the current page (key, action, url, etc)
+            Union[dict, Future]: A representation of the current page (key,
+                action, url, etc). If the engine has workers, it's a Future
+                that resolves to the representation.
         """
 
         # Give everything a unique key
@@ -147,49 +371,111 @@ class PersonaEngine:
             "page_title": driver.title,
             "url": driver.current_url,
             "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "url_before_action": self.url_before_action,
+            "url_before_action": url_before_action,
         }
 
-        # Remove style tags which are like 2/3 of YouTube
-        html = simplify_source(driver.page_source)
-
+        source = None
         if self.html:
-            if self.html == "file" or "file" in self.html:
-                source_filepath = os.path.join(self.cache_dir, f"{key}.html")
-                with open(source_filepath, "w") as outfile:
-                    outfile.write(html)
-
-            if self.html == "history" or "history" in self.html:
-                if self.compress_html:
-                    compressed = zlib.compress(html.encode("utf-8"))
-                    state["page_source"] = base64.b64encode(compressed).decode(
-                        "utf-8"
-                    )  # noqa: E501
-                else:
-                    state["page_source"] = html
+            with timing.phase("source"):
+                source = driver.page_source
 
+        screenshot = None
         if self.screenshot:
-            quality = 80
-            optimize = True
-            ss = self.take_screenshot(driver).convert("RGB")
+            with timing.phase("screenshot_capture"):
+                screenshot = self.capture_screenshot(driver)
+
+        timer = timing.current()
+        if timer is not None:
+            # Simplifying and encoding add their own timings later
+            state["timings"] = timer.finish()
+
+        settings = {
+            "html": self.html,
+            "compress_html": self.compress_html,
+            "simplify": self.simplify,
+            "screenshot": self.screenshot,
+            "screenshot_scale": self.screenshot_scale,
+            "cache_dir": self.cache_dir,
+            "blob_dir": self.blob_dir,
+        }
 
-            # Save to file
-            if self.screenshot == "file" or "file" in self.screenshot:
-                ss_filepath = os.path.join(self.cache_dir, f"{key}.jpg")
-                ss.save(
-                    ss_filepath, "JPEG", optimize=optimize, quality=quality
-                )  # noqa: E501
+        if self.workers:
+            # The browser can move on while a worker finishes up
+            return self.get_executor().submit(
+                finish_state, state, bridge_data, source, screenshot, settings
+            )
 
-            # Save to state
-            if self.screenshot == "history" or "history" in self.screenshot:
-                buffer = io.BytesIO()
-                ss.save(buffer, "JPEG", optimize=optimize, quality=quality)
-                state["screenshot"] = base64.b64encode(buffer.getvalue()).decode('ascii')
+        return finish_state(state, bridge_data, source, screenshot, settings)
 
-        state = {**state, **self.bridge_data}
-        self.bridge_data = None
+    def get_executor(self):
+        """
+        The worker pool used to process screenshots and HTML in the
+        background, created the first time it's needed.
 
-        return state
+        Returns:
+            concurrent.futures.Executor
+        """
+        if self.executor is None:
+            if self.worker_type == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    def shutdown(self):
+        """Waits for any background processing to finish, stops the workers
+        and quits any prewarmed browsers that weren't used"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        self.pool.close()
+
+    def capture_screenshot(self, driver):
+        """
+        Grabs the screenshot bytes from the browser. In "cdp" mode Chrome
+        shrinks and encodes the screenshot itself through the DevTools
+        protocol, so we get back a small JPEG instead of a full-size PNG.
+        Drivers without DevTools support fall back to a regular PNG
+        screenshot in "auto" mode.
+
+        Returns:
+            bytes: A JPEG (from DevTools) or a PNG (from WebDriver)
+        """
+        if self.screenshot_mode != "webdriver" and hasattr(driver, "execute_cdp_cmd"):  # noqa: E501
+            try:
+                return self.capture_cdp_screenshot(driver)
+            except Exception:
+                if self.screenshot_mode == "cdp":
+                    raise
+        elif self.screenshot_mode == "cdp":
+            raise Exception("The driver doesn't support DevTools screenshots")
+
+        return driver.get_screenshot_as_png()
+
+    def capture_cdp_screenshot(self, driver, quality=80):
+        """
+        Asks Chrome for an already-resized JPEG of the viewport
+
+        Returns:
+            bytes: The JPEG
+        """
+        metrics = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+        viewport = metrics.get("cssLayoutViewport", metrics["layoutViewport"])
+        result = driver.execute_cdp_cmd(
+            "Page.captureScreenshot",
+            {
+                "format": "jpeg",
+                "quality": quality,
+                "clip": {
+                    "x": 0,
+                    "y": 0,
+                    "width": viewport["clientWidth"],
+                    "height": viewport["clientHeight"],
+                    "scale": self.screenshot_scale,
+                },
+            },
+        )
+        return base64.b64decode(result["data"])
 
     def take_screenshot(self, driver):
         """
@@ -198,13 +484,67 @@ class PersonaEngine:
         Returns:
             Image: The resized screenshot
         """
-        screenshot = Image.open(io.BytesIO(driver.get_screenshot_as_png()))
-        size = (
-            int(screenshot.size[0] * self.screenshot_scale),
-            int(screenshot.size[1] * self.screenshot_scale),
+        return resize_screenshot(
+            driver.get_screenshot_as_png(), self.screenshot_scale
         )
-        resized = screenshot.resize(size)
-        return resized
+
+    def on(self, event, hook):
+        """
+        Calls a function whenever an event happens while running commands,
+        e.g. to attach a profiler around scraping. See
+        :class:`~persine.hooks.Hooks` for the events.
+
+        Args:
+            event (str): "before_action", "before_navigate", "after_navigate",
+                "before_scrape", "after_scrape", "after_state" or "timings"
+            hook (callable): Called with the event's keyword arguments
+        """
+        self.hooks.add(event, hook)
+
+    def add_timing_hook(self, hook):
+        """
+        Adds a function that's sent every step's timings, e.g. to forward
+        them to a metrics system. Only called when timings are turned on.
+
+        Args:
+            hook (callable): Called with the persona, the finished state and
+                its timings (which include "persist", the time it took to
+                save the state to the history)
+        """
+        self.hooks.add(
+            "timings",
+            lambda persona, state, timings: hook(persona, state, timings)
+        )
+
+    def register_bridge(self, bridge_class, schemes=None, hosts=None, domains=None):  # noqa: E501
+        """Adds a bridge for new commands or websites. See
+        :meth:`~persine.bridges.BridgeRegistry.register`."""
+        self.bridges.register(
+            bridge_class, schemes=schemes, hosts=hosts, domains=domains
+        )
+
+    def get_bridge(self, driver, url):
+        """
+        Finds the bridge for a command or URL. Each browser gets one
+        instance of each bridge, which is reused for every command.
+
+        Returns:
+            BaseBridge: The bridge to run the command with
+        """
+        bridge_class = self.bridges.find(url)
+        if bridge_class is None:
+            raise Exception(f"Unknown url {url}")
+
+        instances = self.bridge_instances.setdefault(id(driver), {})
+        if bridge_class not in instances:
+            bridge = bridge_class.from_engine(driver, self)
+            bridge.hooks = self.hooks
+            instances[bridge_class] = bridge
+        return instances[bridge_class]
+
+    def forget_driver(self, driver):
+        """Drops the bridges attached to a browser that's been closed"""
+        self.bridge_instances.pop(id(driver), None)
 
     def run(self, driver, url):
         """
@@ -215,8 +555,9 @@ class PersonaEngine:
             list of state representations if it's a multi-step command.
             For example, youtube:next_up#30 to hit 'next up' 30 times
         """
+        url_before_action = None
         if "chrome-search" not in driver.current_url and not driver.current_url.startswith("data"):
-            self.url_before_action = driver.current_url
+            url_before_action = driver.current_url
 
         parsed = urlparse(url)
 
@@ -227,11 +568,8 @@ class PersonaEngine:
             states = [self.run(driver, command) for _ in range(iterations)]
             return states
 
-        if "youtu" in url:
-            self.bridge_data = YoutubeBridge(driver).run(url)
-        elif "amazon" in url:
-            self.bridge_data = AmazonBridge(driver).run(url)
-        else:
-            raise Exception(f"Unknown url {url}")
+        self.hooks.emit("before_action", driver=driver, url=url)
 
-        return self.get_state(driver, url)
+        with timing.activate(timing.StepTimer() if self.timings else None):
+            bridge_data = self.get_bridge(driver, url).run(url)
+            return self.get_state(driver, url, bridge_data, url_before_action)
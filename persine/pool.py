@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BrowserPool:
+    """
+    Starts browsers ahead of time, so a persona can pick up one that's
+    already running instead of waiting for Chrome to boot.
+
+    A Chrome profile can only be used by one browser at a time, and a
+    running Chrome can't switch profiles, so browsers are warmed up for a
+    specific profile folder (or None for a throwaway profile).
+
+    Args:
+        launch (callable): Starts a browser for a given user_data_dir
+        max_workers (int): How many browsers can be starting at once
+    """
+
+    def __init__(self, launch, max_workers=2):
+        self.launch = launch
+        self.max_workers = max_workers
+        self.executor = None
+        self.warm = {}
+        self._lock = threading.Lock()
+
+    def prewarm(self, user_data_dir=None, count=1):
+        """
+        Starts launching browsers in the background
+
+        Args:
+            user_data_dir (str): The profile they'll use
+            count (int): How many to start
+        """
+        with self._lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            futures = self.warm.setdefault(user_data_dir, [])
+            for _ in range(count):
+                futures.append(self.executor.submit(self.launch, user_data_dir))
+
+    def take(self, user_data_dir=None):
+        """
+        Hands over a warmed-up browser for a profile, waiting for it to
+        finish starting if it's still booting.
+
+        Returns:
+            webdriver.Chrome: The browser, or None if none were warmed up
+        """
+        with self._lock:
+            futures = self.warm.get(user_data_dir)
+            if not futures:
+                return None
+            future = futures.pop(0)
+            if not futures:
+                del self.warm[user_data_dir]
+
+        try:
+            return future.result()
+        except Exception:
+            # Couldn't start in the background, the caller can try itself
+            return None
+
+    def close(self):
+        """Quits any browsers that were never taken"""
+        with self._lock:
+            futures = [future for pending in self.warm.values() for future in pending]
+            self.warm = {}
+            executor, self.executor = self.executor, None
+
+        for future in futures:
+            try:
+                future.result().quit()
+            except Exception:
+                pass
+        if executor is not None:
+            executor.shutdown(wait=True)
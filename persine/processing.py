@@ -0,0 +1,125 @@
+import os
+import io
+import time
+import base64
+import zlib
+from PIL import Image
+
+from .utils import simplify_source
+from .blobs import BlobStore
+
+JPEG_MAGIC = b"\xff\xd8"
+
+
+def wants(setting, destination):
+    """Whether an html/screenshot setting includes a destination
+    like "file" or "history"
+    """
+    return bool(setting) and (setting == destination or destination in setting)
+
+
+def resize_screenshot(png, scale):
+    """
+    Shrinks a PNG screenshot.
+
+    Returns:
+        Image: The resized screenshot
+    """
+    screenshot = Image.open(io.BytesIO(png))
+    size = (
+        int(screenshot.size[0] * scale),
+        int(screenshot.size[1] * scale),
+    )
+    return screenshot.resize(size)
+
+
+def encode_screenshot(png, scale, quality=80, optimize=True):
+    """
+    Turns a PNG screenshot into a resized JPEG.
+
+    Returns:
+        bytes: The JPEG
+    """
+    buffer = io.BytesIO()
+    resize_screenshot(png, scale).convert("RGB").save(
+        buffer, "JPEG", optimize=optimize, quality=quality
+    )
+    return buffer.getvalue()
+
+
+def finish_state(state, bridge_data, source, screenshot, settings):
+    """
+    Does the CPU-heavy part of building a state: simplifying the HTML and
+    encoding the screenshot, then saving them wherever the settings say.
+    It only works with plain data, so it can run in a separate thread or
+    process while the browser moves on to the next command.
+
+    Args:
+        state (dict): The basic page information (key, url, etc)
+        bridge_data (dict): Data scraped from the page by the bridge
+        source (str): The raw page source, or None if HTML isn't saved
+        screenshot (bytes): The raw PNG screenshot, or an already-resized
+            JPEG, or None if screenshots aren't saved
+        settings (dict): html, compress_html, simplify, screenshot,
+            screenshot_scale, cache_dir and blob_dir from the PersonaEngine
+
+    Returns:
+        dict: The completed state
+    """
+    state = state.copy()
+    key = state["key"]
+    if "timings" in state:
+        state["timings"] = timings = dict(state["timings"])
+    else:
+        timings = None
+
+    if source is not None:
+        # Remove style tags which are like 2/3 of YouTube
+        started = time.perf_counter()
+        html = simplify_source(source, method=settings["simplify"])
+        if timings is not None:
+            timings["simplify"] = round(time.perf_counter() - started, 4)
+
+        if wants(settings["html"], "file"):
+            source_filepath = os.path.join(settings["cache_dir"], f"{key}.html")
+            with open(source_filepath, "w") as outfile:
+                outfile.write(html)
+
+        if wants(settings["html"], "history"):
+            if settings["compress_html"]:
+                compressed = zlib.compress(html.encode("utf-8"))
+                state["page_source"] = base64.b64encode(compressed).decode(
+                    "utf-8"
+                )  # noqa: E501
+            else:
+                state["page_source"] = html
+
+        if wants(settings["html"], "blobs"):
+            blobs = BlobStore(settings["blob_dir"])
+            state["page_source_blob"] = blobs.put(html, chunked=True)
+
+    if screenshot is not None:
+        if screenshot.startswith(JPEG_MAGIC):
+            # Chrome already shrunk and encoded it for us
+            jpeg = screenshot
+        else:
+            started = time.perf_counter()
+            jpeg = encode_screenshot(screenshot, settings["screenshot_scale"])
+            if timings is not None:
+                timings["screenshot_encode"] = round(time.perf_counter() - started, 4)  # noqa: E501
+
+        # Save to file
+        if wants(settings["screenshot"], "file"):
+            ss_filepath = os.path.join(settings["cache_dir"], f"{key}.jpg")
+            with open(ss_filepath, "wb") as outfile:
+                outfile.write(jpeg)
+
+        # Save to state
+        if wants(settings["screenshot"], "history"):
+            state["screenshot"] = base64.b64encode(jpeg).decode('ascii')
+
+        if wants(settings["screenshot"], "blobs"):
+            blobs = BlobStore(settings["blob_dir"])
+            state["screenshot_blob"] = blobs.put(jpeg)
+
+    return {**state, **(bridge_data or {})}
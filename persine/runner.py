@@ -0,0 +1,213 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from selenium.common.exceptions import InvalidSessionIdException
+from selenium.common.exceptions import WebDriverException
+
+# What chromedriver says when the browser itself has gone away, as opposed
+# to something on the page going wrong
+DEAD_BROWSER_MESSAGES = (
+    "chrome not reachable",
+    "session deleted because of page crash",
+    "tab crashed",
+    "disconnected: not connected to devtools",
+)
+
+
+class RunnerProgress:
+    """
+    Keeps track of how far along a PersonaRunner is, across every persona.
+    Safe to update from multiple threads.
+
+    Args:
+        plans (dict): Persona names mapped to their list of commands
+    """
+
+    def __init__(self, plans):
+        self.personas_total = len(plans)
+        self.personas_done = 0
+        self.personas_failed = 0
+        self.commands_total = sum(len(commands) for commands in plans.values())
+        self.commands_done = 0
+        self.restarts = 0
+        self._lock = threading.Lock()
+
+    def update(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                setattr(self, key, getattr(self, key) + value)
+            return self.snapshot()
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The current counts
+        """
+        return {
+            "personas_total": self.personas_total,
+            "personas_done": self.personas_done,
+            "personas_failed": self.personas_failed,
+            "commands_total": self.commands_total,
+            "commands_done": self.commands_done,
+            "restarts": self.restarts,
+        }
+
+
+class PersonaRunner:
+    """
+    Runs many personas at once, each one in its own Chrome. No more than
+    ``max_browsers`` browsers are open at a time, and personas wait their
+    turn for a free slot.
+
+    Args:
+        engine (PersonaEngine): The engine that creates the personas
+        max_browsers (int): Most browsers to have open at once. Defaults to
+            ``browsers_per_core`` times the number of CPU cores.
+        browsers_per_core (float): Browsers per CPU core, used when
+            ``max_browsers`` isn't given
+        max_restarts (int): How many times a crashed browser is restarted
+            for a single command before the persona is given up on. Other
+            errors (missing elements, timeouts, etc) aren't retried.
+        resume (boolean): Whether personas resume previous runs
+        progress (callable): Called with the persona name, the command that
+            was just run, and a dict of overall progress after each command
+        warm_ahead (int): How many of the personas waiting for a slot get
+            their browser started early, so they're ready to go as soon as
+            a slot opens up. Each one is an extra Chrome running.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_browsers=None,
+        browsers_per_core=1,
+        max_restarts=2,
+        resume=False,
+        progress=None,
+        warm_ahead=0,
+    ):
+        if max_browsers is None:
+            max_browsers = max(1, int((os.cpu_count() or 1) * browsers_per_core))
+        if engine.custom_driver and max_browsers > 1:
+            raise Exception("Can't run personas in parallel with a custom driver")
+
+        self.engine = engine
+        self.max_browsers = max_browsers
+        self.max_restarts = max_restarts
+        self.resume = resume
+        self.progress_callback = progress
+        self.progress = None
+        self.warm_ahead = warm_ahead
+        self._waiting = []
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    def run(self, plans):
+        """
+        Runs every persona's commands.
+
+        Args:
+            plans (dict): Persona names mapped to the list of commands each
+                persona should run. Every persona gets its own Chrome profile.
+
+        Returns:
+            dict: Persona names mapped to the finished Persona, or to the
+                exception that stopped it
+        """
+        self.progress = RunnerProgress(plans)
+        self._waiting = list(plans.keys())
+        self._prepared = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_browsers) as pool:
+            futures = {
+                name: pool.submit(self.run_persona, name, commands)
+                for name, commands in plans.items()
+            }
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                results[name] = err
+        return results
+
+    def run_persona(self, name, commands):
+        """Runs a single persona from start to finish"""
+        persona = self._prepare(name)
+        self._warm_next()
+
+        try:
+            for command in commands:
+                self._run_command(persona, command)
+                snapshot = self.progress.update(commands_done=1)
+                if self.progress_callback:
+                    self.progress_callback(name, command, snapshot)
+        except Exception:
+            self.progress.update(personas_failed=1)
+            raise
+        finally:
+            self._shutdown(persona)
+
+        self.progress.update(personas_done=1)
+        return persona
+
+    def _prepare(self, name):
+        with self._lock:
+            if name in self._waiting:
+                self._waiting.remove(name)
+            if name in self._prepared:
+                return self._prepared.pop(name)
+        return self.engine.persona(name, resume=self.resume, overwrite=True)
+
+    def _warm_next(self):
+        with self._lock:
+            upcoming = [
+                name for name in self._waiting[:self.warm_ahead]
+                if name not in self._prepared
+            ]
+            for name in upcoming:
+                # Set up the profile first, so clearing it doesn't pull
+                # the rug out from under the warm browser
+                persona = self.engine.persona(
+                    name, resume=self.resume, overwrite=True
+                )
+                self.engine.prewarm(persona)
+                self._prepared[name] = persona
+
+    def _run_command(self, persona, command):
+        attempts = 0
+        while True:
+            try:
+                return persona.run(command)
+            except WebDriverException as err:
+                # A missing element or a script error would just happen
+                # again in a fresh browser, so only restart dead ones
+                if attempts >= self.max_restarts or not self._browser_died(persona, err):  # noqa: E501
+                    raise
+                attempts += 1
+                self.progress.update(restarts=1)
+                # Throw away the crashed browser, the next run relaunches
+                self._shutdown(persona)
+
+    def _browser_died(self, persona, err):
+        if isinstance(err, InvalidSessionIdException):
+            return True
+        message = (err.msg or "").lower()
+        if any(sign in message for sign in DEAD_BROWSER_MESSAGES):
+            return True
+        if persona.driver is None:
+            return True
+        try:
+            persona.driver.window_handles
+        except Exception:
+            return True
+        return False
+
+    def _shutdown(self, persona):
+        if persona.driver is None:
+            return
+        try:
+            persona.quit()
+        except Exception:
+            persona.driver = None
@@ -0,0 +1,390 @@
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from .history import HEAVY_FIELDS
+from .history import LazySource
+from .history import LazyState
+from .utils import state_recommendations
+
+# history_path extensions that mean "keep history in SQLite"
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Recommendation fields that get their own (indexed) column, everything
+# else stays in the JSON
+INDEXED_RECOMMENDATION_FIELDS = ("url", "channel_name")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS states (
+    persona TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    key TEXT,
+    action TEXT,
+    url TEXT,
+    data TEXT NOT NULL,
+    page_source TEXT,
+    screenshot TEXT,
+    PRIMARY KEY (persona, position)
+);
+CREATE INDEX IF NOT EXISTS states_key ON states (key);
+CREATE INDEX IF NOT EXISTS states_url ON states (url);
+CREATE TABLE IF NOT EXISTS recommendations (
+    persona TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    action_key TEXT,
+    url TEXT,
+    channel_name TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recommendations_persona
+    ON recommendations (persona, position);
+CREATE INDEX IF NOT EXISTS recommendations_action_key
+    ON recommendations (action_key);
+CREATE INDEX IF NOT EXISTS recommendations_url ON recommendations (url);
+CREATE INDEX IF NOT EXISTS recommendations_channel_name
+    ON recommendations (channel_name);
+"""
+
+
+def is_sqlite_path(path):
+    """Whether a history_path should be stored with HistoryDatabase"""
+    return path is not None and path.lower().endswith(SQLITE_EXTENSIONS)
+
+
+def _where(filters):
+    clauses = []
+    params = []
+    for column, value in filters.items():
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if not clauses:
+        return "", params
+    return " WHERE " + " AND ".join(clauses), params
+
+
+class HistoryDatabase(LazySource):
+    """
+    Keeps history in a SQLite database instead of a JSON Lines file. It
+    can stand in for a HistoryJournal, and any number of personas can
+    share one database. Every state's recommendations get a row of their
+    own, indexed by persona, action_key, url and channel_name, so
+    questions like "how often did this video show up in the sidebar" can
+    be answered across personas without loading every history into pandas.
+
+    Appended states are saved up and written in a single transaction every
+    fsync_every states, and whenever the persona flushes or quits, instead
+    of paying for a commit on every step. The write lock is only held while
+    a batch is actually being written, so any number of personas can share
+    a database at once, and it runs in WAL mode so readers never block them.
+
+    Args:
+        path (str): The database file
+        persona (str): Whose history this is. Leave it out to only query.
+        fsync_every (int): Commit and force the database to disk after this
+            many appended states
+    """
+
+    def __init__(self, path, persona=None, fsync_every=50):
+        super().__init__()
+        self.path = path
+        self.persona = persona
+        self.fsync_every = fsync_every
+        self._db = None
+        self._unsynced = 0
+        # Rows waiting for the next commit, by position
+        self._pending = {}
+        self._next = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Personas can be run from worker threads (see persine.aio)
+            db = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def __iter__(self):
+        return self.load()
+
+    def load(self, lazy=False):
+        """
+        Streams this persona's saved states back, one at a time
+
+        Args:
+            lazy (boolean): Whether to leave page sources and screenshots in
+                the database until they're used (see LazyState)
+
+        Yields:
+            dict: A saved state
+        """
+        if not os.path.exists(self.path):
+            return
+
+        self.flush()
+        if lazy:
+            heavy = ", ".join(f"{field} IS NOT NULL" for field in HEAVY_FIELDS)
+        else:
+            heavy = ", ".join(HEAVY_FIELDS)
+        rows = self.db.execute(
+            f"SELECT position, data, {heavy} FROM states WHERE persona = ? ORDER BY position",  # noqa: E501
+            (self.persona,),
+        )
+        for position, data, *heavy_values in rows:
+            state = json.loads(data)
+            if lazy:
+                lazy_fields = tuple(
+                    field
+                    for field, present in zip(HEAVY_FIELDS, heavy_values)
+                    if present
+                )
+                if lazy_fields:
+                    state = self._lazy(state, lazy_fields, position)
+            else:
+                for field, value in zip(HEAVY_FIELDS, heavy_values):
+                    if value is not None:
+                        state[field] = value
+            yield state
+
+    def _heavy_fields(self, state):
+        # Only text goes in the heavy columns, anything else stays in data
+        return tuple(
+            field for field in HEAVY_FIELDS if isinstance(state.get(field), str)
+        )
+
+    def _read_at(self, position):
+        if position in self._pending:
+            row = self._pending[position][0][-len(HEAVY_FIELDS):]
+        else:
+            row = self.db.execute(
+                f"SELECT {', '.join(HEAVY_FIELDS)} FROM states WHERE persona = ? AND position = ?",  # noqa: E501
+                (self.persona, position),
+            ).fetchone()
+        return {
+            field: value
+            for field, value in zip(HEAVY_FIELDS, row)
+            if value is not None
+        }
+
+    def _rows(self, state, position):
+        # Heavy text fields go in their own columns so lazy states (and
+        # queries) don't have to read them
+        heavy = [
+            state[field] if isinstance(state.get(field), str) else None
+            for field in HEAVY_FIELDS
+        ]
+        light = {
+            key: value
+            for key, value in state.items()
+            if not (key in HEAVY_FIELDS and isinstance(value, str))
+        }
+        state_row = (
+            self.persona,
+            position,
+            state.get("key"),
+            state.get("action"),
+            state.get("url"),
+            json.dumps(light),
+            *heavy,
+        )
+        recommendation_rows = [
+            (
+                self.persona,
+                position,
+                rec.get("action_key"),
+                *[rec.get(field) for field in INDEXED_RECOMMENDATION_FIELDS],
+                json.dumps(rec),
+            )
+            for rec in state_recommendations(state)
+        ]
+        return state_row, recommendation_rows
+
+    def _insert(self, rows):
+        self.db.executemany(
+            "INSERT INTO states VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [state_row for state_row, _ in rows],
+        )
+        self.db.executemany(
+            "INSERT INTO recommendations VALUES (?, ?, ?, ?, ?, ?)",
+            [rec for _, recommendation_rows in rows for rec in recommendation_rows],  # noqa: E501
+        )
+
+    def _next_position(self):
+        row = self.db.execute(
+            "SELECT MAX(position) FROM states WHERE persona = ?", (self.persona,)
+        ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def append(self, state):
+        """
+        Saves a single state and its recommendations. It's written to the
+        database along with the rest of its batch, see flush.
+
+        Returns:
+            int: The state's position, for lazy_state
+        """
+        if self._next is None:
+            self._next = self._next_position()
+        position = self._next
+        # Encoded now, so a state that can't be saved fails here instead
+        # of taking the whole batch down with it later
+        self._pending[position] = self._rows(state, position)
+        self._next += 1
+
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+
+        return position
+
+    def flush(self):
+        """Writes any appended states to the database in one transaction"""
+        if not self._pending:
+            return
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(list(self._pending.values()))
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        self._pending = {}
+
+    def sync(self):
+        """Writes any appended states and forces them to disk"""
+        self.flush()
+        if self._db is not None:
+            self._db.execute("PRAGMA wal_checkpoint(FULL)")
+        self._unsynced = 0
+
+    def compact(self, states):
+        """
+        Replaces this persona's history with exactly the given states, all
+        in one transaction
+
+        Args:
+            states (list): Every state that should be in the history
+
+        Returns:
+            list: The new position of each state
+        """
+        states = list(states)
+        self.flush()
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Write the new rows after the old ones, so lazy states can
+            # still be read while we go, then drop the old ones
+            start = self._next_position()
+            positions = []
+            for position, state in enumerate(states, start):
+                if isinstance(state, LazyState):
+                    state = state.materialize()
+                self._insert([self._rows(state, position)])
+                positions.append(position)
+            self._before_rewrite(states)
+            for table in ("states", "recommendations"):
+                db.execute(
+                    f"DELETE FROM {table} WHERE persona = ? AND position < ?",
+                    (self.persona, start),
+                )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        self._next = None
+        self._after_rewrite(states, positions)
+        return positions
+
+    def close(self):
+        """Writes any appended states, syncs and closes the database"""
+        if self._db is not None:
+            self.sync()
+            self._db.close()
+            self._db = None
+
+    def delete(self):
+        """Removes this persona's history, leaving other personas alone"""
+        self.generation += 1
+        self._pending = {}
+        self._next = None
+        self._unsynced = 0
+        if not os.path.exists(self.path):
+            return
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        for table in ("states", "recommendations"):
+            db.execute(f"DELETE FROM {table} WHERE persona = ?", (self.persona,))
+        db.execute("COMMIT")
+
+    def states(self, persona=None, key=None, url=None, action=None):
+        """
+        Streams saved states (without page sources or screenshots)
+        matching every filter that's given, across all personas unless
+        one is picked
+
+        Yields:
+            dict: The state, with a persona field added
+        """
+        self.flush()
+        where, params = _where(
+            {"persona": persona, "key": key, "url": url, "action": action}
+        )
+        rows = self.db.execute(
+            f"SELECT persona, data FROM states{where} ORDER BY persona, position",  # noqa: E501
+            params,
+        )
+        for persona_name, data in rows:
+            yield {"persona": persona_name, **json.loads(data)}
+
+    def recommendations(self, persona=None, action_key=None, url=None, channel_name=None):  # noqa: E501
+        """
+        Streams saved recommendations matching every filter that's given,
+        across all personas unless one is picked
+
+        Yields:
+            dict: The recommendation, with a persona field added
+        """
+        self.flush()
+        where, params = _where({
+            "persona": persona,
+            "action_key": action_key,
+            "url": url,
+            "channel_name": channel_name,
+        })
+        rows = self.db.execute(
+            f"SELECT persona, data FROM recommendations{where} ORDER BY persona, position, rowid",  # noqa: E501
+            params,
+        )
+        for persona_name, data in rows:
+            yield {"persona": persona_name, **json.loads(data)}
+
+    def query(self, sql, params=()):
+        """
+        Runs your own SQL against the database. The states and
+        recommendations tables have persona, url and key/action_key
+        columns, recommendations also have channel_name, and everything
+        else is in the data column as JSON.
+
+        Example:
+            >>> db.query(
+            ...     "SELECT url, COUNT(*) AS times FROM recommendations "
+            ...     "GROUP BY url ORDER BY times DESC"
+            ... )
+
+        Returns:
+            pandas.DataFrame: The results
+        """
+        self.flush()
+        return pd.read_sql_query(sql, self.db, params=params)
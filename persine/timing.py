@@ -0,0 +1,123 @@
+import time
+import threading
+from contextlib import contextmanager
+import pandas as pd
+
+_current = threading.local()
+
+
+class StepTimer:
+    """
+    Collects how long each phase of a single command takes (navigating,
+    waiting, running scripts, grabbing the page source, etc). Phases with
+    the same name are added together, and phases can overlap: script time
+    is also counted inside scrape and wait.
+
+    The engine makes a timer active while it runs a command, and anything
+    running in that thread can report to it with :func:`phase` or
+    :func:`record` without having to pass it around.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0) + seconds
+
+    def finish(self):
+        """
+        Records the total time since the timer was created
+
+        Returns:
+            dict: Phase names mapped to seconds
+        """
+        self.add("total", time.perf_counter() - self.started)
+        return {key: round(value, 4) for key, value in self.timings.items()}
+
+
+@contextmanager
+def activate(timer):
+    """Makes a StepTimer the one phases are reported to in this thread.
+    Passing None turns timing off."""
+    previous = getattr(_current, "timer", None)
+    _current.timer = timer
+    try:
+        yield timer
+    finally:
+        _current.timer = previous
+
+
+def current():
+    """
+    Returns:
+        StepTimer: The active timer in this thread, or None
+    """
+    return getattr(_current, "timer", None)
+
+
+def record(name, seconds):
+    """Adds time to a phase of the active timer, if there is one"""
+    timer = current()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+@contextmanager
+def phase(name):
+    """Times the code inside the with block as the given phase. Does nothing
+    when timing is turned off."""
+    timer = current()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+
+
+class TimingProfile:
+    """
+    Adds up the timings of every step a persona takes, so you can see
+    where a whole run's time went.
+    """
+
+    def __init__(self):
+        self.steps = 0
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, timings):
+        """Adds a single step's timings to the profile"""
+        with self._lock:
+            self.steps += 1
+            for name, seconds in timings.items():
+                stats = self.phases.setdefault(
+                    name, {"count": 0, "total": 0, "min": seconds, "max": seconds}
+                )
+                stats["count"] += 1
+                stats["total"] += seconds
+                stats["min"] = min(stats["min"], seconds)
+                stats["max"] = max(stats["max"], seconds)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Phase names mapped to their count, total, mean, min and
+                max seconds
+        """
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "total": round(stats["total"], 4),
+                    "mean": round(stats["total"] / stats["count"], 4),
+                }
+                for name, stats in self.phases.items()
+            }
+
+    def to_df(self):
+        """Returns the summary as a pandas DataFrame, one row per phase"""
+        return pd.DataFrame.from_dict(self.summary(), orient="index")
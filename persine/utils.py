@@ -1,13 +1,45 @@
+import re
 from collections import UserList
+from collections.abc import Sequence
 from bs4 import BeautifulSoup
 import pandas as pd
 
+from . import export
 
-def simplify_source(source, tags=("style", "svg", "script")):
+# Actions that don't leave the page, so their recommendations
+# would just be repeats
+SAME_PAGE_ACTIONS = (
+    "youtube:like",
+    "youtube:dislike",
+    "youtube:subscribe",
+    "youtube:unsubscribe",
+)
+
+# Elements whose contents are plain text, so anything tag-like inside
+# them (e.g. "<div>" in a script) isn't actually a tag
+RAW_TEXT_TAGS = ("script", "style", "textarea", "title")
+
+# Any start or end tag. Attributes may contain ">" (or "<script>") as long
+# as it's inside quotes, so every tag has to be matched from its opening
+# bracket, even the ones we don't care about.
+TAG_PATTERN = r"<(/?)([a-zA-Z][^\s/>]*)(?:\"[^\"]*\"|'[^']*'|[^'\">])*?(/?)>"
+
+
+def simplify_source(source, tags=("style", "svg", "script"), method="bs4"):
     """
     Given HTML source, deletes the specified tags to make the
     source code smaller
+
+    Args:
+        source (str): The HTML
+        tags (tuple): The tags to remove, along with everything inside of them
+        method (str): "bs4" parses and re-serializes the whole page with
+            BeautifulSoup. "fast" only scans for the tags being removed and
+            cuts them out, leaving the rest of the source untouched.
     """
+    if method == "fast":
+        return strip_tags(source, tags)
+
     doc = BeautifulSoup(source, features="html.parser")
     for tag in tags:
         for element in doc.select(tag):
@@ -15,17 +47,246 @@ def simplify_source(source, tags=("style", "svg", "script")):
     return doc.decode("utf-8").strip()
 
 
-class RecommendationList(UserList):
+TAG_REGEX = re.compile(r"<!--.*?-->|" + TAG_PATTERN, re.S)
+
+
+def strip_tags(source, tags=("style", "svg", "script")):
+    """
+    Removes tags (and their contents) from HTML without building a document
+    tree. Tags are only scanned past, never parsed, which makes it much
+    faster than simplify_source's BeautifulSoup path on large pages.
+    """
+    tags = {tag.lower() for tag in tags}
+    if not tags:
+        return source.strip()
+
+    raw_text = tags.intersection(RAW_TEXT_TAGS)
+    watched = tags | set(RAW_TEXT_TAGS)
+
+    pieces = []
+    keep_from = 0
+    position = 0
+    skipping = None
+    depth = 0
+
+    while True:
+        match = TAG_REGEX.search(source, position)
+        if match is None:
+            break
+        position = match.end()
+
+        if match.group(2) is None:
+            # HTML comment, anything inside doesn't count
+            continue
+
+        name = match.group(2).lower()
+        if name not in watched:
+            continue
+        closing = match.group(1)
+        self_closing = match.group(3)
+
+        if not closing and name in RAW_TEXT_TAGS:
+            # Jump straight to the end of the raw text
+            end_tag = re.compile(rf"</{name}\s*>", re.I).search(source, position)
+            position = end_tag.end() if end_tag else len(source)
+            if skipping is None and name in raw_text:
+                pieces.append(source[keep_from:match.start()])
+                keep_from = position
+            continue
+
+        if skipping is not None:
+            if name == skipping:
+                if closing:
+                    depth -= 1
+                elif not self_closing:
+                    depth += 1
+                if depth == 0:
+                    skipping = None
+                    keep_from = position
+            continue
+
+        if not closing and name in tags:
+            pieces.append(source[keep_from:match.start()])
+            if self_closing:
+                keep_from = position
+            else:
+                skipping = name
+                depth = 1
+
+    if skipping is None:
+        pieces.append(source[keep_from:])
+
+    return "".join(pieces).strip()
+
+
+def state_recommendations(state):
+    """
+    Yields the recommendations from a state, each tagged with the
+    state's key as action_key
+    """
+    if "recommendations" in state and state["action"] not in SAME_PAGE_ACTIONS:
+        for rec in state["recommendations"]:
+            yield {
+                **rec,
+                'action_key': state['key']
+            }
+
+
+# Marks a column a recommendation didn't have, as opposed to None
+_MISSING = object()
+
+# Longer strings (descriptions, etc) rarely repeat, so they aren't
+# worth looking up in the string pool
+MAX_POOLED_LENGTH = 512
+
+
+class RecommendationList(Sequence):
+    """
+    A list of recommendations, stored as one list per column instead
+    of one dict per recommendation. Repeated strings like URLs, channel
+    names and action keys are only kept in memory once. Reading it back
+    gives you dicts just like the ones that went in.
+
+    Args:
+        initlist (list): The recommendations to start with
+    """
+
+    def __init__(self, initlist=None):
+        self.columns = {}
+        self._length = 0
+        self._strings = {}
+        if initlist is not None:
+            self.extend(initlist)
+
+    def _pool(self, value):
+        if isinstance(value, str) and len(value) <= MAX_POOLED_LENGTH:
+            return self._strings.setdefault(value, value)
+        return value
+
+    def append(self, rec):
+        """Adds a recommendation (a dict) to the end of the list"""
+        for key, value in rec.items():
+            if key not in self.columns:
+                self.columns[self._pool(key)] = [_MISSING] * self._length
+            self.columns[key].append(self._pool(value))
+        self._length += 1
+        for column in self.columns.values():
+            if len(column) < self._length:
+                column.append(_MISSING)
+
+    def extend(self, recs):
+        for rec in recs:
+            self.append(rec)
+
+    def _row(self, index):
+        return {
+            key: column[index]
+            for key, column in self.columns.items()
+            if column[index] is not _MISSING
+        }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("recommendation index out of range")
+        return self._row(index)
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self._row(index)
+
+    def __len__(self):
+        return self._length
+
+    def __eq__(self, other):
+        if isinstance(other, (RecommendationList, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    @property
+    def data(self):
+        """The recommendations as a plain list of dicts"""
+        return list(self)
+
     def to_df(self):
         """Returns the object as a pandas DataFrame"""
-        return pd.DataFrame(self.data)
+        return pd.DataFrame({
+            key: [None if value is _MISSING else value for value in column]
+            for key, column in self.columns.items()
+        }, index=range(self._length))
 
     def to_csv(self, filename):
         """Saves the object to a CSV file"""
         self.to_df().to_csv(filename, index=False)
 
+    def to_parquet(self, filename, bridge=None, chunk_size=10000):
+        """
+        Saves the object to a Parquet file, converting chunk_size rows at a
+        time. Requires pyarrow.
+
+        Args:
+            filename (str): Where to save the file
+            bridge (str): Use the columns for just "youtube" or "amazon"
+                instead of every known column
+            chunk_size (int): How many rows to convert at once
+        """
+        export.write_parquet(
+            self, filename, export.recommendation_columns(bridge), chunk_size
+        )
+
+    def to_arrow(self, filename, bridge=None, chunk_size=10000):
+        """Saves the object to an Arrow IPC stream. See to_parquet."""
+        export.write_arrow(
+            self, filename, export.recommendation_columns(bridge), chunk_size
+        )
+
 
 class HistoryList(UserList):
+    """
+    A list of visited states. If a journal is attached, every
+    appended state is also written to disk.
+
+    Args:
+        initlist (list): The states to start with
+        journal (HistoryJournal): Where new states are written
+        lazy (boolean): Once a state is in the journal, only keep its
+            lightweight fields in memory and read page sources and
+            screenshots back from the journal when they're used
+    """
+    def __init__(self, initlist=None, journal=None, lazy=False):
+        super().__init__(initlist)
+        self.journal = journal
+        self.lazy = lazy
+
+    def append(self, item):
+        if self.journal is not None:
+            offset = self.journal.append(item)
+            if self.lazy:
+                item = self.journal.lazy_state(item, offset)
+        super().append(item)
+
+    def extend(self, other):
+        for item in other:
+            self.append(item)
+
+    def save(self):
+        """Rewrites the attached journal with the full contents of the list"""
+        if self.journal is not None:
+            offsets = self.journal.compact(self.data)
+            if self.lazy:
+                # Lazy states were already moved to their new lines, but
+                # any that were never lazy can be now
+                self.data = [
+                    self.journal.lazy_state(state, offset)
+                    for state, offset in zip(self.data, offsets)
+                ]
+
     def to_df(self):
         """Returns the object as a pandas DataFrame"""
         return pd.DataFrame(self.data)
@@ -33,3 +294,21 @@ class HistoryList(UserList):
     def to_csv(self, filename):
         """Saves the object to a CSV file"""
         self.to_df().to_csv(filename, index=False)
+
+    def to_parquet(self, filename, chunk_size=10000):
+        """
+        Saves the object to a Parquet file, converting chunk_size rows at a
+        time. Recommendations are left out, save those from the
+        RecommendationList. Requires pyarrow.
+        """
+        export.write_parquet(
+            self, filename, export.HISTORY_COLUMNS, chunk_size,
+            skip=export.HISTORY_SKIPPED
+        )
+
+    def to_arrow(self, filename, chunk_size=10000):
+        """Saves the object to an Arrow IPC stream. See to_parquet."""
+        export.write_arrow(
+            self, filename, export.HISTORY_COLUMNS, chunk_size,
+            skip=export.HISTORY_SKIPPED
+        )
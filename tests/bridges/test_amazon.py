@@ -0,0 +1,86 @@
+import json
+import shutil
+import subprocess
+from unittest.mock import Mock
+
+import pytest
+
+from persine import PersonaEngine
+from persine import timing
+from persine.bridges.amazon import AmazonBridge
+from persine.bridges.amazon import FORCE_LOAD_JS
+
+
+def make_driver(wait_result):
+    driver = Mock()
+    driver.current_url = "https://www.amazon.com/"
+    driver.execute_async_script.return_value = wait_result
+    return driver
+
+
+def test_wait_fills_wait_timings():
+    driver = make_driver({"scroll_1": 250, "carousel_1": 1500})
+    bridge = AmazonBridge(driver, wait_timeout=3, quiet_period=0.2)
+
+    timer = timing.StepTimer()
+    with timing.activate(timer):
+        state = bridge.run("amazon:homepage")
+
+    args = driver.execute_async_script.call_args[0]
+    assert args[3:6] == ("force_load", 3000, 200)
+    assert bridge.wait_timings["scroll_1"] == 0.25
+    assert bridge.wait_timings["carousel_1"] == 1.5
+    assert "total" in bridge.wait_timings
+    assert timer.timings["wait_carousel_1"] == 1.5
+    # Already in the timings, no need to save them with every state
+    assert state == {"page_type": "homepage", "recommendations": []}
+
+
+
+def test_engine_sets_wait_limits(tmp_path):
+    engine = PersonaEngine(
+        data_dir=str(tmp_path), amazon_wait_timeout=2, amazon_quiet_period=0.1
+    )
+    driver = make_driver({})
+    bridge = engine.get_bridge(driver, "amazon:homepage")
+
+    assert isinstance(bridge, AmazonBridge)
+    assert (bridge.wait_timeout, bridge.quiet_period) == (2, 0.1)
+
+FAKE_PAGE_JS = """
+const observers = [];
+global.MutationObserver = class {
+    constructor(callback) { this.callback = callback; observers.push(this); }
+    observe() {}
+    disconnect() { this.off = true; }
+};
+global.PerformanceObserver = class { observe() {} disconnect() {} };
+global.window = { scrollTo() {} };
+global.document = {
+    body: { scrollHeight: 100 },
+    querySelector() { return null; },
+    querySelectorAll() { return []; },
+};
+// A page that never stops changing
+setInterval(() => observers.forEach(o => o.off || o.callback([])), 10);
+
+const started = performance.now();
+(%s)(%d, 50, timings => {
+    console.log(JSON.stringify({elapsed: performance.now() - started, timings}));
+    process.exit(0);
+});
+"""
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_wait_stops_at_timeout():
+    script = FAKE_PAGE_JS % (FORCE_LOAD_JS, 300)
+    output = subprocess.run(
+        ["node", "-e", script], capture_output=True, timeout=10, check=True
+    ).stdout
+    result = json.loads(output)
+
+    assert 300 <= result["elapsed"] < 1000
+    assert set(result["timings"]) == {
+        "scroll_1", "scroll_2", "carousel_1", "carousel_2", "carousel_3"
+    }
@@ -0,0 +1,40 @@
+from unittest.mock import Mock
+
+from persine.bridges import BaseBridge
+from persine.bridges.bridge import MISSING
+
+
+class ExampleBridge(BaseBridge):
+    scripts = {"answer": "function(x) { return x + 1 }"}
+
+
+def test_scripts_installed_once():
+    installed = []
+
+    def execute_script(script, *args):
+        if "window.__persine =" in script:
+            installed.append(script)
+            return None
+        if not installed:
+            return MISSING
+        return args[-1] + 1
+
+    driver = Mock(spec=["execute_script"])
+    driver.execute_script.side_effect = execute_script
+    bridge = ExampleBridge(driver)
+
+    assert bridge.call_script("answer", 1) == 2
+    assert bridge.call_script("answer", 2) == 3
+    assert len(installed) == 1
+
+
+def test_scripts_preloaded_with_cdp():
+    driver = Mock()
+    driver.execute_script.side_effect = [MISSING, None, 2]
+    bridge = ExampleBridge(driver)
+
+    bridge.call_script("answer", 1)
+
+    cmd, args = driver.execute_cdp_cmd.call_args[0]
+    assert cmd == "Page.addScriptToEvaluateOnNewDocument"
+    assert ExampleBridge.script_version() in args["source"]
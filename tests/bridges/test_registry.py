@@ -0,0 +1,59 @@
+from unittest.mock import Mock
+
+from persine.bridges import registry as registry_module
+from persine.bridges import AmazonBridge, BaseBridge, BridgeRegistry, YoutubeBridge  # noqa: E501
+
+
+def test_default_registry():
+    registry = BridgeRegistry.default()
+
+    assert registry.find("youtube:search?cats") is YoutubeBridge
+    assert registry.find("https://www.youtube.com/watch?v=abc") is YoutubeBridge
+    assert registry.find("https://youtu.be/abc") is YoutubeBridge
+    assert registry.find("amazon:search?cats") is AmazonBridge
+    assert registry.find("https://smile.amazon.com/s?k=cats") is AmazonBridge
+    assert registry.find("https://www.amazon.co.uk/") is AmazonBridge
+    assert registry.find("https://example.com/youtube") is None
+
+
+def test_every_amazon_store():
+    registry = BridgeRegistry.default()
+
+    for host in ["amazon.se", "www.amazon.pl", "www.amazon.com.tr", "amazon.com.be", "www.amazon.sa", "amazon.ie"]:  # noqa: E501
+        assert registry.find(f"https://{host}/s?k=cats") is AmazonBridge
+    assert registry.find("https://amazon.example.com/") is None
+    assert registry.find("https://notamazon.com/") is None
+
+
+def test_register_bridge():
+    class ExampleBridge(BaseBridge):
+        schemes = ("example",)
+        hosts = ("example.com",)
+
+    registry = BridgeRegistry()
+    registry.register(ExampleBridge)
+
+    assert registry.find("example:homepage") is ExampleBridge
+    assert registry.find("http://sub.example.com/page") is ExampleBridge
+    assert registry.find("http://notexample.com/page") is None
+
+
+def test_broken_plugin_is_skipped(monkeypatch, caplog):
+    class PluginBridge(BaseBridge):
+        schemes = ("plugin",)
+
+    broken = Mock()
+    broken.name = "broken"
+    broken.load.side_effect = ImportError("missing dependency")
+    working = Mock()
+    working.name = "working"
+    working.load.return_value = PluginBridge
+    monkeypatch.setattr(
+        registry_module, "entry_points", lambda: {"persine.bridges": [broken, working]}  # noqa: E501
+    )
+
+    registry = BridgeRegistry.default()
+
+    assert registry.find("plugin:thing") is PluginBridge
+    assert registry.find("youtube:search?cats") is YoutubeBridge
+    assert "broken" in caplog.text
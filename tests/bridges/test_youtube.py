@@ -0,0 +1,135 @@
+import json
+import shutil
+import subprocess
+from unittest.mock import Mock
+
+import pytest
+
+from persine.bridges.youtube import PAGE_TYPE_JS
+from persine.bridges.youtube import WATCH_VIDEO_JS
+from persine.bridges.youtube import YoutubeBridge
+
+VIDEO_CONTENTS = {
+    "page_type": "video",
+    "player_data": {"title": "A video", "video_id": "abc", "author": "Chan"},
+    "player_page_data": {"is_live": False, "view_count": "10 views"},
+    "sidebar": [
+        {"item_type": "YTD-COMPACT-VIDEO-RENDERER", "title": "Next"},
+        {"item_type": "YTD-CONTINUATION-ITEM-RENDERER"},
+    ],
+    "caption_tracks": [],
+}
+
+
+def make_driver(scripts):
+    """A driver whose page already has the bridge's scripts, answering
+    each script by name from the given dict"""
+    scripts = {"remove_popups": None, **scripts}
+    driver = Mock()
+    driver.execute_script.side_effect = lambda caller, namespace, version, name, *args: scripts[name]  # noqa: E501
+    return driver
+
+
+def test_video_page_scraped_in_one_call():
+    driver = make_driver({"page_contents": VIDEO_CONTENTS})
+    data = YoutubeBridge(driver).get_data()
+
+    assert driver.execute_script.call_count == 1
+    assert data["title"] == "A video"
+    assert data["id"] == "abc"
+    assert data["channel_name"] == "Chan"
+    assert data["view_count"] == "10 views"
+    assert [rec["title"] for rec in data["recommendations"]] == ["Next"]
+
+
+def test_page_type_only_scripts_on_videos():
+    for page_type, watched in [("video", True), ("unknown", False)]:
+        contents = VIDEO_CONTENTS if watched else {"page_type": page_type}
+        driver = make_driver({"page_type": page_type, "page_contents": contents})  # noqa: E501
+        driver.execute_async_script.return_value = {"reason": "ended"}
+        YoutubeBridge(driver).run("https://www.youtube.com/watch?v=abc")
+
+        names = [c[0][3] for c in driver.execute_script.call_args_list]
+        assert names == ["remove_popups", "page_type", "page_contents"]
+        assert driver.execute_async_script.called == watched
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_page_type_returns_type_string():
+    def page_type(initial_data):
+        script = f"""
+        global.window = {{}};
+        global.ytInitialData = {json.dumps(initial_data)};
+        console.log(JSON.stringify(({PAGE_TYPE_JS})()));
+        """
+        output = subprocess.run(
+            ["node", "-e", script], capture_output=True, timeout=10, check=True
+        ).stdout
+        return json.loads(output)
+
+    assert page_type({"contents": {"twoColumnWatchNextResults": {}}}) == "video"
+    assert page_type({"contents": {"twoColumnSearchResultsRenderer": {}}}) == "search_results"  # noqa: E501
+    assert page_type({"contents": {"somethingNew": {}}}) == "unknown"
+    assert page_type(None) == "unknown"
+
+
+def test_watch_loop_checks_in_until_ended():
+    driver = make_driver({"page_type": "video", "page_contents": VIDEO_CONTENTS})
+    driver.execute_async_script.side_effect = [
+        {"reason": "waiting"},
+        {"reason": "waiting"},
+        {"reason": "ended", "watched": 12.5},
+    ]
+    bridge = YoutubeBridge(driver, watch="full", check_in=5)
+    bridge.run("https://www.youtube.com/watch?v=abc")
+
+    calls = [c[0][3:] for c in driver.execute_async_script.call_args_list]
+    assert len(calls) == 3
+    # Every check-in picks up the same watcher
+    assert len({call[1] for call in calls}) == 1
+    assert all(call[0] == "watch_video" and call[2:] == ("full", 0, 5) for call in calls)  # noqa: E501
+    assert bridge.watch_result == {"reason": "ended", "watched": 12.5}
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_watch_waits_for_the_new_video():
+    # Right after next_up the player still has the last video, ended
+    script = f"""
+    let events = [];
+    let player = {{
+        state: 0, video: "old", duration: 100,
+        classList: {{ contains: () => false }},
+        getPlayerState() {{ return this.state }},
+        getDuration() {{ return this.duration }},
+        getCurrentTime() {{ return 0 }},
+        getVideoData() {{ return {{ video_id: this.video, isLive: false }} }},
+        playVideo() {{ events.push("play " + this.video) }},
+        seekTo(seconds) {{
+            events.push("seek " + this.video + " " + seconds);
+            setTimeout(() => {{ this.state = 0; this.listener(0) }}, 50);
+        }},
+        addEventListener(name, listener) {{ this.listener = listener }},
+        removeEventListener() {{}},
+        setAutonavState() {{}},
+    }};
+    global.window = {{ location: {{
+        href: "https://www.youtube.com/watch?v=new", search: "?v=new"
+    }} }};
+    global.document = {{
+        getElementById: () => player, querySelector: () => null
+    }};
+    setTimeout(() => {{
+        player.video = "new"; player.state = 1; player.duration = 30;
+    }}, 600);
+    ({WATCH_VIDEO_JS})("token", "skip_ahead", 0, 5, result => {{
+        console.log(JSON.stringify({{ reason: result.reason, events }}));
+        process.exit(0);
+    }});
+    """
+    output = subprocess.run(
+        ["node", "-e", script], capture_output=True, timeout=10, check=True
+    ).stdout
+    result = json.loads(output)
+
+    assert result["reason"] == "ended"
+    assert result["events"] == ["seek new 28", "play new"]
@@ -17,7 +17,7 @@ def driver():
 def test_player_data(driver):
     bridge = YoutubeBridge(driver)
     driver.get("https://www.youtube.com/watch?v=1kIQT7uUiME")
-    res = bridge._YoutubeBridge__get_player_data()
+    res = bridge._YoutubeBridge__get_page_contents()["player_data"]
 
     comps = {
         "title": "Land of Talk - Some Are Lakes [Official Music Video]",
@@ -31,7 +31,7 @@ def test_player_data(driver):
 def test_video_data(driver):
     bridge = YoutubeBridge(driver)
     bridge.run("https://www.youtube.com/watch?v=1kIQT7uUiME")
-    res = bridge._YoutubeBridge__get_video_data()
+    res = bridge.get_data()
 
     comps = {
         "page_type": "video",
@@ -50,7 +50,7 @@ def test_recommendation_scraper(driver):
     bridge = YoutubeBridge(driver)
     bridge.run("https://www.youtube.com/watch?v=1kIQT7uUiME")
 
-    recs = bridge._YoutubeBridge__scrape_sidebar()
+    recs = bridge.get_data()["recommendations"]
     assert len(recs) > 5
     for rec in recs:
         assert rec["item_type"] is not None
@@ -62,7 +62,7 @@ def test_likes_v_dislikes(driver):
     bridge = YoutubeBridge(driver)
     bridge.run("https://www.youtube.com/watch?v=1kIQT7uUiME")
 
-    data = bridge._YoutubeBridge__get_player_page_data()
+    data = bridge._YoutubeBridge__get_page_contents()["player_page_data"]
     assert data['dislike_count'] != data['like_count']
 
 
@@ -0,0 +1,20 @@
+import pytest
+from unittest.mock import Mock
+
+from persine.persona import Persona
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """
+    A stand-in PersonaEngine. Browsers are Mocks, every command comes back
+    as a state named after itself, and personas are saved in tmp_path.
+    Swap out launch or run to test something else.
+    """
+    eng = Mock()
+    eng.data_dir = str(tmp_path)
+    eng.custom_driver = None
+    eng.launch = lambda user_data_dir: Mock()
+    eng.run = lambda driver, action: {"key": action, "action": action}
+    eng.persona = lambda name, **kwargs: Persona(eng, name=name, **kwargs)
+    return eng
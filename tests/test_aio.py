@@ -0,0 +1,45 @@
+import asyncio
+import threading
+import time
+
+from persine.aio import AsyncPersonaEngine
+
+
+def slow_run(delay):
+    def run(driver, action):
+        time.sleep(delay)
+        return {"key": action, "action": action, "thread": threading.get_ident()}  # noqa: E501
+    return run
+
+
+def test_async_persona(engine):
+    engine.run = slow_run(0)
+    engine = AsyncPersonaEngine(engine)
+
+    async def main():
+        async with await engine.persona("one", overwrite=True) as persona:
+            state = await persona.run("test:a")
+            states = await persona.run_batch(["test:b", "test:c"])
+        return persona, state, states
+
+    persona, state, states = asyncio.run(main())
+    assert state["action"] == "test:a"
+    assert [s["action"] for s in states] == ["test:b", "test:c"]
+    assert len(persona.history) == 3
+    assert persona.persona.driver is None
+    # Every browser call for a persona happens on the same thread
+    assert len({s["thread"] for s in persona.history}) == 1
+
+
+def test_async_run_many_overlaps(engine):
+    engine.run = slow_run(0.2)
+    engine = AsyncPersonaEngine(engine)
+    plans = {f"p{i}": ["test:a", "test:b"] for i in range(4)}
+
+    started = time.perf_counter()
+    results = asyncio.run(engine.run_many(plans, max_browsers=4))
+    elapsed = time.perf_counter() - started
+
+    assert all(len(results[name].history) == 2 for name in plans)
+    # Four personas, two 0.2s commands each, all at the same time
+    assert elapsed < 1.2
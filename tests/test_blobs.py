@@ -0,0 +1,48 @@
+import os
+
+from persine.blobs import BlobStore
+
+
+def count_files(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def test_blob_roundtrip(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digest = store.put(b"hello")
+    assert store.get(digest) == b"hello"
+    assert store.put("hello") == digest
+    assert count_files(tmp_path) == 1
+
+
+def test_chunked_blobs_share_chunks(tmp_path):
+    store = BlobStore(str(tmp_path), min_chunk=64, max_chunk=256, chunk_mask=0x3)
+    page = "".join(f"<div id='{i}'>item {i}</div>" for i in range(500))
+    edited = page.replace("item 250<", "changed<")
+
+    first = store.put(page, chunked=True)
+    files_after_first = count_files(tmp_path)
+    second = store.put(edited, chunked=True)
+
+    assert store.get(first).decode() == page
+    assert store.get(second).decode() == edited
+    # Only the chunk with the edit (and the new manifest) is added
+    assert count_files(tmp_path) - files_after_first <= 3
+
+
+def test_chunks_never_exceed_max_chunk(tmp_path):
+    store = BlobStore(str(tmp_path), min_chunk=64, max_chunk=256)
+    page = ("<p>hi</p>" + "x" * 1000 + "<p>bye</p>").encode()
+    chunks = list(store.chunks(page))
+
+    assert max(len(chunk) for chunk in chunks) <= 256
+    assert b"".join(chunks) == page
+
+
+def test_single_huge_tag_roundtrips(tmp_path):
+    store = BlobStore(str(tmp_path))
+    page = '<img src="data:image/png;base64,' + "A" * 70000 + '">'
+
+    digest = store.put(page, chunked=True)
+    assert store.get(digest).decode() == page
+    assert store.put(page, chunked=True) == digest
@@ -0,0 +1,36 @@
+from persine.commands import CommandQueue
+
+
+def test_finished_commands_are_appended(tmp_path):
+    path = tmp_path / "history.commands.jsonl"
+    queue = CommandQueue(str(path), fsync_every=2)
+    queue.start(["test:search", "test:next_up#3"])
+    plan = path.read_bytes()
+
+    queue.complete("key-1")
+    queue.complete("key-2")
+
+    # The plan is never rewritten, each key is a line of its own
+    contents = path.read_bytes()
+    assert contents.startswith(plan)
+    assert contents[len(plan):] == b'"key-1"\n"key-2"\n'
+
+    resumed = CommandQueue(str(path))
+    assert resumed.keys == ["key-1", "key-2"]
+    assert [entry["command"] for entry in resumed.remaining()] == ["test:next_up"] * 2  # noqa: E501
+
+
+def test_cut_off_key_is_ignored(tmp_path):
+    path = tmp_path / "history.commands.jsonl"
+    queue = CommandQueue(str(path))
+    queue.start(["test:a", "test:b", "test:c"])
+    queue.complete("key-1")
+    queue.close()
+    with open(path, "ab") as f:
+        f.write(b'"key-')
+
+    resumed = CommandQueue(str(path))
+    assert resumed.keys == ["key-1"]
+
+    resumed.complete("key-2")
+    assert CommandQueue(str(path)).keys == ["key-1", "key-2"]
@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+from persine.distributed import JobQueue
+from persine.distributed import SQLiteJobQueue
+from persine.distributed import Worker
+
+
+def test_job_queue_is_abstract():
+    class Incomplete(JobQueue):
+        def submit(self, persona, commands):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_claims_stick_to_a_worker(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.submit("one", ["test:a"])
+    queue.submit("two", ["test:b"])
+    queue.submit("one", ["test:c"])
+
+    first = queue.claim("worker-a")
+    assert first.persona == "one"
+    # one is still running, so worker-b gets two instead
+    second = queue.claim("worker-b")
+    assert second.persona == "two"
+    assert queue.claim("worker-b") is None
+
+    queue.complete(first, [])
+    # one belongs to worker-a now
+    assert queue.claim("worker-b") is None
+    assert queue.claim("worker-a").commands == ["test:c"]
+
+
+def test_release_hands_personas_back(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.submit("one", ["test:a"])
+    job = queue.claim("worker-a")
+    queue.release("worker-a")
+
+    assert queue.claim("worker-b").id == job.id
+    assert queue.status() == {"running": 1}
+
+
+def test_worker_pushes_history(engine, tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.submit("one", ["test:a", "test:b"])
+    queue.submit("one", ["test:c"])
+    engine.run = lambda driver, action: {
+        "key": action,
+        "action": action,
+        "recommendations": [{"title": action}],
+    }
+
+    Worker(engine, queue, worker_id="w").run(stop_when_empty=True)
+
+    assert [s["action"] for s in queue.history("one")] == ["test:a", "test:b", "test:c"]  # noqa: E501
+    assert [r["title"] for r in queue.recommendations("one")] == ["test:a", "test:b", "test:c"]  # noqa: E501
+    assert queue.status() == {"done": 2}
+
+
+def test_worker_retries_failed_jobs(engine, tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), max_attempts=2)
+    queue.submit("one", ["test:a"])
+
+    def run(driver, action):
+        raise Exception("boom")
+
+    engine.run = run
+    worker = Worker(engine, queue, worker_id="w")
+    assert worker.run_once()
+    assert queue.status() == {"queued": 1}
+    assert worker.run_once()
+    assert queue.status() == {"failed": 1}
+    assert not worker.run_once()
+    assert queue.history("one") == []
+
+
+def test_retried_job_resumes(engine, tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.submit("one", ["test:a", "test:b", "test:c"])
+    ran = []
+
+    def run(driver, action):
+        if action == "test:b" and "crashed" not in ran:
+            ran.append("crashed")
+            raise Exception("chrome crashed")
+        ran.append(action)
+        return {"key": action, "action": action}
+
+    engine.run = run
+    Worker(engine, queue, worker_id="w").run(stop_when_empty=True)
+
+    assert ran == ["test:a", "crashed", "test:b", "test:c"]
+    assert [s["action"] for s in queue.history("one")] == ["test:a", "test:b", "test:c"]  # noqa: E501
+    assert queue.status() == {"done": 1}
+
+
+def test_abandoned_jobs_are_requeued(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), lease=0.2)
+    queue.submit("one", ["test:a"])
+    stale = queue.claim("worker-a")
+    assert queue.claim("worker-a") is None
+
+    time.sleep(0.3)
+    # The persona is still worker-a's, and so is the job
+    assert queue.claim("worker-b") is None
+    retry = queue.claim("worker-a")
+    assert retry.id == stale.id
+
+    # Too late, someone else has it now
+    with pytest.raises(Exception):
+        queue.complete(stale, [])
+    queue.complete(retry, [])
+    assert queue.status() == {"done": 1}
+
+
+def test_heartbeat_keeps_the_lease(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), lease=0.3)
+    queue.submit("one", ["test:a"])
+    job = queue.claim("worker-a")
+
+    for _ in range(3):
+        time.sleep(0.15)
+        queue.heartbeat(job)
+        assert queue.claim("worker-a") is None
+    assert queue.status() == {"running": 1}
+
+
+def test_setup_errors_go_back_to_the_queue(engine, tmp_path, caplog):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), max_attempts=1)
+    queue.submit("one", ["test:a"])
+
+    def broken_persona(name, **kwargs):
+        raise Exception("profile is corrupt")
+
+    engine.persona = broken_persona
+    assert Worker(engine, queue, worker_id="w").run_once()
+
+    assert queue.status() == {"failed": 1}
+    assert "profile is corrupt" in caplog.text
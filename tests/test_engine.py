@@ -1,4 +1,12 @@
+import base64
+import os
+import threading
+from unittest.mock import Mock
+
 from persine import PersonaEngine
+from persine.bridges import BaseBridge
+from persine.bridges import YoutubeBridge
+from persine.persona_engine import UBLOCK_CRX
 
 
 def test_engine_persona():
@@ -12,3 +20,132 @@ def test_engine_launch():
     driver = engine.launch()
     assert driver is not None
     driver.quit()
+
+
+def test_cdp_screenshot(tmp_path):
+    jpeg = b"\xff\xd8fake jpeg"
+    driver = Mock()
+    driver.execute_cdp_cmd.side_effect = [
+        {"layoutViewport": {"clientWidth": 1600, "clientHeight": 1200}},
+        {"data": base64.b64encode(jpeg).decode()},
+    ]
+
+    engine = PersonaEngine(data_dir=str(tmp_path), screenshot_scale=0.5)
+    assert engine.capture_screenshot(driver) == jpeg
+
+    args = driver.execute_cdp_cmd.call_args[0][1]
+    assert args["format"] == "jpeg"
+    assert args["clip"]["scale"] == 0.5
+    driver.get_screenshot_as_png.assert_not_called()
+
+
+def test_screenshot_fallback(tmp_path):
+    driver = Mock(spec=["get_screenshot_as_png"])
+    driver.get_screenshot_as_png.return_value = b"png"
+
+    engine = PersonaEngine(data_dir=str(tmp_path))
+    assert engine.capture_screenshot(driver) == b"png"
+
+
+def test_bridges_are_reused(tmp_path):
+    engine = PersonaEngine(data_dir=str(tmp_path), watch=30)
+    driver = Mock()
+    bridge = engine.get_bridge(driver, "youtube:homepage")
+
+    assert isinstance(bridge, YoutubeBridge)
+    assert bridge.watch == 30
+    assert engine.get_bridge(driver, "https://www.youtube.com/") is bridge
+    assert engine.get_bridge(Mock(), "youtube:homepage") is not bridge
+
+    engine.forget_driver(driver)
+    assert engine.get_bridge(driver, "youtube:homepage") is not bridge
+
+
+def test_timings(tmp_path):
+    class TestBridge(BaseBridge):
+        schemes = ("test",)
+
+    driver = Mock()
+    driver.current_url = "data:,"
+    driver.title = "Test"
+    driver.page_source = "<html><script>x</script></html>"
+
+    calls = []
+    engine = PersonaEngine(
+        data_dir=str(tmp_path), driver=driver, html="history", timings=True
+    )
+    engine.register_bridge(TestBridge)
+    engine.add_timing_hook(lambda persona, state, timings: calls.append(timings))
+
+    persona = engine.persona("timed", overwrite=True)
+    state = persona.run("test:page")
+
+    for name in ["navigate", "scrape", "source", "simplify", "total"]:
+        assert name in state["timings"]
+    assert "persist" in calls[0]
+    assert persona.profile.summary()["total"]["count"] == 1
+
+    # Off by default
+    engine.timings = False
+    assert "timings" not in persona.run("test:page")
+
+
+def test_hooks(tmp_path):
+    class TestBridge(BaseBridge):
+        schemes = ("test",)
+
+        def get_data(self):
+            return {"page_type": "test"}
+
+    driver = Mock()
+    driver.current_url = "data:,"
+    driver.title = "Test"
+
+    events = []
+    engine = PersonaEngine(data_dir=str(tmp_path), driver=driver)
+    engine.register_bridge(TestBridge)
+    for event in ["before_action", "before_navigate", "after_navigate",
+                  "before_scrape", "after_scrape", "after_state"]:
+        engine.on(event, lambda event=event, **info: events.append((event, info)))
+
+    persona = engine.persona("hooked", overwrite=True)
+    persona.run("test:page")
+
+    assert [event for event, info in events] == [
+        "before_action", "before_navigate", "after_navigate",
+        "before_scrape", "after_scrape", "after_state",
+    ]
+    assert events[0][1]["url"] == "test:page"
+    assert events[4][1]["data"] == {"page_type": "test"}
+    assert events[5][1]["persona"] is persona
+
+
+def test_unpack_extension(tmp_path):
+    engine = PersonaEngine(data_dir=str(tmp_path))
+    ext_dir = engine.unpack_extension(UBLOCK_CRX)
+
+    assert os.path.exists(os.path.join(ext_dir, "manifest.json"))
+    assert not os.path.exists(os.path.join(ext_dir, "_metadata"))
+    assert engine.unpack_extension(UBLOCK_CRX) == ext_dir
+
+    engine.ublock = True
+    options = engine.get_driver_options()
+    assert f"--load-extension={ext_dir}" in options.arguments
+    assert options.extensions == []
+
+
+def test_unpack_extension_from_many_threads(tmp_path):
+    engine = PersonaEngine(data_dir=str(tmp_path))
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(engine.unpack_extension(UBLOCK_CRX)))  # noqa: E501
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1
+    assert os.path.exists(os.path.join(results[0], "manifest.json"))
+    assert os.listdir(tmp_path / "extensions") == [os.path.basename(results[0])]
@@ -0,0 +1,65 @@
+import pytest
+from persine.utils import HistoryList, RecommendationList
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_recommendations_to_parquet(tmp_path):
+    recs = RecommendationList([
+        {
+            "action_key": "a",
+            "position": i,
+            "title": f"Video {i}",
+            "url": "https://www.youtube.com/watch?v=abc",
+            "channel_name": "Channel",
+            "surprise": i,
+        }
+        for i in range(5)
+    ])
+    filename = tmp_path / "recs.parquet"
+    recs.to_parquet(filename, bridge="youtube", chunk_size=2)
+
+    table = pq.read_table(filename)
+    assert table.num_rows == 5
+    assert pa.types.is_dictionary(table.schema.field("channel_name").type)
+    assert pa.types.is_dictionary(table.schema.field("url").type)
+    assert table.column("position").to_pylist() == [0, 1, 2, 3, 4]
+    assert table.column("extra").to_pylist()[1] == '{"surprise": 1}'
+
+
+def test_amazon_strings_are_coerced(tmp_path):
+    recs = RecommendationList([
+        {"index": "3", "asin": "B0001", "is_prime": 1, "is_sponsored": "false"},
+        {"is_prime": "0", "is_sponsored": "True", "free_shipping": "maybe"},
+    ])
+    filename = tmp_path / "recs.parquet"
+    recs.to_parquet(filename, bridge="amazon")
+
+    first, second = pq.read_table(filename).to_pylist()
+    assert first["index"] == 3
+    assert first["is_prime"] is True
+    assert first["is_sponsored"] is False
+    assert second["is_prime"] is False
+    assert second["is_sponsored"] is True
+    assert second["free_shipping"] is None
+
+
+def test_history_to_arrow(tmp_path):
+    history = HistoryList([
+        {
+            "key": "a",
+            "action": "youtube:search/dogs",
+            "url": "https://www.youtube.com/results?search_query=dogs",
+            "recommendations": [{"title": "Dogs"}],
+        }
+    ])
+    filename = tmp_path / "history.arrow"
+    history.to_arrow(filename)
+
+    with pa.OSFile(str(filename), "rb") as source:
+        table = pa.ipc.open_stream(source).read_all()
+    row = table.to_pylist()[0]
+    assert row["key"] == "a"
+    assert row["action"] == "youtube:search/dogs"
+    assert row["extra"] is None
@@ -0,0 +1,155 @@
+import copy
+import json
+import pickle
+
+from persine.history import HistoryJournal
+from persine.utils import HistoryList
+
+
+def test_journal_appends(tmp_path):
+    path = tmp_path / "history.jsonl"
+    journal = HistoryJournal(str(path))
+    journal.append({"key": "one"})
+    journal.append({"key": "two"})
+    journal.close()
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["key"] for line in lines] == ["one", "two"]
+    assert [state["key"] for state in journal.load()] == ["one", "two"]
+
+
+def test_journal_compact(tmp_path):
+    path = tmp_path / "history.jsonl"
+    journal = HistoryJournal(str(path))
+    for i in range(3):
+        journal.append({"key": i})
+    journal.compact([{"key": 0}])
+    journal.append({"key": 1})
+
+    assert [state["key"] for state in journal.load()] == [0, 1]
+
+
+def test_journal_reads_legacy_json(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text(json.dumps([{"key": "old"}]))
+
+    journal = HistoryJournal(str(path))
+    assert [state["key"] for state in journal.load()] == ["old"]
+
+    journal.append({"key": "new"})
+    assert [state["key"] for state in journal.load()] == ["old", "new"]
+
+
+def test_history_list_journal(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "history.jsonl"))
+    history = HistoryList([], journal=journal)
+    history.append({"key": "one"})
+    history.extend([{"key": "two"}])
+
+    assert len(list(journal.load())) == 2
+
+
+def test_journal_lazy_load(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "history.jsonl"))
+    journal.append({"key": "one", "page_source": "abc"})
+    journal.append({"key": "two"})
+
+    first, second = list(journal.load(lazy=True))
+    assert dict.get(first, "page_source") is None
+    assert "page_source" in first
+    assert first["key"] == "one"
+    assert first["page_source"] == "abc"
+    assert second == {"key": "two"}
+
+
+def test_history_list_lazy(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "history.jsonl"))
+    history = HistoryList([], journal=journal, lazy=True)
+    history.append({"key": "one", "screenshot": "abc"})
+    history.append({"key": "two", "page_source": "def"})
+
+    assert dict.get(history[0], "screenshot") is None
+    assert history[0]["screenshot"] == "abc"
+
+    # Compacting moves every line, the states should follow along
+    history.data = history.data[1:]
+    history.save()
+    assert dict.get(history[0], "page_source") is None
+    assert history[0]["page_source"] == "def"
+    assert [state["key"] for state in journal.load()] == ["two"]
+
+
+def test_journal_lazy_load_skips_heavy_fields(tmp_path):
+    path = tmp_path / "history.jsonl"
+    journal = HistoryJournal(str(path))
+    journal.append({"key": "one", "page_source": "<html>abc</html>", "title": "x"})
+    journal.close()
+
+    # Break the page source, a lazy load shouldn't even notice
+    path.write_bytes(path.read_bytes().replace(b'"<html>abc</html>"', b'"<html>abc</html'))  # noqa: E501
+    (state,) = journal.load(lazy=True)
+    assert state["key"] == "one"
+    assert state["title"] == "x"
+    assert state.lazy_fields == ("page_source",)
+
+
+def test_journal_line_format(tmp_path):
+    path = tmp_path / "history.jsonl"
+    journal = HistoryJournal(str(path))
+    journal.append({"key": "one", "screenshot": "a.png", "page_source": "abc"})
+    journal.close()
+
+    # Still a plain JSON line, with the heavy fields last
+    line = json.loads(path.read_text())
+    assert set(list(line)[-2:]) == {"screenshot", "page_source"}
+    assert list(journal.load()) == [
+        {"key": "one", "screenshot": "a.png", "page_source": "abc"}
+    ]
+    (lazy,) = journal.load(lazy=True)
+    assert lazy["page_source"] == "abc"
+
+
+def test_lazy_state_does_not_keep_heavy_fields(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "history.jsonl"))
+    history = HistoryList([], journal=journal, lazy=True)
+    history.append({"key": "one", "page_source": "abc"})
+
+    assert history[0]["page_source"] == "abc"
+    history.to_df()
+    assert history[0].lazy_fields == ("page_source",)
+    assert dict.get(history[0], "page_source") is None
+    assert history[0].materialize() == {"key": "one", "page_source": "abc"}
+
+
+
+def test_lazy_state_copies_are_plain_dicts(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "history.jsonl"))
+    history = HistoryList([], journal=journal, lazy=True)
+    history.append({"key": "one", "page_source": "abc", "data": {"a": [1]}})
+    state = history[0]
+    full = {"key": "one", "page_source": "abc", "data": {"a": [1]}}
+
+    for copied in [pickle.loads(pickle.dumps(state)), copy.copy(state), copy.deepcopy(state)]:  # noqa: E501
+        assert type(copied) is dict
+        assert copied == full
+
+    deep = copy.deepcopy(state)
+    deep["data"]["a"].append(2)
+    assert state["data"] == {"a": [1]}
+
+def test_held_states_survive_compaction(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "history.jsonl"))
+    history = HistoryList([], journal=journal, lazy=True)
+    for key in ["one", "two", "three"]:
+        history.append({"key": key, "page_source": f"<p>{key}</p>"})
+
+    removed = history[0]
+    last = history[-1]
+    del history[0]
+    history.save()
+
+    # Still in the history, so it follows its line to the new file
+    assert last["page_source"] == "<p>three</p>"
+    assert last.lazy_fields == ("page_source",)
+    # Gone from the history, so it was read into memory before the rewrite
+    assert removed["page_source"] == "<p>one</p>"
@@ -7,19 +7,16 @@ from unittest.mock import Mock
 
 
 @pytest.fixture
-def engine():
+def engine(engine):
     def launch_chrome(user_data_dir):
         options = Options()
         options.add_argument("--headless")
         return webdriver.Chrome(options=options)
 
-    eng = Mock()
-    eng.data_dir = "/tmp/data_dir"
-    eng.history_path = "/tmp/history.json"
-    eng.launch = launch_chrome
-    eng.run = lambda driver, action: { 'action': action }
+    engine.launch = launch_chrome
+    engine.run = lambda driver, action: { 'action': action }
 
-    return eng
+    return engine
 
 
 def test_context(engine):
@@ -85,3 +82,85 @@ def test_startup_shutdown(engine):
     assert persona.driver is not None
     persona.quit()
     assert persona.driver is None
+
+
+def test_resume_history(engine, tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    persona = Persona(engine=engine, history_path=path)
+    persona.update_history(
+        {
+            "key": "test-key-1",
+            "url": "sample",
+            "action": "test:sample",
+            "recommendations": [{"number": 1}, {"number": 2}],
+        }
+    )
+
+    resumed = Persona(engine=engine, history_path=path, resume=True)
+    assert len(resumed.history) == 1
+    assert len(resumed.recommendations) == 2
+
+
+def test_resume_does_not_rewrite(engine, tmp_path):
+    path = tmp_path / "history.jsonl"
+    persona = Persona(engine=engine, history_path=str(path))
+    persona.update_history({"key": "test-key-1", "action": "test:sample"})
+    persona.journal.close()
+    modified = path.stat().st_mtime_ns
+
+    Persona(engine=engine, history_path=str(path), resume=True)
+    assert path.stat().st_mtime_ns == modified
+
+
+def test_background_states_stay_in_order(engine):
+    from concurrent.futures import ThreadPoolExecutor
+    import time
+
+    pool = ThreadPoolExecutor(max_workers=4)
+
+    def finish(action, delay):
+        time.sleep(delay)
+        return {"key": action, "action": action}
+
+    delays = {"test:a": 0.05, "test:b": 0.0, "test:c": 0.02}
+    engine.launch = lambda user_data_dir: Mock()
+    engine.run = lambda driver, action: pool.submit(finish, action, delays[action])  # noqa: E501
+
+    persona = Persona(engine=engine)
+    results = persona.run_batch(["test:a", "test:b", "test:c"])
+
+    assert [s["action"] for s in persona.history] == ["test:a", "test:b", "test:c"]  # noqa: E501
+    assert [s["action"] for s in results] == ["test:a", "test:b", "test:c"]
+
+
+def test_run_batch_resumes_after_crash(engine, tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    ran = []
+
+    def run(driver, action):
+        if len(ran) == 3 and not crashed:
+            crashed.append(action)
+            raise Exception("chrome crashed")
+        ran.append(action)
+        return {"key": f"key-{len(ran)}", "action": action}
+
+    crashed = []
+    engine.launch = lambda user_data_dir: Mock()
+    engine.run = run
+    plan = ["test:search", "test:next_up#4"]
+
+    persona = Persona(engine=engine, history_path=path)
+    with pytest.raises(Exception):
+        persona.run_batch(plan)
+    assert len(persona.history) == 3
+
+    # Start over, like after a restart
+    resumed = Persona(engine=engine, history_path=path, resume=True)
+    results = resumed.run_batch(plan)
+
+    assert ran == ["test:search"] + ["test:next_up"] * 4
+    assert len(resumed.history) == 5
+    assert [state["key"] for state in results] == ["key-1", "key-5"]
+    # A finished batch doesn't leave anything behind
+    assert resumed.commands.remaining() == []
+    assert not (tmp_path / "history.commands.jsonl").exists()
@@ -0,0 +1,51 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from persine.pool import BrowserPool
+
+
+def test_pool_hands_over_warm_browsers():
+    launched = []
+
+    def launch(user_data_dir):
+        time.sleep(0.05)
+        driver = Mock()
+        driver.user_data_dir = user_data_dir
+        driver.thread = threading.get_ident()
+        launched.append(driver)
+        return driver
+
+    pool = BrowserPool(launch)
+    pool.prewarm("profile-a")
+
+    assert pool.take("profile-b") is None
+    driver = pool.take("profile-a")
+    assert driver.user_data_dir == "profile-a"
+    assert driver.thread != threading.get_ident()
+    assert pool.take("profile-a") is None
+
+
+def test_pool_close_quits_unused_browsers():
+    drivers = []
+
+    def launch(user_data_dir):
+        drivers.append(Mock())
+        return drivers[-1]
+
+    pool = BrowserPool(launch)
+    pool.prewarm(None, count=2)
+    pool.close()
+
+    assert len(drivers) == 2
+    assert all(driver.quit.called for driver in drivers)
+    assert pool.take(None) is None
+
+
+def test_pool_failed_launch():
+    def launch(user_data_dir):
+        raise Exception("no chrome")
+
+    pool = BrowserPool(launch)
+    pool.prewarm("profile")
+    assert pool.take("profile") is None
@@ -0,0 +1,67 @@
+import base64
+import io
+import zlib
+
+from PIL import Image
+
+from persine import processing
+
+
+def make_png(width=40, height=20):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def settings(tmp_path, **kwargs):
+    return {
+        "html": None,
+        "compress_html": True,
+        "simplify": "bs4",
+        "screenshot": None,
+        "screenshot_scale": 0.5,
+        "cache_dir": str(tmp_path),
+        "blob_dir": str(tmp_path / "blobs"),
+        **kwargs,
+    }
+
+
+def test_finish_state_history(tmp_path):
+    state = processing.finish_state(
+        {"key": "k"},
+        {"page_type": "video"},
+        "<html><script>1</script></html>",
+        make_png(),
+        settings(tmp_path, html="history", screenshot="history"),
+    )
+
+    html = zlib.decompress(base64.b64decode(state["page_source"])).decode()
+    assert "script" not in html
+    screenshot = Image.open(io.BytesIO(base64.b64decode(state["screenshot"])))
+    assert screenshot.size == (20, 10)
+    assert state["page_type"] == "video"
+
+
+def test_finish_state_files(tmp_path):
+    state = processing.finish_state(
+        {"key": "k"},
+        None,
+        "<html></html>",
+        make_png(),
+        settings(tmp_path, html=["file"], screenshot=["file"]),
+    )
+
+    assert "page_source" not in state
+    assert (tmp_path / "k.html").exists()
+    assert (tmp_path / "k.jpg").exists()
+
+
+def test_finish_state_blobs(tmp_path):
+    options = settings(tmp_path, html="blobs", screenshot=["blobs"])
+    first = processing.finish_state({"key": "a"}, None, "<html></html>", make_png(), options)  # noqa: E501
+    second = processing.finish_state({"key": "b"}, None, "<html></html>", make_png(), options)  # noqa: E501
+
+    assert "page_source" not in first
+    assert first["page_source_blob"] == second["page_source_blob"]
+    assert first["screenshot_blob"] == second["screenshot_blob"]
+    assert not (tmp_path / "a.html").exists()
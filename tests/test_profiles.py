@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from persine import PersonaEngine
+from persine.profiles import clone_profile
+
+
+def make_template(root):
+    files = {
+        "Local State": "{}",
+        "Default/Preferences": '{"profile": {}}',
+        "Default/Extensions/abc/1.0/manifest.json": "{}",
+        "Default/Cache/data_0": "cached",
+        "SingletonLock": "lock",
+    }
+    for name, contents in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(contents)
+
+
+def test_clone_profile(tmp_path):
+    template = str(tmp_path / "template")
+    clone = str(tmp_path / "clone")
+    make_template(template)
+
+    counts = clone_profile(template, clone)
+
+    with open(os.path.join(clone, "Default", "Preferences")) as f:
+        assert f.read() == '{"profile": {}}'
+    assert not os.path.exists(os.path.join(clone, "SingletonLock"))
+    assert not os.path.exists(os.path.join(clone, "Default", "Cache"))
+
+    # Extensions are shared, everything else is its own file
+    manifest = "Default/Extensions/abc/1.0/manifest.json"
+    assert os.path.samefile(
+        os.path.join(template, manifest), os.path.join(clone, manifest)
+    )
+    assert not os.path.samefile(
+        os.path.join(template, "Local State"), os.path.join(clone, "Local State")  # noqa: E501
+    )
+    assert counts["hardlinked"] == 1
+    assert counts["reflinked"] + counts["copied"] == 2
+
+
+def test_engine_clones_template(tmp_path):
+    engine = PersonaEngine(data_dir=str(tmp_path), template_profile=True)
+    make_template(engine.template_dir)
+
+    persona = engine.persona("cloned", overwrite=True)
+    engine.clone_template(persona.user_data_dir)
+    assert os.path.exists(os.path.join(persona.user_data_dir, "Local State"))
+
+    # Clearing the persona wipes its profile, the next launch re-clones it
+    persona.clear()
+    assert not os.path.exists(persona.user_data_dir)
+
+
+def test_template_is_built_once(tmp_path):
+    engine = PersonaEngine(data_dir=str(tmp_path), template_profile=True)
+    launches = []
+
+    def fake_chrome(options):
+        launches.append(options)
+        time.sleep(0.1)
+        return MagicMock()
+
+    with patch("persine.persona_engine.webdriver.Chrome", side_effect=fake_chrome):  # noqa: E501
+        threads = [threading.Thread(target=engine.build_template) for _ in range(4)]  # noqa: E501
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(launches) == 1
+    assert os.path.isdir(engine.template_dir)
+    # No half-built templates left lying around
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_template_built_elsewhere_is_kept(tmp_path):
+    engine = PersonaEngine(data_dir=str(tmp_path), template_profile=True)
+
+    def other_process_wins(options):
+        # Another process sharing data_dir installs its template first
+        make_template(engine.template_dir)
+        return MagicMock()
+
+    with patch("persine.persona_engine.webdriver.Chrome", side_effect=other_process_wins):  # noqa: E501
+        assert engine.build_template() == engine.template_dir
+
+    assert os.path.exists(os.path.join(engine.template_dir, "Local State"))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,128 @@
+import threading
+import time
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import WebDriverException
+from unittest.mock import Mock
+
+from persine.runner import PersonaRunner
+
+
+def test_runner_runs_every_persona(engine):
+    plans = {
+        "one": ["test:a", "test:b"],
+        "two": ["test:c"],
+    }
+    updates = []
+    runner = PersonaRunner(engine, max_browsers=2, progress=lambda *args: updates.append(args))  # noqa: E501
+    results = runner.run(plans)
+
+    assert [s["action"] for s in results["one"].history] == ["test:a", "test:b"]
+    assert [s["action"] for s in results["two"].history] == ["test:c"]
+    assert results["one"].user_data_dir != results["two"].user_data_dir
+    assert runner.progress.commands_done == 3
+    assert runner.progress.personas_done == 2
+    assert len(updates) == 3
+
+
+def test_runner_limits_browsers(engine):
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def launch(user_data_dir):
+        with lock:
+            active.append(user_data_dir)
+            peak.append(len(active))
+        driver = Mock()
+        driver.quit = lambda: active.remove(user_data_dir)
+        return driver
+
+    def run(driver, action):
+        time.sleep(0.01)
+        return {"key": action, "action": action}
+
+    engine.launch = launch
+    engine.run = run
+    plans = {f"p{i}": ["test:a", "test:b"] for i in range(6)}
+    PersonaRunner(engine, max_browsers=2).run(plans)
+
+    assert max(peak) <= 2
+
+
+def test_runner_restarts_crashed_browser(engine):
+    crashes = []
+
+    def run(driver, action):
+        if not crashes:
+            crashes.append(action)
+            raise WebDriverException("chrome not reachable")
+        return {"key": action, "action": action}
+
+    engine.run = run
+    runner = PersonaRunner(engine, max_browsers=1)
+    results = runner.run({"one": ["test:a"]})
+
+    assert len(results["one"].history) == 1
+    assert runner.progress.restarts == 1
+
+
+def test_runner_gives_up(engine):
+    def run(driver, action):
+        raise WebDriverException("chrome not reachable")
+
+    engine.run = run
+    runner = PersonaRunner(engine, max_browsers=1, max_restarts=1)
+    results = runner.run({"one": ["test:a"]})
+
+    assert isinstance(results["one"], WebDriverException)
+    assert runner.progress.personas_failed == 1
+
+
+def test_runner_warms_ahead(engine):
+    warmed = []
+    engine.prewarm = lambda persona: warmed.append(persona)
+
+    plans = {f"p{i}": ["test:a"] for i in range(3)}
+    results = PersonaRunner(engine, max_browsers=1, warm_ahead=1).run(plans)
+
+    assert [persona.name for persona in warmed] == ["p1", "p2"]
+    # The persona that was warmed up is the one that ran
+    assert results["p1"] is warmed[0]
+    assert len(results["p2"].history) == 1
+
+
+def test_runner_does_not_restart_for_page_errors(engine):
+    def run(driver, action):
+        raise NoSuchElementException("no such element")
+
+    engine.run = run
+    runner = PersonaRunner(engine, max_browsers=1)
+    results = runner.run({"one": ["test:a"]})
+
+    assert isinstance(results["one"], NoSuchElementException)
+    assert runner.progress.restarts == 0
+
+
+def test_runner_restarts_when_window_is_gone(engine):
+    calls = []
+
+    def launch(user_data_dir):
+        driver = Mock()
+        if not calls:
+            type(driver).window_handles = property(Mock(side_effect=WebDriverException("gone")))  # noqa: E501
+        return driver
+
+    def run(driver, action):
+        calls.append(action)
+        if len(calls) == 1:
+            raise WebDriverException("unknown error")
+        return {"key": action, "action": action}
+
+    engine.launch = launch
+    engine.run = run
+    runner = PersonaRunner(engine, max_browsers=1)
+    results = runner.run({"one": ["test:a"]})
+
+    assert len(results["one"].history) == 1
+    assert runner.progress.restarts == 1
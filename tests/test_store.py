@@ -0,0 +1,109 @@
+
+from persine.history import LazyState
+from persine.persona import Persona
+from persine.store import HistoryDatabase
+from persine.utils import HistoryList
+
+
+def make_state(key, urls):
+    return {
+        "key": key,
+        "action": key,
+        "url": f"https://example.com/{key}",
+        "page_source": f"<html>{key}</html>",
+        "recommendations": [{"url": url, "channel_name": "chan"} for url in urls],
+    }
+
+
+def test_database_appends_and_loads(tmp_path):
+    db = HistoryDatabase(str(tmp_path / "history.db"), persona="one")
+    db.append(make_state("a", ["x"]))
+    db.append(make_state("b", ["x", "y"]))
+
+    states = list(db.load())
+    assert [s["key"] for s in states] == ["a", "b"]
+    assert states[0]["page_source"] == "<html>a</html>"
+
+    lazy = list(db.load(lazy=True))
+    assert isinstance(lazy[1], LazyState)
+    assert lazy[1].lazy_fields == ("page_source",)
+    assert lazy[1]["page_source"] == "<html>b</html>"
+
+
+def test_database_queries_across_personas(tmp_path):
+    path = str(tmp_path / "history.db")
+    one = HistoryDatabase(path, persona="one")
+    two = HistoryDatabase(path, persona="two")
+    one.append(make_state("a", ["x", "y"]))
+    two.append(make_state("b", ["x"]))
+    # Other personas only see states once they're committed
+    assert [r["persona"] for r in one.recommendations(url="x")] == ["one"]
+    two.flush()
+
+    recs = list(one.recommendations(url="x"))
+    assert [(r["persona"], r["action_key"]) for r in recs] == [("one", "a"), ("two", "b")]  # noqa: E501
+    assert [s["key"] for s in two.states(persona="two")] == ["b"]
+
+    counts = one.query(
+        "SELECT url, COUNT(*) AS times FROM recommendations GROUP BY url ORDER BY url"  # noqa: E501
+    )
+    assert counts["times"].tolist() == [2, 1]
+
+    # Clearing one persona leaves the other alone
+    one.delete()
+    assert list(one.load()) == []
+    assert [r["persona"] for r in two.recommendations()] == ["two"]
+
+
+def test_history_list_database_save(tmp_path):
+    db = HistoryDatabase(str(tmp_path / "history.db"), persona="one")
+    history = HistoryList([], journal=db, lazy=True)
+    history.append(make_state("a", ["x"]))
+    history.append(make_state("b", ["y"]))
+
+    removed = history[0]
+    del history[0]
+    history.save()
+
+    assert history[0]["page_source"] == "<html>b</html>"
+    assert removed["page_source"] == "<html>a</html>"
+    assert [s["key"] for s in db.load()] == ["b"]
+    assert [r["url"] for r in db.recommendations()] == ["y"]
+
+
+def test_persona_sqlite_history(engine, tmp_path):
+    engine.run = lambda driver, action: make_state(action, ["x"])
+    path = str(tmp_path / "audit.db")
+
+    persona = Persona(engine, name="one", history_path=path, overwrite=True)
+    persona.run_batch(["test:a", "test:b"])
+    persona.quit()
+
+    resumed = Persona(engine, name="one", history_path=path, resume=True)
+    assert [s["key"] for s in resumed.history] == ["test:a", "test:b"]
+    assert len(resumed.recommendations) == 2
+
+    other = Persona(engine, name="two", history_path=path, overwrite=True)
+    assert len(other.history) == 0
+    assert len(list(other.journal.recommendations())) == 2
+
+
+def test_database_commits_in_batches(tmp_path):
+    path = str(tmp_path / "history.db")
+    db = HistoryDatabase(path, persona="one", fsync_every=3)
+    reader = HistoryDatabase(path)
+    history = HistoryList([], journal=db, lazy=True)
+
+    history.append(make_state("a", ["x"]))
+    history.append(make_state("b", ["y"]))
+    assert list(reader.states()) == []
+    # Lazy states can be read before they're committed
+    assert history[1]["page_source"] == "<html>b</html>"
+
+    history.append(make_state("c", ["z"]))
+    assert [s["key"] for s in reader.states()] == ["a", "b", "c"]
+
+    history.append(make_state("d", []))
+    db.close()
+    assert [s["key"] for s in reader.states()] == ["a", "b", "c", "d"]
+    assert history[3]["page_source"] == "<html>d</html>"
@@ -26,3 +26,60 @@ def test_simplify_source():
 def test_simplify_source_options():
     shrunken = utils.simplify_source(SOURCE, tags=())
     assert re.sub(r"\s", "", shrunken) == re.sub(r"\s", "", SOURCE)
+
+
+def test_simplify_source_fast():
+    shrunken = utils.simplify_source(SOURCE, method="fast")
+    assert re.sub(r"\s", "", shrunken) == "<html></html>"
+
+
+def test_strip_tags_matches_bs4():
+    source = """
+    <html><body>
+    <div class="a>b"><p>Keep me</p><svg><g><svg></svg></g></svg></div>
+    <!-- <script>kept comment</script> -->
+    <script>var html = "<svg><style>";</script>
+    <style>p { color: red; }</style>
+    <p>And me</p>
+    </body></html>
+    """
+    fast = utils.simplify_source(source, method="fast")
+    slow = utils.simplify_source(source)
+    assert "<svg" not in fast
+    assert "<style" not in fast
+    assert "kept comment" in fast
+    # BeautifulSoup re-escapes the > in the class attribute
+    slow = slow.replace("&gt;", ">")
+    assert re.sub(r"\s", "", fast) == re.sub(r"\s", "", slow)
+
+
+def test_strip_tags_ignores_tags_inside_attributes():
+    source = '<div title="<script>x">keep</div><p>after</p><script>a</script><p>end</p>'  # noqa: E501
+    fast = utils.simplify_source(source, method="fast")
+    slow = utils.simplify_source(source).replace("&lt;", "<").replace("&gt;", ">")
+    assert fast == '<div title="<script>x">keep</div><p>after</p><p>end</p>'
+    assert re.sub(r"\s", "", fast) == re.sub(r"\s", "", slow)
+
+
+def test_recommendation_list():
+    recs = utils.RecommendationList([
+        {"title": "One", "url": "https://example.com/1"},
+        {"title": "Two", "channel_name": "Chan"},
+    ])
+    recs.append({"title": "Three", "channel_name": "Chan"})
+
+    assert len(recs) == 3
+    assert recs[0] == {"title": "One", "url": "https://example.com/1"}
+    assert recs[-1] == {"title": "Three", "channel_name": "Chan"}
+    assert [rec["title"] for rec in recs] == ["One", "Two", "Three"]
+    assert recs[1:] == [
+        {"title": "Two", "channel_name": "Chan"},
+        {"title": "Three", "channel_name": "Chan"},
+    ]
+
+    # Repeated strings are only stored once
+    assert recs.columns["channel_name"][1] is recs.columns["channel_name"][2]
+
+    df = recs.to_df()
+    assert list(df.columns) == ["title", "url", "channel_name"]
+    assert df["channel_name"].isna().tolist() == [True, False, False]